@@ -1,4 +1,4 @@
-from .food_scene_analyzer import analyze_food_scene
+from .food_scene_analyzer import analyze_food_scene, usage_of
 from .story_evaluator import evaluate_story_potential
 
-__all__ = ["analyze_food_scene", "evaluate_story_potential"]
+__all__ = ["analyze_food_scene", "evaluate_story_potential", "usage_of"]
@@ -1,4 +1,4 @@
-from anthropic import Anthropic
+from anthropic import AsyncAnthropic
 from typing import Dict, Any, List
 import json
 import re
@@ -52,6 +52,15 @@ FOOD_SCENE_PROMPT = """你是熙崽的选题助手。熙崽是美食博主，专
 如果这部作品没有明显的美食场景，或者不适合做选题，has_food_scene 返回 false 并说明原因。"""
 
 
+def usage_of(message) -> Dict[str, int]:
+    """本次调用消耗的 token（用于进度事件）"""
+    usage = getattr(message, "usage", None)
+    return {
+        "input_tokens": getattr(usage, "input_tokens", 0) or 0,
+        "output_tokens": getattr(usage, "output_tokens", 0) or 0,
+    }
+
+
 async def analyze_food_scene(
     work_name: str,
     year: int,
@@ -61,24 +70,24 @@ async def analyze_food_scene(
 ) -> Dict[str, Any]:
     """使用 Claude 分析作品的美食场景潜力"""
 
-    client = Anthropic(api_key=api_key)
-
     discussions_text = "\n".join([f"- {d}" for d in discussions[:10]]) if discussions else "（暂无相关讨论）"
 
     try:
-        message = client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=2000,
-            messages=[{
-                "role": "user",
-                "content": FOOD_SCENE_PROMPT.format(
-                    work_name=work_name,
-                    year=year,
-                    score=score,
-                    discussions=discussions_text
-                )
-            }]
-        )
+        # 异步客户端：等待响应时不阻塞事件循环（其他请求、租约续期照常进行）
+        async with AsyncAnthropic(api_key=api_key) as client:
+            message = await client.messages.create(
+                model="claude-sonnet-4-20250514",
+                max_tokens=2000,
+                messages=[{
+                    "role": "user",
+                    "content": FOOD_SCENE_PROMPT.format(
+                        work_name=work_name,
+                        year=year,
+                        score=score,
+                        discussions=discussions_text
+                    )
+                }]
+            )
 
         response_text = message.content[0].text
 
@@ -86,6 +95,7 @@ async def analyze_food_scene(
         json_match = re.search(r'\{[\s\S]*\}', response_text)
         if json_match:
             result = json.loads(json_match.group())
+            result["usage"] = usage_of(message)
             logger.info(f"分析完成: {work_name}, has_food_scene={result.get('has_food_scene')}")
             return result
 
@@ -1,9 +1,11 @@
-from anthropic import Anthropic
+from anthropic import AsyncAnthropic
 from typing import Dict, Any, List
 import json
 import re
 import logging
 
+from .food_scene_analyzer import usage_of
+
 logger = logging.getLogger(__name__)
 
 STORY_EVAL_PROMPT = """根据熙崽的"有趣"标准，评估这个选题的潜力：
@@ -50,8 +52,6 @@ async def evaluate_story_potential(
 ) -> Dict[str, Any]:
     """评估选题的故事潜力"""
 
-    client = Anthropic(api_key=api_key)
-
     # 格式化故事切入点
     angles_text = "\n".join([
         f"- {a.get('angle_type', '未知')}: {a.get('title', '')} - {a.get('description', '')}"
@@ -59,19 +59,20 @@ async def evaluate_story_potential(
     ]) if story_angles else "（暂无）"
 
     try:
-        message = client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=1500,
-            messages=[{
-                "role": "user",
-                "content": STORY_EVAL_PROMPT.format(
-                    work_name=work_name,
-                    dish_name=dish_name,
-                    scene_description=scene_description,
-                    story_angles=angles_text
-                )
-            }]
-        )
+        async with AsyncAnthropic(api_key=api_key) as client:
+            message = await client.messages.create(
+                model="claude-sonnet-4-20250514",
+                max_tokens=1500,
+                messages=[{
+                    "role": "user",
+                    "content": STORY_EVAL_PROMPT.format(
+                        work_name=work_name,
+                        dish_name=dish_name,
+                        scene_description=scene_description,
+                        story_angles=angles_text
+                    )
+                }]
+            )
 
         response_text = message.content[0].text
 
@@ -79,6 +80,7 @@ async def evaluate_story_potential(
         json_match = re.search(r'\{[\s\S]*\}', response_text)
         if json_match:
             result = json.loads(json_match.group())
+            result["usage"] = usage_of(message)
             logger.info(f"评估完成: {work_name}·{dish_name}, score={result.get('recommendation_score')}")
             return result
 
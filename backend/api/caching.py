@@ -0,0 +1,54 @@
+"""
+HTTP 条件请求支持 - ETag / If-None-Match
+
+ETag 由 (目录内容摘要、评分规则版本、用户及其状态摘要、海报缓存摘要、
+请求路径和参数) 计算，不需要先构建响应体；没变就直接返回 304。
+摘要只由内容决定，多 worker 部署时各 worker 对同样的状态给出同样的 ETag。
+ETag 是弱校验器：响应里的收集时间（collected_at）是各 worker 自己的构建
+时间，内容相同但字节不一定相同。
+"""
+from typing import Any
+import hashlib
+
+from fastapi import Request, Response
+
+# 允许浏览器缓存，但每次使用前必须用 ETag 重新验证
+CACHE_CONTROL = "private, no-cache"
+
+# 响应内容随用户不同（X-User-Id 请求头），共享缓存需要按它区分
+VARY = "X-User-Id"
+
+
+def compute_etag(request: Request, *versions: Any) -> str:
+    """根据请求和内容摘要计算弱 ETag（跨 worker、跨重启稳定）"""
+    raw = repr((request.url.path, str(request.url.query), versions))
+    return 'W/"' + hashlib.sha1(raw.encode("utf-8")).hexdigest() + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match 是否命中（If-None-Match 按 RFC 7232 用弱比较）"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def not_modified(etag: str) -> Response:
+    """304 响应"""
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": VARY})
+
+
+def set_cache_headers(response: Response, etag: str):
+    """为正常响应加上 ETag 和 Cache-Control"""
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    response.headers["Vary"] = VARY
@@ -0,0 +1,43 @@
+"""
+请求合并（single-flight）- 相同参数的并发读请求共享一次计算
+
+键为 (路由, 规范化参数, 状态版本)，同一键在计算期间到达的请求等待同一个
+任务，拿到同一份已编码的响应体。计算结束即移除，不做结果缓存（版本变化
+后的请求自然走新的键）。
+"""
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+import asyncio
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """同键并发调用合并为一次"""
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        # 统计：实际执行次数 / 合并掉的次数
+        self.executed = 0
+        self.shared = 0
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        执行 fn，或等待同键正在进行的调用
+
+        异常同样共享给所有等待者；某个请求被取消（客户端断开）不会取消计算本身。
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            self.executed += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"executed": self.executed, "shared": self.shared, "inflight": len(self._inflight)}
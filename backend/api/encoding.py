@@ -0,0 +1,104 @@
+"""
+JSON 编码 - 预编码片段 + orjson
+
+排序视图里的每个选题只编码一次（按视图版本缓存），响应体由缓存的片段
+拼接而成，每次请求只编码少量叠加字段（is_favorited、poster_url）。
+未安装 orjson 时回退到标准库 json，输出格式一致。
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import json
+
+from fastapi import Response
+
+from ..core.projections import project
+from .caching import CACHE_CONTROL, VARY
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# 每次请求单独计算、不进入预编码片段的字段
+OVERLAY_FIELDS = ("is_favorited", "poster_url")
+
+
+def dumps(obj: Any) -> bytes:
+    """编码为紧凑 UTF-8 JSON"""
+    if HAS_ORJSON:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class Raw(bytes):
+    """已经编码好的 JSON 片段，encode_object 会原样拼接"""
+
+
+def encode_object(fields: Dict[str, Any]) -> bytes:
+    """编码一个对象，值为 Raw 的字段直接拼接"""
+    parts = []
+    for key, value in fields.items():
+        encoded = value if isinstance(value, Raw) else dumps(value)
+        parts.append(dumps(key) + b":" + encoded)
+    return b"{" + b",".join(parts) + b"}"
+
+
+def encode_array(items: Iterable[bytes]) -> Raw:
+    """把已编码的元素拼成数组"""
+    return Raw(b"[" + b",".join(items) + b"]")
+
+
+class FragmentCache:
+    """
+    排序视图中每个选题的预编码片段（每种字段投影各一份）
+
+    片段是按投影裁剪、去掉叠加字段后的 JSON 对象，再去掉末尾的 '}'，
+    拼接时补上叠加字段和 '}' 即可。视图版本变化时整体清空。
+    """
+
+    def __init__(self):
+        self._key: Optional[Tuple] = None
+        self._fragments: Dict[Tuple[str, int], bytes] = {}
+
+    def get(self, view, rank: int, projection: str = "full") -> bytes:
+        if self._key != view.key:
+            self._key = view.key
+            self._fragments = {}
+
+        fragment = self._fragments.get((projection, rank))
+        if fragment is None:
+            topic = project(view.ranked[rank], projection)
+            base = {k: v for k, v in topic.items() if k not in OVERLAY_FIELDS}
+            fragment = dumps(base)[:-1]
+            self._fragments[(projection, rank)] = fragment
+        return fragment
+
+
+_fragments = FragmentCache()
+
+
+def encode_ranked_topics(view, ranks: List[int], state, posters, projection: str = "full") -> Raw:
+    """
+    把排序视图中的一批选题编码为 JSON 数组
+
+    Args:
+        view: 排序视图
+        ranks: 排名序号
+        state: 用户状态快照（计算 is_favorited）
+        posters: 海报服务（只读缓存，调用前需已预取）
+        projection: 字段投影（full / summary）
+    """
+    items = []
+    for rank in ranks:
+        topic = view.ranked[rank]
+        overlay = b',"is_favorited":' + (b"true" if state.is_favorited(topic["id"]) else b"false")
+        if posters.applies_to(topic):
+            overlay += b',"poster_url":' + dumps(posters.cached(topic["id"]))
+        items.append(_fragments.get(view, rank, projection) + overlay + b"}")
+    return encode_array(items)
+
+
+def json_response(body: bytes, etag: Optional[str] = None) -> Response:
+    """直接返回已编码的 JSON（可选带 ETag）"""
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": VARY} if etag else None
+    return Response(content=body, media_type="application/json", headers=headers)
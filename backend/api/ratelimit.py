@@ -0,0 +1,99 @@
+"""
+限流计数的共享存储 - 多个 worker 共用一个 SQLite 文件
+
+slowapi 底层的 limits 库只内置内存/Redis/Memcached 等存储，这里实现一个
+基于 SQLite 的固定窗口计数器，注册为 sqlite:// 方案：
+    Limiter(..., storage_uri="sqlite:////path/to/ratelimit.db")
+
+limits 的存储接口是同步的，每次计数是一条 UPSERT（单独的数据库文件，
+不和业务库抢写锁）。
+"""
+from typing import Optional
+import sqlite3
+import threading
+import time
+
+from limits.storage import Storage
+
+
+class SQLiteRateLimitStorage(Storage):
+    """固定窗口限流计数（SQLite）"""
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    # 每计数这么多次清理一次过期窗口
+    PURGE_EVERY = 1000
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self.path = uri[len("sqlite:///"):]
+        self._local = threading.local()
+        self._hits = 0
+        with self._connect() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS rate_limits (
+                    key TEXT PRIMARY KEY,
+                    count INTEGER NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _connect(self) -> sqlite3.Connection:
+        """每个线程一个连接（sqlite3 连接不能跨线程使用）"""
+        db: Optional[sqlite3.Connection] = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def incr(self, key: str, expiry: float, elastic_expiry: bool = False, amount: int = 1) -> int:
+        """计数 +amount；窗口已过期时从 amount 重新开始"""
+        now = time.time()
+        db = self._connect()
+        self._hits += 1
+        if self._hits % self.PURGE_EVERY == 0:
+            db.execute("DELETE FROM rate_limits WHERE expires_at <= ?", (now,))
+        row = db.execute(
+            """INSERT INTO rate_limits (key, count, expires_at) VALUES (?, ?, ?)
+               ON CONFLICT(key) DO UPDATE SET
+                   count = CASE WHEN rate_limits.expires_at <= ?
+                                THEN excluded.count ELSE rate_limits.count + excluded.count END,
+                   expires_at = CASE WHEN rate_limits.expires_at <= ? OR ?
+                                     THEN excluded.expires_at ELSE rate_limits.expires_at END
+               RETURNING count""",
+            (key, amount, now + expiry, now, now, elastic_expiry)
+        ).fetchone()
+        return row[0]
+
+    def get(self, key: str) -> int:
+        row = self._connect().execute(
+            "SELECT count FROM rate_limits WHERE key = ? AND expires_at > ?",
+            (key, time.time())
+        ).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key: str) -> float:
+        row = self._connect().execute(
+            "SELECT expires_at FROM rate_limits WHERE key = ? AND expires_at > ?",
+            (key, time.time())
+        ).fetchone()
+        return row[0] if row else time.time()
+
+    def check(self) -> bool:
+        try:
+            self._connect().execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> Optional[int]:
+        return self._connect().execute("DELETE FROM rate_limits").rowcount
+
+    def clear(self, key: str) -> None:
+        self._connect().execute("DELETE FROM rate_limits WHERE key = ?", (key,))
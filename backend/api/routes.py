@@ -1,23 +1,32 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from pydantic import BaseModel, Field
+from fastapi.responses import FileResponse, JSONResponse
+from contextlib import aclosing
 from typing import List, Dict, Any, Literal, Optional
-from datetime import datetime
-import asyncio
+import re
+import secrets
 
-from ..core.collector import TopicCollector, CURATED_TOPICS
+from ..core.collector import TopicCollector
+from ..core.catalog import get_catalog
 from ..data.ingredients import get_ingredients
 from ..core.draft_generator import get_draft_generator
-from ..models.database import (
-    init_db,
-    get_done_topics,
-    mark_topic_done,
-    toggle_favorite,
-    get_favorites,
-    is_favorited,
-    skip_topic,
-    get_skipped_topics,
-    get_skip_stats
-)
+from ..core.events import get_event_bus
+from ..core.jobs import Job, JobConflictError, SUCCEEDED, get_job_manager, visible_to
+from ..core.maintenance import MAINTENANCE_KIND, run_maintenance
+from ..core.projections import project
+from ..core.user_state import UserStateSnapshot, get_user_state
+from ..models.database import DEFAULT_USER
+from ..models.storage import get_storage
+from ..models.backup import BACKUP_PAGES, SnapshotError, create_snapshot, list_snapshots, read_manifest, snapshot_path
+from ..config import settings
+from .caching import compute_etag, etag_matches, not_modified, set_cache_headers
+from .coalescing import SingleFlight
+from .encoding import dumps, encode_object, encode_ranked_topics, json_response
+from .streaming import SSE_HEARTBEAT, sse_event, sse_response
+
+
+# 列表接口的字段投影
+TopicView = Literal["summary", "full"]
 
 
 class SkipRequest(BaseModel):
@@ -25,6 +34,22 @@ class SkipRequest(BaseModel):
     work_name: str
     dish_name: str = ""
     reason: Literal["not_interested", "not_suitable", "too_simple", "done"]
+    # 同时取消收藏（收藏池里的跳过，和跳过记录在同一事务里提交）
+    unfavorite: bool = False
+
+
+class FavoritesUpdateRequest(BaseModel):
+    add: List[str] = Field(default_factory=list, max_length=100)
+    remove: List[str] = Field(default_factory=list, max_length=100)
+
+
+class JobRequest(BaseModel):
+    kind: str
+    params: Dict[str, Any] = {}
+
+
+class BatchTopicsRequest(BaseModel):
+    ids: List[str] = Field(..., max_length=100)
 
 
 class MaterialItem(BaseModel):
@@ -48,170 +73,427 @@ class GenerateDraftRequest(BaseModel):
 
 router = APIRouter(prefix="/api", tags=["topics"])
 
+# 发现池默认每页数量（与前端展示数量一致）
+DEFAULT_PAGE_SIZE = 5
+
 collector = TopicCollector()
 
-# 状态跟踪（使用 Lock 保护并发访问）
-_discovery_lock = asyncio.Lock()
-discovery_status = {
-    "is_running": False,
-    "last_run": None,
-    "last_count": 0
-}
+jobs = get_job_manager()
+
+# 读接口的请求合并：并发的相同请求共享一次计算和编码
+_reads = SingleFlight()
+
+
+# 用户 ID（X-User-Id）：字母数字和 -_.@
+_USER_ID_PATTERN = re.compile(r"^[A-Za-z0-9_.@-]{1,64}$")
+
+
+def current_user(x_user_id: str = Header("")) -> str:
+    """当前用户（请求头 X-User-Id，未提供时为默认用户）"""
+    if not x_user_id:
+        return DEFAULT_USER
+    if not _USER_ID_PATTERN.match(x_user_id):
+        raise HTTPException(status_code=400, detail="无效的 X-User-Id（1-64 位字母、数字或 -_.@）")
+    return x_user_id
+
+
+def _state_versions(state: UserStateSnapshot) -> tuple:
+    """目录内容、评分规则、用户及其状态快照、海报缓存的摘要（各 worker 一致）"""
+    return (
+        get_catalog().digest,
+        collector.SCORING_VERSION,
+        state.user_id,
+        state.digest,
+        collector.posters.digest
+    )
+
+
+def _state_etag(request: Request, versions: tuple) -> str:
+    """
+    读接口的 ETag：目录、用户状态、海报缓存任一变化都会改变，不同用户互不相同
+
+    versions 在构建响应之前取得，响应只用取得版本时的那份用户快照；构建期间
+    状态变化时响应仍带旧 ETag，下次请求不会命中 304。
+    """
+    return compute_etag(request, *versions)
+
+
+async def _run_collect_job(job: Job) -> Dict[str, Any]:
+    """收集任务：加载状态 → 筛选排序 → 获取海报 → 格式化"""
+    user_id = job.params.get("user_id", DEFAULT_USER)
+    async with job.stage("加载用户状态") as stage:
+        state = await get_user_state().snapshot(user_id)
+        stage.update(done=len(state.done), skipped=len(state.skipped), favorites=len(state.favorites))
+
+    async with job.stage("筛选排序") as stage:
+        view = collector.ranked_view()
+        ranks = view.select_ranks(
+            state,
+            topic_type=job.params.get("type"),
+            difficulty=job.params.get("difficulty")
+        )
+        stage["count"] = len(ranks)
+
+    async with job.stage("获取海报") as stage:
+        topics = [view.ranked[r] for r in ranks]
+        wanted = [t for t in topics if collector.posters.applies_to(t)]
+        hits = sum(1 for t in wanted if collector.posters.is_cached(t["id"]))
+        stage.update(cache_hits=hits, cache_misses=len(wanted) - hits)
+        await collector.posters.prefetch(topics)
+        stage["count"] = sum(1 for t in wanted if collector.posters.cached(t["id"]))
+
+    async with job.stage("格式化") as stage:
+        formatted = collector.format_ranked(view, ranks)
+        stage["chars"] = len(formatted)
+
+    # 同步的 /api/collect 用任务实际使用的视图和快照构建响应
+    job.context.update(view=view, ranks=ranks, state=state)
+    return {
+        "count": len(ranks),
+        "topic_ids": [t["id"] for t in topics],
+        "formatted": formatted
+    }
+
+
+async def _run_discover_job(job: Job) -> Dict[str, Any]:
+    """发现任务：豆瓣 + Claude 分析（需要 ANTHROPIC_API_KEY）"""
+    if not settings.ANTHROPIC_API_KEY:
+        raise RuntimeError("未配置 ANTHROPIC_API_KEY，无法运行 AI 发现")
+
+    # TopicDiscovery 依赖 anthropic，按需导入
+    from ..core.discovery import TopicDiscovery
+
+    async with job.stage("发现选题") as stage:
+        topics = await TopicDiscovery().discover_weekly_topics(
+            max_movies=int(job.params.get("max_movies", 30))
+        )
+        stage["count"] = len(topics)
+
+    return {
+        "count": len(topics),
+        "topics": [t.model_dump(mode="json") for t in topics]
+    }
+
+
+async def _run_backup_job(job: Job) -> Dict[str, Any]:
+    """备份任务：在线分步复制数据库 → 校验 → 压缩（结果不含服务器上的数据库路径）"""
+    async with job.stage("创建快照") as stage:
+        manifest = await create_snapshot(pages=int(job.params.get("pages", BACKUP_PAGES)))
+        stage.update(name=manifest["name"], steps=manifest["steps"], restarts=manifest["restarts"])
+    return {k: v for k, v in manifest.items() if k != "source"}
+
+
+jobs.register("collect", _run_collect_job, per_user=True)
+jobs.register("discover", _run_discover_job)
+jobs.register(MAINTENANCE_KIND, run_maintenance, in_status=False)
+jobs.register("backup", _run_backup_job, in_status=False)
+
+# POST /api/jobs 可以提交的任务类型（备份只能走需要管理令牌的 /api/admin/backups）
+PUBLIC_JOB_KINDS = ("collect", "discover", MAINTENANCE_KIND)
+
+
+async def _submit_job(kind: str, params: Dict[str, Any]) -> Job:
+    try:
+        return await jobs.submit(kind, params)
+    except JobConflictError as e:
+        raise HTTPException(status_code=409, detail=f"任务正在运行中: {e.job_id}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _job_accepted(job: Job) -> JSONResponse:
+    return JSONResponse(
+        status_code=202,
+        content={"job_id": job.id, "status": job.status, "url": f"/api/jobs/{job.id}"}
+    )
 
 
 @router.get("/status")
-async def get_status():
-    """获取发现状态"""
-    return discovery_status
+async def get_status(user_id: str = Depends(current_user)):
+    """获取发现状态（运行中的任务不含其他用户的收集任务）"""
+    return await jobs.status(user_id)
 
 
 @router.post("/collect")
-async def trigger_collect():
-    """收集选题候选（返回完整数据）"""
-    async with _discovery_lock:
-        if discovery_status["is_running"]:
-            raise HTTPException(status_code=409, detail="收集任务正在运行中")
-        discovery_status["is_running"] = True
+async def trigger_collect(
+    projection: TopicView = Query("full", alias="view"),
+    background: bool = False,
+    user_id: str = Depends(current_user)
+):
+    """
+    收集选题候选（默认返回完整数据，view=summary 只返回卡片字段）
 
-    try:
-        # 获取所有符合条件的选题
-        topics = await collector.collect_topics()
-
-        # 获取收藏状态
-        favorites = await get_favorites()
-        favorite_ids = set(favorites)
-
-        # 标记收藏状态
-        for topic in topics:
-            topic["is_favorited"] = topic.get("id") in favorite_ids
-
-        async with _discovery_lock:
-            discovery_status["last_run"] = datetime.now().isoformat()
-            discovery_status["last_count"] = len(topics)
-
-        return {
-            "status": "success",
-            "count": len(topics),
-            "topics": topics,
-            "formatted": collector.format_for_analysis(topics),
-            "message": f"收集完成！{len(topics)}个选题已准备好"
-        }
-    finally:
-        async with _discovery_lock:
-            discovery_status["is_running"] = False
+    background=true 时立即返回 202 和任务 ID，进度见 /api/jobs/{id}；
+    否则等待任务完成后返回结果（客户端断开不影响任务继续运行）。
+    """
+    job = await _submit_job("collect", {"user_id": user_id})
+    if background:
+        return _job_accepted(job)
+
+    await jobs.wait(job)
+    if job.status != SUCCEEDED:
+        raise HTTPException(status_code=500, detail=job.error or "收集失败")
+
+    # 响应与任务结果一致：用任务的排序视图、序号和用户快照拼接预编码片段（海报已预取）
+    view, ranks, state = job.context["view"], job.context["ranks"], job.context["state"]
+    return json_response(encode_object({
+        "status": "success",
+        "count": job.result["count"],
+        "topics": encode_ranked_topics(view, ranks, state, collector.posters, projection),
+        "formatted": job.result["formatted"],
+        "message": f"收集完成！{job.result['count']}个选题已准备好"
+    }))
+
+
+@router.post("/jobs")
+async def create_job(request: JobRequest, user_id: str = Depends(current_user)):
+    """提交后台任务（collect / discover / maintenance），返回 202 和任务 ID（collect 按当前用户的状态筛选）"""
+    if request.kind not in PUBLIC_JOB_KINDS:
+        raise HTTPException(status_code=400, detail=f"不支持的任务类型: {request.kind}（可选 {', '.join(PUBLIC_JOB_KINDS)}）")
+    # 只有 collect 按用户运行；其他任务不接受 user_id（否则会对其他用户隐藏）
+    params = {k: v for k, v in request.params.items() if k != "user_id"}
+    if request.kind == "collect":
+        params["user_id"] = user_id
+    job = await _submit_job(request.kind, params)
+    return _job_accepted(job)
+
+
+@router.get("/jobs")
+async def get_jobs(limit: int = Query(20, ge=1, le=100), user_id: str = Depends(current_user)):
+    """最近的任务列表（不含其他用户的收集任务）"""
+    history = await jobs.history(limit, user_id)
+    return {"jobs": history, "count": len(history)}
+
+
+@router.get("/jobs/{job_id}")
+async def get_job_status(job_id: str, user_id: str = Depends(current_user)):
+    """任务状态（阶段、计数、耗时、结果），其他用户的任务视为不存在"""
+    job = await jobs.get(job_id)
+    if job is None or not visible_to(job, user_id):
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, user_id: str = Depends(current_user)):
+    """任务进度事件流（SSE），任务结束后关闭"""
+    live = jobs.live(job_id)
+    if live is None:
+        # 不在本 worker 上（或是历史任务）：轮询数据库
+        snapshot = await jobs.get(job_id)
+        if snapshot is None or not visible_to(snapshot, user_id):
+            raise HTTPException(status_code=404, detail="任务不存在")
+        source = jobs.watch(snapshot)
+    elif not visible_to(live.to_dict(), user_id):
+        raise HTTPException(status_code=404, detail="任务不存在")
+    else:
+        source = live.events()
+
+    async def stream():
+        async with aclosing(source) as events:
+            async for snapshot in events:
+                yield sse_event("job", snapshot)
+    return sse_response(stream())
+
+
+@router.get("/discovery/events")
+async def stream_discovery_events(
+    request: Request,
+    since: Optional[int] = Query(None, ge=0),
+    user_id: str = Depends(current_user)
+):
+    """
+    发现/收集进度事件流（SSE）
+
+    事件类型：discovery 频道（run_started / stage / movie / movie_skipped / llm /
+    candidate / run_finished / run_failed）和 job 频道（任务状态变化）。
+    候选选题在找到时就以 candidate 事件推送。断线重连时浏览器会带上
+    Last-Event-ID，服务端补发缓冲中错过的事件；也可用 since 参数指定起点。
+    其他用户的收集任务不推送（同 /api/jobs/{id}）。
+    """
+    last_event_id = request.headers.get("last-event-id")
+    if since is None and last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+
+    bus = get_event_bus()
+
+    async def stream():
+        # aclosing：客户端断开时立即注销订阅
+        async with aclosing(bus.subscribe(since, channels=("discovery", "job"), heartbeat=15.0)) as events:
+            async for event in events:
+                if event is None:
+                    yield SSE_HEARTBEAT
+                elif event["channel"] == "job" and not visible_to(event, user_id):
+                    continue
+                else:
+                    yield sse_event(event["type"], event, event["id"])
+    return sse_response(stream())
 
 
 @router.get("/topics")
-async def get_topics(limit: int = None) -> List[Dict[str, Any]]:
-    """获取选题候选列表（完整数据，含海报）"""
-    topics = await collector.collect_topics(max_count=limit)
-
-    # 获取收藏状态
-    favorites = await get_favorites()
-    favorite_ids = set(favorites)
-
-    # 标记收藏状态，并为影视美食获取海报
-    async def enrich_topic(topic: Dict[str, Any]) -> Dict[str, Any]:
-        topic["is_favorited"] = topic.get("id") in favorite_ids
-
-        # 为影视美食类型获取 TMDB 海报
-        if topic.get("topic_type") == "movie_food" and not topic.get("poster_url"):
-            if collector.tmdb:
-                try:
-                    poster_url = await collector.tmdb.get_movie_poster(
-                        topic.get("work_name", ""),
-                        topic.get("release_year"),
-                        topic.get("english_name")
-                    )
-                    topic["poster_url"] = poster_url
-                except Exception:
-                    topic["poster_url"] = None
-
-        return topic
-
-    # 并发获取所有海报
-    enriched_topics = await asyncio.gather(*[enrich_topic(t) for t in topics])
-    return list(enriched_topics)
+async def get_topics(
+    request: Request,
+    limit: int = None,
+    topic_type: Optional[str] = Query(None, alias="type"),
+    difficulty: Optional[str] = None,
+    page_size: Optional[int] = Query(None, ge=1, le=100),
+    cursor: Optional[str] = None,
+    projection: TopicView = Query("full", alias="view"),
+    user_id: str = Depends(current_user)
+):
+    """
+    获取选题候选列表（含海报）
+
+    不带 page_size / cursor 时返回全部符合条件的选题（数组）；
+    带上后按 (得分, ID) 游标分页，返回 {topics, next_cursor, total}，
+    海报只为本页获取。view=summary 只返回卡片字段，完整数据走 /api/topics/{id}。
+    已做/已跳过/已收藏按当前用户（X-User-Id）过滤。
+    """
+    state = await get_user_state().snapshot(user_id)
+    versions = _state_versions(state)
+    etag = _state_etag(request, versions)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    paged = page_size is not None or cursor is not None
+
+    async def build():
+        if paged:
+            view, ranks, next_cursor, total = await collector.page_ranked(
+                page_size or DEFAULT_PAGE_SIZE,
+                cursor=cursor,
+                topic_type=topic_type,
+                difficulty=difficulty,
+                state=state
+            )
+            return encode_object({
+                "topics": encode_ranked_topics(view, ranks, state, collector.posters, projection),
+                "next_cursor": next_cursor,
+                "total": total
+            })
+
+        view, ranks = await collector.select_ranked(
+            max_count=limit,
+            topic_type=topic_type,
+            difficulty=difficulty,
+            state=state
+        )
+
+        # 预编码片段 + 收藏状态/海报叠加字段（海报已在选出时预取）
+        return encode_ranked_topics(view, ranks, state, collector.posters, projection)
+
+    key = (
+        "topics", limit, topic_type, difficulty,
+        page_size if paged else None, cursor, projection,
+        versions
+    )
+    try:
+        body = await _reads.do(key, build)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return json_response(body, etag)
 
 
 @router.get("/topics/formatted")
-async def get_formatted_topics():
+async def get_formatted_topics(user_id: str = Depends(current_user)):
     """获取格式化的选题列表（供 Claude Code 分析）"""
-    topics = await collector.collect_topics()
+    view, ranks = await collector.select_ranked(user_id=user_id)
     return {
-        "formatted": collector.format_for_analysis(topics),
-        "count": len(topics)
+        "formatted": collector.format_ranked(view, ranks),
+        "count": len(ranks)
     }
 
 
 @router.post("/topics/{topic_id}/favorite")
-async def toggle_topic_favorite(topic_id: str):
+async def toggle_topic_favorite(topic_id: str, user_id: str = Depends(current_user)):
     """切换选题收藏状态"""
-    is_now_favorited = await toggle_favorite(topic_id)
+    is_now_favorited = await get_user_state().toggle_favorite(topic_id, user_id)
     return {
         "topic_id": topic_id,
         "is_favorited": is_now_favorited
     }
 
 
+@router.post("/favorites")
+async def update_favorite_topics(request: FavoritesUpdateRequest, user_id: str = Depends(current_user)):
+    """批量收藏/取消收藏（一个事务），返回实际发生变化的选题"""
+    overlap = set(request.add) & set(request.remove)
+    if overlap:
+        raise HTTPException(status_code=400, detail=f"add 和 remove 不能包含相同选题: {', '.join(sorted(overlap))}")
+
+    state = get_user_state()
+    added, removed = await state.update_favorites(request.add, request.remove, user_id)
+    return {
+        "added": added,
+        "removed": removed,
+        "count": len((await state.snapshot(user_id)).favorites)
+    }
+
+
 @router.get("/favorites")
-async def get_favorite_topics():
+async def get_favorite_topics(user_id: str = Depends(current_user)):
     """获取收藏的选题ID列表"""
-    favorites = await get_favorites()
+    favorites = list((await get_user_state().snapshot(user_id)).favorites)
     return {"favorites": favorites, "count": len(favorites)}
 
 
 @router.get("/favorites/full")
-async def get_favorite_topics_full():
-    """获取收藏选题的完整数据（带海报等）"""
-    favorites = await get_favorites()
-    if not favorites:
-        return {"topics": [], "count": 0}
-
-    favorite_set = set(favorites)
-    result = []
-
-    for topic in CURATED_TOPICS:
-        if topic.get("id") in favorite_set:
-            # 获取海报
-            poster_url = None
-            if collector.tmdb:
-                try:
-                    poster_url = await collector.tmdb.get_movie_poster(
-                        topic["work_name"],
-                        topic.get("release_year")
-                    )
-                except Exception:
-                    pass
-
-            # 构建完整数据
-            result.append({
+async def get_favorite_topics_full(
+    request: Request,
+    projection: TopicView = Query("full", alias="view"),
+    user_id: str = Depends(current_user)
+):
+    """获取收藏选题的数据（带海报等，view=summary 只返回卡片字段）"""
+    state = await get_user_state().snapshot(user_id)
+    versions = _state_versions(state)
+    etag = _state_etag(request, versions)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    async def build():
+        favorites = state.favorites
+        if not favorites:
+            return dumps({"topics": [], "count": 0})
+
+        # 按目录顺序返回收藏的选题
+        catalog = get_catalog()
+        favorite_topics = sorted(catalog.get_many(favorites), key=lambda t: catalog.ordinal(t["id"]))
+
+        # 一次并发获取全部海报（走缓存），延迟不随收藏数线性增长
+        await collector.posters.prefetch(favorite_topics)
+
+        result = [
+            project({
                 **topic,
-                "poster_url": poster_url,
+                "poster_url": collector.posters.cached(topic["id"]),
                 "is_favorited": True,
                 "is_done": False,
-                "collected_at": datetime.now().isoformat()
-            })
+                "collected_at": catalog.updated_at
+            }, projection)
+            for topic in favorite_topics
+        ]
+        return dumps({"topics": result, "count": len(result)})
 
-    return {"topics": result, "count": len(result)}
+    body = await _reads.do(("favorites/full", projection, versions), build)
+    return json_response(body, etag)
 
 
 @router.post("/topics/done")
-async def mark_done(work_name: str, dish_name: str = ""):
+async def mark_done(work_name: str, dish_name: str = "", user_id: str = Depends(current_user)):
     """标记选题为已完成（不再推荐）"""
-    await mark_topic_done(work_name, dish_name)
+    await get_user_state().mark_done(work_name, dish_name, user_id)
     return {"status": "success", "message": f"已标记 {work_name} 为已完成"}
 
 
 @router.get("/done")
-async def get_done():
+async def get_done(user_id: str = Depends(current_user)):
     """获取已完成的选题列表"""
-    done = await get_done_topics()
-    return {"done_topics": done, "count": len(done)}
+    done = (await get_user_state().snapshot(user_id)).done
+    return {"done_topics": list(done), "count": len(done)}
 
 
 @router.post("/topics/skip")
-async def skip_topic_endpoint(request: SkipRequest):
+async def skip_topic_endpoint(request: SkipRequest, user_id: str = Depends(current_user)):
     """
     跳过一个选题，记录原因用于学习偏好
 
@@ -220,29 +502,59 @@ async def skip_topic_endpoint(request: SkipRequest):
     - not_suitable: 不适合我做（技术/设备/食材限制）
     - too_simple: 画面太简单，撑不起内容
     - done: 已经做过了
+
+    unfavorite=true 时同时取消收藏（一个事务完成）。
     """
-    await skip_topic(
-        request.topic_id,
-        request.work_name,
-        request.dish_name,
-        request.reason
-    )
-    return {
+    # 选题类型和菜品起源一并记录，用于按维度统计跳过（不在精选目录里的查发现的选题）
+    topic = get_catalog().get(request.topic_id)
+    if topic is not None:
+        topic_type = topic.get("topic_type", "movie_food")
+        dish_origin = topic.get("dish_origin")
+    else:
+        discovered = await get_storage().get_topic(request.topic_id)
+        topic_type = discovered.topic_type.value if discovered else None
+        dish_origin = discovered.dish_origin if discovered else None
+    state = get_user_state()
+    if request.unfavorite:
+        was_favorited = await state.unfavorite_and_skip(
+            request.topic_id,
+            request.work_name,
+            request.dish_name,
+            request.reason,
+            topic_type,
+            dish_origin,
+            user_id
+        )
+    else:
+        await state.skip(
+            request.topic_id,
+            request.work_name,
+            request.dish_name,
+            request.reason,
+            topic_type,
+            dish_origin,
+            user_id
+        )
+        was_favorited = None
+    result = {
         "status": "success",
         "message": f"已跳过 {request.work_name}",
         "reason": request.reason
     }
+    if was_favorited is not None:
+        result["was_favorited"] = was_favorited
+    return result
 
 
 @router.get("/skip-stats")
-async def get_skip_statistics():
-    """获取跳过统计，用于分析用户偏好"""
-    stats = await get_skip_stats()
+async def get_skip_statistics(user_id: str = Depends(current_user)):
+    """获取当前用户的跳过统计，用于分析偏好"""
+    stats = await get_storage().get_skip_stats(user_id=user_id)
     return stats
 
 
 @router.get("/topics/single/random")
-async def get_single_random_topic(exclude: str = ""):
+async def get_single_random_topic(exclude: str = "", user_id: str = Depends(current_user)):
     """
     获取单个新选题（用于补充列表）
 
@@ -251,80 +563,105 @@ async def get_single_random_topic(exclude: str = ""):
     """
     exclude_ids = set(exclude.split(",")) if exclude else set()
 
-    # 获取已做过和已跳过的选题
-    done_topics = await get_done_topics()
-    done_set = set(done_topics)
-    skipped_topics = await get_skipped_topics()
-
-    for topic in CURATED_TOPICS:
-        topic_key = f"{topic['work_name']}·{topic['recommended_dish']}"
-
-        # 跳过已显示的
-        if topic['id'] in exclude_ids:
-            continue
-
-        # 跳过已做过的
-        if topic['work_name'] in done_set or topic_key in done_set:
-            continue
-
-        # 跳过已pass的
-        if topic['id'] in skipped_topics:
-            continue
-
-        # 获取海报
-        poster_url = None
-        if collector.tmdb:
-            try:
-                poster_url = await collector.tmdb.get_movie_poster(
-                    topic["work_name"],
-                    topic.get("release_year")
-                )
-            except Exception:
-                pass
-
-        # 返回第一个符合条件的选题
-        result = {
-            **topic,
-            "poster_url": poster_url,
-            "is_favorited": await is_favorited(topic['id']),
-            "is_done": False,
-            "collected_at": datetime.now().isoformat()
-        }
-        return result
+    # 获取已做过和已跳过的选题（内存快照）
+    state = await get_user_state().snapshot(user_id)
+    catalog = get_catalog()
+
+    # 单次遍历目录，取第一个未显示、未做过、未pass的选题
+    topic = next(
+        (
+            t for t in catalog
+            if t['id'] not in exclude_ids
+            and t['id'] not in state.skipped
+            and not state.is_done(t['work_name'], t['recommended_dish'])
+        ),
+        None
+    )
 
     # 没有更多选题
-    return None
+    if topic is None:
+        return None
+
+    # 获取海报（走缓存）
+    await collector.posters.prefetch([topic])
+
+    return {
+        **topic,
+        "poster_url": collector.posters.cached(topic['id']),
+        "is_favorited": state.is_favorited(topic['id']),
+        "is_done": False,
+        "collected_at": catalog.updated_at
+    }
+
+
+def _topic_detail(topic: Dict[str, Any], state, collected_at: str) -> Dict[str, Any]:
+    """单个选题详情（海报读缓存，调用前需已预取）"""
+    return {
+        **topic,
+        "poster_url": collector.posters.cached(topic["id"]),
+        "is_favorited": state.is_favorited(topic["id"]),
+        "is_done": False,
+        "collected_at": collected_at,
+        "ingredients": get_ingredients(topic.get("recommended_dish", ""))
+    }
+
+
+@router.post("/topics/batch")
+async def get_topics_batch(
+    request: BatchTopicsRequest,
+    projection: TopicView = Query("full", alias="view"),
+    user_id: str = Depends(current_user)
+):
+    """
+    批量获取选题详情
+
+    一次目录查找 + 一次用户状态读取 + 一次并发海报预取；
+    结果按请求顺序返回，找不到的 ID 单独给出错误。
+    """
+    catalog = get_catalog()
+    state = await get_user_state().snapshot(user_id)
+
+    found = {tid: catalog.get(tid) for tid in request.ids}
+    await collector.posters.prefetch([t for t in found.values() if t is not None])
+
+    results = []
+    for topic_id in request.ids:
+        topic = found[topic_id]
+        if topic is None:
+            results.append({"id": topic_id, "error": {"status": 404, "detail": "选题不存在"}})
+        else:
+            detail = _topic_detail(topic, state, catalog.updated_at)
+            results.append({"id": topic_id, "topic": project(detail, projection)})
+
+    return {"results": results, "count": len(results)}
 
 
 @router.get("/topics/{topic_id}")
-async def get_topic_by_id(topic_id: str):
+async def get_topic_by_id(
+    topic_id: str,
+    request: Request,
+    response: Response,
+    user_id: str = Depends(current_user)
+):
     """获取单个选题详情"""
-    # 直接从静态数据中查找，不受过滤逻辑影响
-    for topic in CURATED_TOPICS:
-        if topic.get("id") == topic_id:
-            # 获取海报
-            poster_url = None
-            if collector.tmdb:
-                try:
-                    poster_url = await collector.tmdb.get_movie_poster(
-                        topic["work_name"],
-                        topic.get("release_year")
-                    )
-                except Exception:
-                    pass
-
-            # 构建完整的返回数据
-            result = {
-                **topic,
-                "poster_url": poster_url,
-                "is_favorited": await is_favorited(topic_id),
-                "is_done": False,
-                "collected_at": datetime.now().isoformat(),
-                "ingredients": get_ingredients(topic.get("recommended_dish", ""))
-            }
-            return result
+    state = await get_user_state().snapshot(user_id)
+    etag = _state_etag(request, _state_versions(state))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    # 直接从目录中查找，不受过滤逻辑影响
+    catalog = get_catalog()
+    topic = catalog.get(topic_id)
+    if topic is None:
+        raise HTTPException(status_code=404, detail="选题不存在")
 
-    raise HTTPException(status_code=404, detail="选题不存在")
+    # 获取海报（走缓存）
+    await collector.posters.prefetch([topic])
+
+    # 构建完整的返回数据
+    result = _topic_detail(topic, state, catalog.updated_at)
+    set_cache_headers(response, etag)
+    return result
 
 
 @router.post("/workflow/{topic_id}/generate-materials")
@@ -332,15 +669,11 @@ async def generate_materials(topic_id: str, request: Dict[str, Any]):
     """
     生成素材（结合预置数据 + 待挖掘方向）
 
-    优先使用 CURATED_TOPICS 中的真实数据作为已核实素材，
+    优先使用 精选目录中的真实数据作为已核实素材，
     其他方向作为待挖掘提示。
     """
-    # 从 CURATED_TOPICS 查找完整选题数据
-    topic_data = None
-    for topic in CURATED_TOPICS:
-        if topic.get("id") == topic_id:
-            topic_data = topic
-            break
+    # 从精选目录查找完整选题数据
+    topic_data = get_catalog().get(topic_id)
 
     # 如果没找到，用请求中的数据
     work_name = topic_data.get("work_name") if topic_data else request.get("work_name", "未知作品")
@@ -424,11 +757,7 @@ async def generate_draft(topic_id: str, request: GenerateDraftRequest):
     根据用户选择的素材和大纲结构，调用 Claude API 生成符合熙崽风格的文案。
     """
     # 获取选题完整信息
-    topic_data = None
-    for topic in CURATED_TOPICS:
-        if topic.get("id") == topic_id:
-            topic_data = topic
-            break
+    topic_data = get_catalog().get(topic_id)
 
     if not topic_data:
         raise HTTPException(status_code=404, detail="选题不存在")
@@ -491,5 +820,52 @@ async def get_ai_status():
 
 @router.get("/health")
 async def health():
-    """健康检查"""
-    return {"status": "healthy", "version": "3.0", "name": "XZstudio"}
+    """健康检查（附数据库连接池等待统计、用户状态缓存统计）"""
+    return {
+        "status": "healthy",
+        "version": "3.0",
+        "name": "XZstudio",
+        "database": get_storage().stats(),
+        "user_state": get_user_state().stats()
+    }
+
+
+# ============ 管理接口 ============
+
+def _require_admin(token: str):
+    """校验管理令牌（未配置 ADMIN_TOKEN 时管理接口不可用）"""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="未配置 ADMIN_TOKEN，管理接口不可用")
+    if not secrets.compare_digest(token, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="管理令牌无效")
+
+
+@router.post("/admin/backups")
+async def create_backup(x_admin_token: str = Header("")):
+    """在线创建数据库快照（后台任务，不停服、不阻塞写入），返回 202 和任务 ID"""
+    _require_admin(x_admin_token)
+    if get_storage().name != "sqlite":
+        raise HTTPException(status_code=409, detail=f"{get_storage().name} 存储请用数据库自带的备份工具（如 pg_dump）")
+    job = await _submit_job("backup", {})
+    return _job_accepted(job)
+
+
+@router.get("/admin/backups")
+async def get_backups(x_admin_token: str = Header("")):
+    """已有快照（新的在前，含校验和、大小、表结构版本）"""
+    _require_admin(x_admin_token)
+    snapshots = list_snapshots()
+    return {"backups": snapshots, "count": len(snapshots)}
+
+
+@router.get("/admin/backups/{name}")
+async def download_backup(name: str, x_admin_token: str = Header("")):
+    """下载快照（gzip），X-Snapshot-SHA256 为解压后数据库的校验和"""
+    _require_admin(x_admin_token)
+    try:
+        path = snapshot_path(name)
+    except SnapshotError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    manifest = read_manifest(path) or {}
+    headers = {"X-Snapshot-SHA256": manifest["sha256"]} if manifest.get("sha256") else None
+    return FileResponse(path, media_type="application/gzip", filename=path.name, headers=headers)
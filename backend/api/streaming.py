@@ -0,0 +1,30 @@
+"""
+Server-Sent Events 工具
+
+事件格式：`event: <name>` + `data: <JSON>`，以空行结束。
+响应关闭代理缓冲，保证事件即时送达。
+"""
+from typing import Any, AsyncIterator, Optional
+
+from fastapi.responses import StreamingResponse
+
+from .encoding import dumps
+
+
+# 心跳（注释行，EventSource 会忽略），防止代理断开空闲连接
+SSE_HEARTBEAT = b": ping\n\n"
+
+
+def sse_event(event: str, data: Any, event_id: Optional[int] = None) -> bytes:
+    """编码一条 SSE 事件（带 id 时客户端重连会发送 Last-Event-ID）"""
+    head = b"id: %d\n" % event_id if event_id is not None else b""
+    return head + b"event: " + event.encode("utf-8") + b"\ndata: " + dumps(data) + b"\n\n"
+
+
+def sse_response(events: AsyncIterator[bytes]) -> StreamingResponse:
+    """把事件生成器包装为 SSE 响应"""
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,6 +1,6 @@
 from pydantic_settings import BaseSettings
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 
 
 class Settings(BaseSettings):
@@ -9,6 +9,42 @@ class Settings(BaseSettings):
     DATABASE_PATH: Path = Path("data/topics.db")
     DOUBAN_DELAY: float = 2.0  # 请求间隔，避免被ban
 
+    # 部署：uvicorn worker 数（>1 时启用跨进程同步和共享限流计数）
+    WORKERS: int = 1
+
+    # 存储后端：sqlite（本地文件，默认）/ postgres（多节点共享，需要 asyncpg 和 DATABASE_URL）
+    STORAGE_BACKEND: str = "sqlite"
+    DATABASE_URL: str = ""
+    # PostgreSQL 连接池大小、每个连接缓存的预编译语句数
+    PG_POOL_MIN: int = 2
+    PG_POOL_MAX: int = 10
+    PG_STATEMENT_CACHE: int = 256
+    # 限流计数的存储（如 redis://host:6379；为空时多 worker 用本地 SQLite 文件，单 worker 用内存）
+    RATELIMIT_STORAGE_URI: str = ""
+    # 是否对所有接口强制限流（默认关闭；开启后按客户端 IP 计数，任务/发现进度的轮询和事件流不计数）
+    RATELIMIT_ENABLED: bool = False
+
+    # 多用户：内存里缓存状态快照和发现池过滤结果的用户数（最近访问的优先保留）
+    USER_CACHE_SIZE: int = 64
+
+    # 数据库：性能档位（durable / balanced / fast，见 database.DB_PROFILES）、
+    # 只读连接数（0 表示读写共用一个连接）
+    DB_PROFILE: str = "balanced"
+    DB_READERS: int = 4
+    # mmap 大小（字节），设置后覆盖档位里的 mmap_size
+    DB_MMAP_SIZE: Optional[int] = None
+    # 写合并：最多等待的毫秒数、每批最多操作数
+    DB_BATCH_DELAY_MS: float = 2.0
+    DB_BATCH_SIZE: int = 256
+    # 保留策略：热表保留最近几次发现（更早的压缩归档）、维护间隔（小时，0 表示不自动维护）
+    RETENTION_RUNS: int = 20
+    MAINTENANCE_INTERVAL_HOURS: float = 24.0
+    # 在线备份：快照目录（空表示 ~/.xzstudio/backups）、保留的快照数
+    BACKUP_DIR: str = ""
+    BACKUP_KEEP: int = 7
+    # 管理接口（/api/admin/*）的访问令牌，请求头 X-Admin-Token；为空时管理接口不可用
+    ADMIN_TOKEN: str = ""
+
     # 熙崽的筛选标准
     COOKING_SKILLS: List[str] = ["烘焙", "西餐", "甜点", "意大利菜", "法餐"]
     EXCLUDED_COOKING: List[str] = ["猛火爆炒", "中式炒菜", "烧烤"]
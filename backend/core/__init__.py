@@ -1,6 +1,14 @@
 from .collector import TopicCollector
+from .catalog import TopicCatalog, get_catalog
+from .user_state import UserStateService, get_user_state
 
 # TopicDiscovery 需要 anthropic API，暂时禁用
 # from .discovery import TopicDiscovery
 
-__all__ = ["TopicCollector"]
+__all__ = [
+    "TopicCollector",
+    "TopicCatalog",
+    "get_catalog",
+    "UserStateService",
+    "get_user_state",
+]
@@ -0,0 +1,117 @@
+"""
+选题目录仓库 - 主键索引 + 二级索引
+
+路由层统一通过这里按 ID / 类型 / 作品查找选题，避免每次线性扫描 CURATED_TOPICS。
+"""
+from typing import List, Dict, Any, Optional, Iterable, Iterator
+from datetime import datetime
+import hashlib
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class TopicCatalog:
+    """选题目录（只读视图，修改请用 replace / upsert，会递增版本号并重算内容摘要）"""
+
+    def __init__(self, topics: Iterable[Dict[str, Any]] = ()):
+        self.version = 0
+        # 内容摘要：只由选题内容决定，各 worker 加载同一份目录时相同（用于 ETag）
+        self.digest = ""
+        self.updated_at = datetime.now().isoformat()
+        self._topics: List[Dict[str, Any]] = []
+        self._by_id: Dict[str, Dict[str, Any]] = {}
+        self._ordinal: Dict[str, int] = {}
+        self._by_type: Dict[str, List[Dict[str, Any]]] = {}
+        self._by_work: Dict[str, List[Dict[str, Any]]] = {}
+        self.replace(topics)
+
+    def replace(self, topics: Iterable[Dict[str, Any]]):
+        """整体替换目录并重建索引"""
+        self._topics = list(topics)
+        self._reindex()
+
+    def upsert(self, topic: Dict[str, Any]):
+        """新增或替换单个选题"""
+        ordinal = self._ordinal.get(topic["id"])
+        if ordinal is None:
+            self._topics.append(topic)
+        else:
+            self._topics[ordinal] = topic
+        self._reindex()
+
+    def _reindex(self):
+        by_id: Dict[str, Dict[str, Any]] = {}
+        ordinal: Dict[str, int] = {}
+        by_type: Dict[str, List[Dict[str, Any]]] = {}
+        by_work: Dict[str, List[Dict[str, Any]]] = {}
+
+        for i, topic in enumerate(self._topics):
+            topic_id = topic["id"]
+            if topic_id in by_id:
+                logger.warning(f"选题ID重复，后者覆盖前者: {topic_id}")
+            by_id[topic_id] = topic
+            ordinal[topic_id] = i
+            by_type.setdefault(topic.get("topic_type", "movie_food"), []).append(topic)
+            by_work.setdefault(topic.get("work_name", ""), []).append(topic)
+
+        self._by_id = by_id
+        self._ordinal = ordinal
+        self._by_type = by_type
+        self._by_work = by_work
+        self.digest = self._digest(self._topics)
+        self.version += 1
+        self.updated_at = datetime.now().isoformat()
+
+    @staticmethod
+    def _digest(topics: List[Dict[str, Any]]) -> str:
+        # collected_at 是排序视图写入的构建时间，不算内容
+        h = hashlib.sha1()
+        for topic in topics:
+            content = {k: v for k, v in topic.items() if k != "collected_at"}
+            h.update(json.dumps(content, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"))
+        return h.hexdigest()
+
+    def __len__(self) -> int:
+        return len(self._topics)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self._topics)
+
+    def __contains__(self, topic_id: str) -> bool:
+        return topic_id in self._by_id
+
+    def get(self, topic_id: str) -> Optional[Dict[str, Any]]:
+        """按 ID 查找选题"""
+        return self._by_id.get(topic_id)
+
+    def get_many(self, topic_ids: Iterable[str]) -> List[Dict[str, Any]]:
+        """按 ID 批量查找，保持传入顺序，忽略不存在的 ID"""
+        by_id = self._by_id
+        return [by_id[tid] for tid in topic_ids if tid in by_id]
+
+    def ordinal(self, topic_id: str) -> int:
+        """选题在目录中的位置（用于保持目录顺序）"""
+        return self._ordinal[topic_id]
+
+    def by_type(self, topic_type: str) -> List[Dict[str, Any]]:
+        """按类型获取选题（目录顺序）"""
+        return self._by_type.get(topic_type, [])
+
+    def by_work(self, work_name: str) -> List[Dict[str, Any]]:
+        """按作品名获取选题（同一作品可能有多道菜）"""
+        return self._by_work.get(work_name, [])
+
+
+_catalog: Optional[TopicCatalog] = None
+
+
+def get_catalog() -> TopicCatalog:
+    """获取精选目录单例"""
+    global _catalog
+    if _catalog is None:
+        from .collector import CURATED_TOPICS
+        _catalog = TopicCatalog(CURATED_TOPICS)
+        logger.info(f"选题目录已加载: {len(_catalog)} 个选题")
+    return _catalog
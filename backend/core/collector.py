@@ -2,7 +2,7 @@
 数据收集模块 - 不需要 API Key
 使用静态数据 + Claude Code 分析的方式发现选题
 """
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 import json
 import logging
@@ -11,9 +11,12 @@ import asyncio
 
 from ..scrapers.douban import DoubanScraper
 from ..scrapers.tmdb import TMDBClient
-from ..models.database import get_done_topics, get_skipped_topics, get_favorites
 from ..config import settings
-from ..data.ingredients import get_ingredients
+from .catalog import get_catalog
+from .posters import PosterService
+from .ranking import RankedView, RankedViewCache
+from .user_state import UserStateSnapshot, get_user_state
+from ..models.database import DEFAULT_USER
 
 logger = logging.getLogger(__name__)
 
@@ -3262,140 +3265,167 @@ CURATED_TOPICS = [
 class TopicCollector:
     """选题数据收集器（静态数据 + 质量筛选 + 海报获取）"""
 
+    # 修改 _validate_topic / _calculate_score 的规则时递增，使排序视图缓存失效
+    SCORING_VERSION = 1
+
     def __init__(self, delay: float = 2.0):
         self.douban = DoubanScraper(delay=delay)
         self.tmdb = TMDBClient(settings.TMDB_API_KEY) if settings.TMDB_API_KEY else None
+        self.posters = PosterService(self.tmdb)
+        self._ranked = RankedViewCache(
+            catalog=get_catalog,
+            catalog_version=lambda: get_catalog().version,
+            validate=self._validate_topic,
+            score=self._calculate_score,
+            scoring_version=lambda: self.SCORING_VERSION,
+            cache_size=settings.USER_CACHE_SIZE
+        )
+        self._formatted: Optional[Tuple[Tuple, str]] = None
+
+    def ranked_view(self) -> RankedView:
+        """当前目录版本的排序视图"""
+        return self._ranked.get()
+
+    async def select_ranked(
+        self,
+        max_count: int = None,
+        topic_type: str = None,
+        difficulty: str = None,
+        user_id: str = DEFAULT_USER,
+        state: Optional[UserStateSnapshot] = None
+    ) -> Tuple[RankedView, List[int]]:
+        """
+        选出符合条件的选题，返回 (排序视图, 排名序号列表)
+
+        海报已预取进 self.posters 缓存；调用方可直接按序号取预编码数据，
+        不必复制整份选题 dict。state 为调用方已取得的快照（与其 ETag 一致），
+        不传时读取用户当前快照。
+        """
+        # 用户状态来自内存快照（不查库）
+        if state is None:
+            state = await get_user_state().snapshot(user_id)
+        logger.info(
+            f"已有 {len(state.done)} 个已完成、{len(state.skipped)} 个已跳过、"
+            f"{len(state.favorites)} 个已收藏选题"
+        )
+
+        # 从预排序视图中按位图过滤（校验/评分/食材只在目录或评分规则变化时重算）
+        # 已做/已跳过/已收藏（收藏池单独管理）都不在发现池显示
+        view = self._ranked.get()
+        ranks = view.select_ranks(
+            state,
+            topic_type=topic_type,
+            difficulty=difficulty,
+            max_count=max_count
+        )
+
+        logger.info(f"返回 {len(ranks)} 个选题 (类型: {topic_type or '全部'})")
+
+        # 并行获取海报（仅针对影视美食类型，命中缓存的不再请求）
+        await self.posters.prefetch([view.ranked[r] for r in ranks])
+        return view, ranks
+
+    async def page_ranked(
+        self,
+        page_size: int,
+        cursor: str = None,
+        topic_type: str = None,
+        difficulty: str = None,
+        user_id: str = DEFAULT_USER,
+        state: Optional[UserStateSnapshot] = None
+    ) -> Tuple[RankedView, List[int], Optional[str], int]:
+        """
+        分页选出选题，返回 (排序视图, 本页排名序号, 下一页游标, 总数)
 
-    async def collect_topics(self, max_count: int = None, topic_type: str = None) -> List[Dict[str, Any]]:
+        Raises:
+            ValueError: 游标无效
+        """
+        if state is None:
+            state = await get_user_state().snapshot(user_id)
+        view = self._ranked.get()
+
+        ranks, next_cursor = view.page_ranks(
+            state,
+            page_size,
+            cursor=cursor,
+            topic_type=topic_type,
+            difficulty=difficulty
+        )
+        # 海报只为本页获取
+        await self.posters.prefetch([view.ranked[r] for r in ranks])
+        return view, ranks, next_cursor, view.count(state, topic_type, difficulty)
+
+    def _apply_posters(self, topics: List[Dict[str, Any]]):
+        for topic in topics:
+            if self.posters.applies_to(topic):
+                topic["poster_url"] = self.posters.cached(topic["id"])
+
+    async def collect_topics(
+        self,
+        max_count: int = None,
+        topic_type: str = None,
+        difficulty: str = None,
+        user_id: str = DEFAULT_USER
+    ) -> List[Dict[str, Any]]:
         """
         收集高质量选题数据
 
         Args:
             max_count: 返回选题数量（None 表示返回所有符合条件的选题）
             topic_type: 指定类型筛选（可选：movie_food, famous_recipe, archaeological）
+            difficulty: 指定烹饪难度筛选（可选：简单, 中等, 困难）
+            user_id: 按该用户的已做/已跳过/已收藏过滤
         """
         logger.info("开始收集选题数据...")
 
-        # 获取已做过的选题
-        done_topics = await get_done_topics()
-        done_set = set(done_topics)
-        logger.info(f"已有 {len(done_topics)} 个已完成选题")
-
-        # 获取已跳过的选题
-        skipped_topics = await get_skipped_topics()
-        logger.info(f"已有 {len(skipped_topics)} 个已跳过选题")
-
-        # 获取已收藏的选题（收藏的不在发现池显示，只在收藏池）
-        favorited_topics = await get_favorites()
-        favorited_set = set(favorited_topics)
-        logger.info(f"已有 {len(favorited_topics)} 个已收藏选题")
-
-        # 按类型分组收集
-        topics_by_type = {
-            "movie_food": [],
-            "famous_recipe": [],
-            "archaeological": []
-        }
-
-        for topic in CURATED_TOPICS:
-            # 组合标识：作品名·推荐菜品
-            topic_key = f"{topic['work_name']}·{topic['recommended_dish']}"
-
-            # 跳过已做过的
-            if topic['work_name'] in done_set or topic_key in done_set:
-                logger.debug(f"跳过已做过: {topic['work_name']}")
-                continue
-
-            # 跳过用户标记为不感兴趣/不适合的
-            if topic['id'] in skipped_topics:
-                logger.debug(f"跳过已pass: {topic['work_name']}")
-                continue
-
-            # 跳过已收藏的（收藏池单独管理）
-            if topic['id'] in favorited_set:
-                logger.debug(f"跳过已收藏: {topic['work_name']}")
-                continue
-
-            # 验证选题质量
-            if not self._validate_topic(topic):
-                logger.debug(f"质量不达标: {topic['work_name']}")
-                continue
-
-            # 计算综合得分
-            topic_with_score = {
-                **topic,
-                "total_score": self._calculate_score(topic),
-                "is_done": False,
-                "is_favorited": False,
-                "collected_at": datetime.now().isoformat(),
-                # 添加食材清单
-                "ingredients": get_ingredients(topic.get("recommended_dish", ""))
-            }
-
-            # 按类型分组
-            t_type = topic.get("topic_type", "movie_food")
-            if t_type in topics_by_type:
-                topics_by_type[t_type].append(topic_with_score)
-
-        # 对每种类型内部按得分排序
-        for t_type in topics_by_type:
-            topics_by_type[t_type].sort(key=lambda x: x["total_score"], reverse=True)
-
-        # 如果指定了类型，只返回该类型
-        if topic_type and topic_type in topics_by_type:
-            result = topics_by_type[topic_type]
-        else:
-            # 返回所有类型的选题，按得分排序
-            result = []
-            for t_type in topics_by_type:
-                result.extend(topics_by_type[t_type])
-            result.sort(key=lambda x: x["total_score"], reverse=True)
-
-        # 如果指定了数量限制，截取
-        if max_count is not None:
-            result = result[:max_count]
-
-        logger.info(f"返回 {len(result)} 个选题 (类型: {topic_type or '全部'})")
-
-        # 并行获取海报（仅针对影视美食类型）
-        if self.tmdb:
-            movie_food_topics = [t for t in result if t.get("topic_type") == "movie_food"]
-            if movie_food_topics:
-                logger.info(f"开始并行获取 {len(movie_food_topics)} 个影视美食海报...")
-
-                async def fetch_poster(topic):
-                    try:
-                        poster_url = await self.tmdb.get_movie_poster(
-                            topic["work_name"],
-                            topic.get("release_year")
-                        )
-                        return (topic["id"], poster_url)
-                    except Exception as e:
-                        logger.debug(f"获取海报失败: {topic['work_name']} - {e}")
-                        return (topic["id"], None)
-
-                # 并行获取所有海报
-                poster_results = await asyncio.gather(
-                    *[fetch_poster(t) for t in movie_food_topics],
-                    return_exceptions=True
-                )
-
-                # 更新结果
-                poster_map = {}
-                for r in poster_results:
-                    if isinstance(r, tuple):
-                        poster_map[r[0]] = r[1]
-
-                for topic in result:
-                    if topic["id"] in poster_map:
-                        topic["poster_url"] = poster_map[topic["id"]]
-
-                logger.info(f"海报获取完成，成功 {len([p for p in poster_map.values() if p])} 个")
+        view, ranks = await self.select_ranked(max_count, topic_type, difficulty, user_id)
+        result = view.materialize(ranks)
+        self._apply_posters(result)
 
         logger.info(f"返回 {len(result)} 个高质量选题")
 
         return result
 
+    async def collect_page(
+        self,
+        page_size: int,
+        cursor: str = None,
+        topic_type: str = None,
+        difficulty: str = None,
+        user_id: str = DEFAULT_USER
+    ) -> Dict[str, Any]:
+        """
+        分页收集选题（海报只为本页获取）
+
+        Args:
+            page_size: 每页数量
+            cursor: 上一页返回的 next_cursor（None 表示第一页）
+            topic_type: 指定类型筛选
+            difficulty: 指定烹饪难度筛选
+            user_id: 按该用户的状态过滤
+
+        Raises:
+            ValueError: 游标无效
+        """
+        view, ranks, next_cursor, total = await self.page_ranked(
+            page_size, cursor, topic_type, difficulty, user_id
+        )
+        topics = view.materialize(ranks)
+        self._apply_posters(topics)
+
+        return {
+            "topics": topics,
+            "next_cursor": next_cursor,
+            "total": total
+        }
+
+    def format_ranked(self, view: RankedView, ranks: List[int]) -> str:
+        """format_for_analysis 的缓存版本（同一视图、同一批选题只格式化一次）"""
+        key = (view.key, tuple(ranks))
+        if self._formatted is None or self._formatted[0] != key:
+            self._formatted = (key, self.format_for_analysis([view.ranked[r] for r in ranks]))
+        return self._formatted[1]
+
     def _validate_topic(self, topic: Dict[str, Any]) -> bool:
         """验证选题质量"""
         # 1. 推荐菜品必须存在且具体
@@ -0,0 +1,192 @@
+"""
+跨 worker 协调 - 多个 uvicorn worker（或多个节点）共享同一个存储
+
+- 租约（lease）：带过期时间的互斥锁，持有者定期续期；进程崩溃后租约过期，
+  其他 worker 可以接手。用于保证同一类后台任务全局只运行一个。
+- 失效信号（signal）：每个名字一个版本号。某个 worker 修改了共享状态后递增
+  版本号，其他 worker 在下一次请求或轮询时发现版本变化，重新加载本地缓存。
+
+单 worker 时这些操作只多了几次本地查询，行为不变。
+"""
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import functools
+import logging
+import os
+import socket
+import time
+
+from ..models.storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+# 当前 worker 的标识（租约持有者）
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+SignalHandler = Callable[[], Awaitable[Any]]
+# 按前缀注册的回调，参数为信号名去掉前缀后的部分（如用户 ID）
+PrefixSignalHandler = Callable[[str], Awaitable[Any]]
+
+
+class Lease:
+    """
+    一个租约（获取后在后台自动续期，直到释放）
+
+    用法：
+        lease = coordinator.lease("job:collect")
+        if await lease.acquire(data={"job_id": job.id}):
+            try: ...
+            finally: await lease.release()
+
+    续期被拒（已被其他 worker 接手）或连续失败超过 ttl 时租约视为丢失，
+    调用 on_lost 回调；持有者应立即停止受租约保护的工作。
+    """
+
+    def __init__(self, name: str, ttl: float, on_lost: Optional[Callable[[], Any]] = None):
+        self.name = name
+        self.ttl = ttl
+        self.on_lost = on_lost
+        self.lost = False
+        self._renewer: Optional[asyncio.Task] = None
+
+    @property
+    def held(self) -> bool:
+        return self._renewer is not None
+
+    async def acquire(self, data: Optional[Dict[str, Any]] = None) -> bool:
+        if not await get_storage().acquire_lease(self.name, WORKER_ID, self.ttl, time.time(), data):
+            return False
+        self._renewer = asyncio.create_task(self._renew(), name=f"lease-{self.name}")
+        return True
+
+    async def _renew(self):
+        """每 ttl/3 续期一次；续期被拒或超过 ttl 未能续期说明租约已丢失（例如长时间卡住）"""
+        renewed_at = time.monotonic()
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            try:
+                if await get_storage().acquire_lease(self.name, WORKER_ID, self.ttl, time.time()):
+                    renewed_at = time.monotonic()
+                    continue
+            except Exception as e:
+                logger.warning(f"租约续期失败: {self.name} - {e}")
+                if time.monotonic() - renewed_at < self.ttl:
+                    continue
+            logger.error(f"租约已丢失: {self.name}")
+            self._lost()
+            return
+
+    def _lost(self):
+        self.lost = True
+        self._renewer = None
+        if self.on_lost is not None:
+            try:
+                self.on_lost()
+            except Exception as e:
+                logger.warning(f"处理租约丢失失败: {self.name} - {e}")
+
+    async def release(self):
+        if self._renewer is not None:
+            self._renewer.cancel()
+            self._renewer = None
+        await get_storage().release_lease(self.name, WORKER_ID)
+
+
+class Coordinator:
+    """租约 + 失效信号"""
+
+    # 租约默认有效期（秒）；持有者每 1/3 有效期续期一次
+    LEASE_TTL = 30.0
+    # 后台轮询失效信号的间隔（秒）
+    POLL_INTERVAL = 1.0
+
+    def __init__(self):
+        self._seen: Dict[str, int] = {}
+        self._handlers: Dict[str, List[SignalHandler]] = {}
+        self._prefix_handlers: List[Tuple[str, PrefixSignalHandler]] = []
+        self._poller: Optional[asyncio.Task] = None
+        self._sync_lock = asyncio.Lock()
+
+    def lease(
+        self,
+        name: str,
+        ttl: Optional[float] = None,
+        on_lost: Optional[Callable[[], Any]] = None
+    ) -> Lease:
+        return Lease(name, ttl or self.LEASE_TTL, on_lost)
+
+    async def lease_holder(self, name: str) -> Optional[Dict[str, Any]]:
+        """当前持有者（没有或已过期返回 None）"""
+        return await get_storage().get_lease(name, time.time())
+
+    def on_signal(self, name: str, handler: SignalHandler):
+        """注册失效回调：其他 worker 递增 name 的版本后调用"""
+        self._handlers.setdefault(name, []).append(handler)
+
+    def on_signal_prefix(self, prefix: str, handler: PrefixSignalHandler):
+        """注册一组信号的失效回调（如 user_state:<用户>），回调参数为前缀之后的部分"""
+        self._prefix_handlers.append((prefix, handler))
+
+    async def signal(self, name: str):
+        """通知其他 worker：name 对应的共享状态已变化"""
+        version = await get_storage().bump_signal(name)
+        # 中间没有其他 worker 的修改时，自己已经是最新的，记下新版本避免回调自己；
+        # 否则留给下一次 sync 重新加载
+        if self._seen.get(name, 0) == version - 1:
+            self._seen[name] = version
+
+    async def sync(self):
+        """检查失效信号，对版本变化的名字调用回调"""
+        if self._sync_lock.locked():
+            # 已有请求在同步，等它完成即可
+            async with self._sync_lock:
+                return
+        async with self._sync_lock:
+            versions = await get_storage().get_signals()
+            for name, version in versions.items():
+                seen = self._seen.get(name, 0)
+                self._seen[name] = version
+                if seen == version:
+                    continue
+                handlers = list(self._handlers.get(name, ()))
+                handlers += [
+                    functools.partial(handler, name[len(prefix):])
+                    for prefix, handler in self._prefix_handlers
+                    if name.startswith(prefix)
+                ]
+                for handler in handlers:
+                    try:
+                        await handler()
+                    except Exception as e:
+                        logger.warning(f"处理失效信号失败: {name} - {e}")
+
+    async def start(self):
+        """记录当前信号版本并开始后台轮询"""
+        self._seen = await get_storage().get_signals()
+        if self._poller is None:
+            self._poller = asyncio.create_task(self._poll(), name="coordination-poll")
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.POLL_INTERVAL)
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.warning(f"轮询失效信号失败: {e}")
+
+    async def stop(self):
+        if self._poller is not None:
+            self._poller.cancel()
+            await asyncio.gather(self._poller, return_exceptions=True)
+            self._poller = None
+
+
+_coordinator: Optional[Coordinator] = None
+
+
+def get_coordinator() -> Coordinator:
+    """获取协调器单例"""
+    global _coordinator
+    if _coordinator is None:
+        _coordinator = Coordinator()
+    return _coordinator
@@ -1,18 +1,56 @@
-from typing import List
-import uuid
+from typing import Any, Dict, List
 from datetime import datetime
 import logging
+import time
 
 from ..scrapers.douban import DoubanScraper
 from ..analyzers.food_scene_analyzer import analyze_food_scene
 from ..analyzers.story_evaluator import evaluate_story_potential
-from ..models.topic import TopicCandidate, StoryAngle, CookingDifficulty
-from ..models.database import get_done_topics, save_topics, create_discovery_run, update_discovery_run
+from ..models.topic import TopicCandidate, StoryAngle, CookingDifficulty, TopicType, make_topic_id
+from ..models.storage import get_storage
 from ..config import settings
+from .events import get_event_bus
 
 logger = logging.getLogger(__name__)
 
 
+class DiscoveryProgress:
+    """一次发现运行的进度（发布到事件总线的 discovery 频道）"""
+
+    def __init__(self, run_id: int):
+        self.run_id = run_id
+        self.started = time.perf_counter()
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.bus = get_event_bus()
+
+    def emit(self, event_type: str, **data: Any):
+        self.bus.publish(
+            "discovery",
+            event_type,
+            run_id=self.run_id,
+            elapsed_ms=round((time.perf_counter() - self.started) * 1000, 1),
+            **data
+        )
+
+    def llm(self, title: str, step: str, result: Dict[str, Any]):
+        """记录一次 Claude 调用的 token 消耗"""
+        usage = result.get("usage") or {}
+        self.input_tokens += usage.get("input_tokens", 0)
+        self.output_tokens += usage.get("output_tokens", 0)
+        self.emit(
+            "llm",
+            title=title,
+            step=step,
+            input_tokens=usage.get("input_tokens", 0),
+            output_tokens=usage.get("output_tokens", 0),
+            total_tokens=self.input_tokens + self.output_tokens
+        )
+
+    def tokens(self) -> Dict[str, int]:
+        return {"input_tokens": self.input_tokens, "output_tokens": self.output_tokens}
+
+
 class TopicDiscovery:
     """选题发现核心类"""
 
@@ -25,35 +63,63 @@ class TopicDiscovery:
         logger.info("开始每周选题发现...")
 
         # 创建本次发现记录
-        run_id = await create_discovery_run()
+        run_id = await get_storage().create_discovery_run()
+        progress = DiscoveryProgress(run_id)
+        progress.emit("run_started", max_movies=max_movies)
+
+        try:
+            candidates = await self._discover(progress, max_movies)
+        except Exception as e:
+            progress.emit("run_failed", error=str(e) or e.__class__.__name__, **progress.tokens())
+            raise
+
+        # 保存到数据库（只写入新增和内容有变化的选题）
+        delta = await get_storage().save_topics(candidates, run_id)
+        await get_storage().update_discovery_run(run_id, len(candidates))
+        progress.emit("run_finished", count=len(candidates), **delta, **progress.tokens())
+
+        logger.info(
+            f"本次发现 {len(candidates)} 个选题（新增 {delta['inserted']}，"
+            f"更新 {delta['updated']}，未变 {delta['unchanged']}）"
+        )
+
+        return candidates[:10]  # 返回 Top 10
+
+    async def _discover(self, progress: DiscoveryProgress, max_movies: int) -> List[TopicCandidate]:
+        """逐部分析，每发现一个候选立即发布 candidate 事件"""
 
         # 获取已做过的选题
-        done_topics = await get_done_topics()
+        done_topics = await get_storage().get_done_topics()
         logger.info(f"已有 {len(done_topics)} 个已完成选题")
 
         candidates = []
 
         # 1. 从豆瓣高分经典中发现
         logger.info("正在获取豆瓣高分经典...")
+        progress.emit("stage", name="豆瓣高分经典")
         classics = await self.douban.get_classic_high_score(
             min_year=1950,
             max_year=2020,
             min_score=settings.MIN_DOUBAN_SCORE
         )
 
+        total = min(len(classics), max_movies)
         for i, movie in enumerate(classics[:max_movies]):
             # 跳过已做过的
             if any(movie["title"] in done for done in done_topics):
                 logger.debug(f"跳过已做过: {movie['title']}")
+                progress.emit("movie_skipped", title=movie["title"], reason="已做过")
                 continue
 
-            logger.info(f"[{i+1}/{min(len(classics), max_movies)}] 分析: {movie['title']}")
+            logger.info(f"[{i+1}/{total}] 分析: {movie['title']}")
+            progress.emit("movie", title=movie["title"], index=i + 1, total=total)
 
             # 搜索美食相关讨论
             discussions = await self.douban.search_food_scenes(movie["title"])
 
             if not discussions:
                 logger.debug(f"未找到美食讨论: {movie['title']}")
+                progress.emit("movie_skipped", title=movie["title"], reason="未找到美食讨论")
                 continue
 
             # AI 分析美食场景
@@ -64,15 +130,18 @@ class TopicDiscovery:
                 discussions=discussions,
                 api_key=settings.ANTHROPIC_API_KEY
             )
+            progress.llm(movie["title"], "analyze", analysis)
 
             if not analysis.get("has_food_scene"):
                 logger.debug(f"无美食场景: {movie['title']}, 原因: {analysis.get('reason', '未知')}")
+                progress.emit("movie_skipped", title=movie["title"], reason=analysis.get("reason", "无美食场景"))
                 continue
 
             # 检查烹饪难度
             difficulty = analysis.get("cooking_difficulty", "中等")
             if difficulty == "超出能力":
                 logger.debug(f"烹饪难度超出: {movie['title']}")
+                progress.emit("movie_skipped", title=movie["title"], reason="烹饪难度超出")
                 continue
 
             # 评估故事潜力
@@ -83,6 +152,7 @@ class TopicDiscovery:
                 story_angles=analysis.get("story_angles", []),
                 api_key=settings.ANTHROPIC_API_KEY
             )
+            progress.llm(movie["title"], "evaluate", evaluation)
 
             # 构建候选选题
             story_angles = []
@@ -103,7 +173,7 @@ class TopicDiscovery:
                 difficulty_enum = CookingDifficulty.MEDIUM
 
             topic = TopicCandidate(
-                id=str(uuid.uuid4()),
+                id=make_topic_id(movie["title"], analysis.get("recommended_dish", ""), TopicType.MOVIE_FOOD.value),
                 work_name=movie["title"],
                 work_type="电影",
                 douban_score=movie["score"],
@@ -126,9 +196,11 @@ class TopicDiscovery:
 
             candidates.append(topic)
             logger.info(f"发现候选: {topic.work_name} · {topic.recommended_dish}, 评分: {topic.total_score()}")
+            progress.emit("candidate", topic=topic.model_dump(mode="json"), score=topic.total_score())
 
         # 2. 从近期热点老片中发现
         logger.info("正在搜索近期热点老片...")
+        progress.emit("stage", name="近期热点")
         hot_classics = await self.douban.get_hot_classic_rewatches()
 
         for movie in hot_classics[:15]:
@@ -143,6 +215,7 @@ class TopicDiscovery:
                 continue
 
             logger.info(f"分析热点: {title} (原因: {movie.get('heat_reason', '未知')})")
+            progress.emit("movie", title=title, heat_reason=movie.get("heat_reason"))
 
             discussions = await self.douban.search_food_scenes(title)
 
@@ -156,6 +229,7 @@ class TopicDiscovery:
                 discussions=discussions,
                 api_key=settings.ANTHROPIC_API_KEY
             )
+            progress.llm(title, "analyze", analysis)
 
             if not analysis.get("has_food_scene"):
                 continue
@@ -171,6 +245,7 @@ class TopicDiscovery:
                 story_angles=analysis.get("story_angles", []),
                 api_key=settings.ANTHROPIC_API_KEY
             )
+            progress.llm(title, "evaluate", evaluation)
 
             story_angles = []
             for angle in analysis.get("story_angles", []):
@@ -190,7 +265,7 @@ class TopicDiscovery:
                 difficulty_enum = CookingDifficulty.MEDIUM
 
             topic = TopicCandidate(
-                id=str(uuid.uuid4()),
+                id=make_topic_id(title, analysis.get("recommended_dish", ""), TopicType.MOVIE_FOOD.value),
                 work_name=title,
                 work_type="电影",
                 douban_score=8.0,
@@ -214,14 +289,8 @@ class TopicDiscovery:
 
             candidates.append(topic)
             logger.info(f"发现热点候选: {topic.work_name} · {topic.recommended_dish}")
+            progress.emit("candidate", topic=topic.model_dump(mode="json"), score=topic.total_score())
 
         # 排序：综合分数高的排前面
         candidates.sort(key=lambda x: x.total_score(), reverse=True)
-
-        # 保存到数据库
-        await save_topics(candidates)
-        await update_discovery_run(run_id, len(candidates))
-
-        logger.info(f"本次发现 {len(candidates)} 个选题")
-
-        return candidates[:10]  # 返回 Top 10
+        return candidates
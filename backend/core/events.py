@@ -0,0 +1,124 @@
+"""
+进度事件总线 - 发现/收集流程发布结构化进度事件，SSE 接口向客户端分发
+
+每个事件带递增序号（id），最近的事件保留在环形缓冲里，客户端断线重连时
+带上 Last-Event-ID 即可补齐错过的事件。订阅者队列有上限，消费过慢时丢弃
+最旧的事件，不会拖慢发布方。
+"""
+from typing import Any, AsyncIterator, Deque, Dict, Iterable, List, Optional, Set
+from collections import deque
+from datetime import datetime
+import asyncio
+
+
+class _Subscriber:
+    def __init__(self, channels: Optional[Set[str]], size: int):
+        self.channels = channels
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=size)
+        self.dropped = 0
+
+    def wants(self, event: Dict[str, Any]) -> bool:
+        return self.channels is None or event["channel"] in self.channels
+
+    def put(self, event: Dict[str, Any]):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+
+class EventBus:
+    """进程内事件总线（发布不阻塞）"""
+
+    # 保留的最近事件数（用于断线重连补发）
+    HISTORY_SIZE = 500
+    # 每个订阅者最多积压的事件数
+    QUEUE_SIZE = 200
+
+    def __init__(self):
+        self._seq = 0
+        self._history: Deque[Dict[str, Any]] = deque(maxlen=self.HISTORY_SIZE)
+        self._subscribers: Set[_Subscriber] = set()
+
+    @property
+    def last_id(self) -> int:
+        return self._seq
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, channel: str, event_type: str, **data: Any) -> Dict[str, Any]:
+        """
+        发布事件
+
+        Args:
+            channel: 事件来源（discovery / job）
+            event_type: 事件类型（run_started / movie / candidate / ...）
+            **data: 事件内容（需可 JSON 序列化）
+        """
+        self._seq += 1
+        event = {
+            "id": self._seq,
+            "channel": channel,
+            "type": event_type,
+            "ts": datetime.now().isoformat(),
+            **data,
+        }
+        self._history.append(event)
+        for subscriber in self._subscribers:
+            if subscriber.wants(event):
+                subscriber.put(event)
+        return event
+
+    def recent(self, since: int = 0, channels: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """缓冲中序号大于 since 的事件"""
+        wanted = set(channels) if channels is not None else None
+        return [
+            e for e in self._history
+            if e["id"] > since and (wanted is None or e["channel"] in wanted)
+        ]
+
+    async def subscribe(
+        self,
+        since: Optional[int] = None,
+        channels: Optional[Iterable[str]] = None,
+        heartbeat: Optional[float] = None
+    ) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """
+        订阅事件（先补发 since 之后的缓冲事件）
+
+        heartbeat 秒内没有新事件时产出 None，调用方可据此发送心跳。
+        """
+        subscriber = _Subscriber(set(channels) if channels is not None else None, self.QUEUE_SIZE)
+        # 先注册再取缓冲，中间发布的事件按序号去重
+        self._subscribers.add(subscriber)
+        try:
+            last = 0
+            if since is not None:
+                for event in self.recent(since, subscriber.channels):
+                    last = event["id"]
+                    yield event
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if event["id"] <= last:
+                    continue
+                yield event
+        finally:
+            self._subscribers.discard(subscriber)
+
+
+_event_bus: Optional[EventBus] = None
+
+
+def get_event_bus() -> EventBus:
+    """获取事件总线单例"""
+    global _event_bus
+    if _event_bus is None:
+        _event_bus = EventBus()
+    return _event_bus
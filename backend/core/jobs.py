@@ -0,0 +1,386 @@
+"""
+后台任务 - 收集/发现在后台运行，进度按阶段持久化
+
+提交任务立即返回任务 ID，客户端轮询 GET /api/jobs/{id} 或订阅事件流。
+同一类型的任务同时只能运行一个（多 worker 时由 job:<kind> 租约保证，
+租约丢失时取消任务，避免与接手的 worker 同时运行）；按用户运行的任务
+（如 collect）每个用户各占一个 job:<kind>:<用户> 租约，不同用户互不阻塞；
+worker 启动时，没有存活租约的未完成任务标记为中断。
+"""
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+from contextlib import asynccontextmanager
+from datetime import datetime
+import asyncio
+import logging
+import time
+import uuid
+
+from ..models.database import DEFAULT_USER
+from ..models.storage import get_storage
+from .coordination import Lease, get_coordinator
+from .events import get_event_bus
+
+logger = logging.getLogger(__name__)
+
+# 任务状态
+PENDING = "pending"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATUSES = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobConflictError(Exception):
+    """同类型任务正在运行（可能在其他 worker 上）"""
+
+    def __init__(self, kind: str, job_id: Optional[str]):
+        super().__init__(f"{kind} 任务正在运行中: {job_id}")
+        self.kind = kind
+        self.job_id = job_id
+
+
+class Job:
+    """一次后台任务（阶段进度 + 结果）"""
+
+    def __init__(self, kind: str, params: Optional[Dict[str, Any]] = None, job_id: Optional[str] = None):
+        self.id = job_id or uuid.uuid4().hex
+        self.kind = kind
+        self.params = params or {}
+        self.lease: Optional[str] = None      # 运行时持有的租约名（清理中断任务时按它判断存活）
+        self.status = PENDING
+        self.stages: List[Dict[str, Any]] = []
+        self.result: Optional[Dict[str, Any]] = None
+        # 本进程内的中间结果（不持久化，供等待任务的请求直接使用，如 collect 的排序视图）
+        self.context: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+        self.created_at = datetime.now().isoformat()
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self._listeners: List[asyncio.Queue] = []
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def to_dict(self) -> Dict[str, Any]:
+        """当前状态的快照（阶段逐个复制：已发布的事件不随之后的进度变化）"""
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "params": self.params,
+            "lease": self.lease,
+            "stages": [dict(stage) for stage in self.stages],
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+    async def _persist(self):
+        """写库并通知订阅者（事件总线上的 job 事件不带结果，结果见 /api/jobs/{id}）"""
+        snapshot = self.to_dict()
+        await get_storage().save_job(self.id, self.kind, self.status, snapshot)
+        for queue in self._listeners:
+            queue.put_nowait(snapshot)
+        get_event_bus().publish(
+            "job",
+            self.status,
+            job_id=self.id,
+            kind=self.kind,
+            params=snapshot["params"],
+            stages=snapshot["stages"],
+            error=self.error
+        )
+
+    @asynccontextmanager
+    async def stage(self, name: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        记录一个阶段的开始/结束/耗时
+
+        用法：
+            async with job.stage("筛选排序") as stage:
+                stage["count"] = len(ranks)
+        """
+        stage: Dict[str, Any] = {
+            "name": name,
+            "status": RUNNING,
+            "started_at": datetime.now().isoformat(),
+            "elapsed_ms": None,
+        }
+        self.stages.append(stage)
+        await self._persist()
+
+        start = time.perf_counter()
+        try:
+            yield stage
+        except BaseException:
+            stage["status"] = FAILED
+            raise
+        else:
+            stage["status"] = SUCCEEDED
+        finally:
+            stage["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            await self._persist()
+
+    async def progress(self, **counts: Any):
+        """更新当前阶段的计数（如 done=3, total=30）"""
+        if self.stages:
+            self.stages[-1].update(counts)
+        await self._persist()
+
+    async def events(self) -> AsyncIterator[Dict[str, Any]]:
+        """订阅任务快照，任务结束后停止"""
+        queue: asyncio.Queue = asyncio.Queue()
+        self._listeners.append(queue)
+        try:
+            yield self.to_dict()
+            while not self.is_finished:
+                snapshot = await queue.get()
+                yield snapshot
+                if snapshot["status"] in FINISHED_STATUSES:
+                    break
+        finally:
+            self._listeners.remove(queue)
+
+
+JobHandler = Callable[[Job], Awaitable[Optional[Dict[str, Any]]]]
+
+
+def visible_to(snapshot: Dict[str, Any], user_id: str) -> bool:
+    """任务对用户是否可见（带 params.user_id 的任务只对该用户可见）"""
+    owner = (snapshot.get("params") or {}).get("user_id")
+    return owner is None or owner == user_id
+
+
+class JobManager:
+    """后台任务管理器（在提交的 worker 内执行，状态写入 jobs 表供所有 worker 查询）"""
+
+    # 跟踪其他 worker 上任务的轮询间隔（秒）
+    WATCH_INTERVAL = 1.0
+    # 清理中断任务（持有者崩溃、租约过期）的间隔（秒），与租约有效期相当
+    RECOVER_INTERVAL = 30.0
+
+    def __init__(self):
+        self._handlers: Dict[str, JobHandler] = {}
+        self._status_kinds: List[str] = []
+        self._per_user_kinds: List[str] = []
+        self._jobs: Dict[str, Job] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._running: Dict[str, Job] = {}
+        self._leases: Dict[str, Lease] = {}
+        self._recoverer: Optional[asyncio.Task] = None
+
+    def register(self, kind: str, handler: JobHandler, in_status: bool = True, per_user: bool = False):
+        """
+        注册任务类型，handler 返回值作为任务结果
+
+        in_status=False 的任务（如后台维护）不计入 /api/status 的运行状态和上次运行；
+        per_user=True 的任务（如 collect）按 params["user_id"] 互斥，不同用户可以同时运行
+        """
+        self._handlers[kind] = handler
+        if in_status and kind not in self._status_kinds:
+            self._status_kinds.append(kind)
+        if per_user and kind not in self._per_user_kinds:
+            self._per_user_kinds.append(kind)
+
+    @property
+    def kinds(self) -> List[str]:
+        return list(self._handlers)
+
+    def _lease_name(self, kind: str, params: Dict[str, Any]) -> str:
+        """任务的互斥租约名：job:<kind>，按用户运行的任务为 job:<kind>:<用户>"""
+        if kind in self._per_user_kinds:
+            return f"job:{kind}:{params.get('user_id', DEFAULT_USER)}"
+        return f"job:{kind}"
+
+    def running(self, kind: str, user_id: str = DEFAULT_USER) -> Optional[Job]:
+        return self._running.get(self._lease_name(kind, {"user_id": user_id}))
+
+    async def submit(self, kind: str, params: Optional[Dict[str, Any]] = None) -> Job:
+        """
+        提交任务并立即返回
+
+        Raises:
+            ValueError: 未知任务类型
+            JobConflictError: 同类型任务正在运行（本 worker 或其他 worker；按用户运行的任务只看同一用户）
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"未知任务类型: {kind}")
+        job = Job(kind, params)
+        name = job.lease = self._lease_name(kind, job.params)
+        if name in self._running:
+            raise JobConflictError(kind, self._running[name].id)
+
+        # 先占住本地名额，再去抢全局租约（两个并发提交不会都进入 acquire）
+        self._running[name] = job
+        coordinator = get_coordinator()
+        lease = coordinator.lease(name, on_lost=lambda: self._abort(job, "租约已丢失，任务已停止"))
+        try:
+            acquired = await lease.acquire(data={"job_id": job.id})
+        except BaseException:
+            self._running.pop(name, None)
+            raise
+        if not acquired:
+            self._running.pop(name, None)
+            holder = await coordinator.lease_holder(name)
+            raise JobConflictError(kind, (holder or {}).get("data", {}).get("job_id"))
+
+        try:
+            await job._persist()
+        except BaseException:
+            self._running.pop(name, None)
+            await self._release(lease)
+            raise
+        self._leases[name] = lease
+        self._jobs[job.id] = job
+
+        task = asyncio.create_task(self._run(job), name=f"job-{kind}-{job.id}")
+        self._tasks[job.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.id, None))
+        return job
+
+    async def _run(self, job: Job):
+        job.status = RUNNING
+        job.started_at = datetime.now().isoformat()
+        logger.info(f"任务开始: {job.kind} {job.id}")
+
+        try:
+            await job._persist()
+            job.result = await self._handlers[job.kind](job)
+            job.status = SUCCEEDED
+        except asyncio.CancelledError:
+            job.status = CANCELLED
+            job.error = job.error or "任务已取消"
+        except Exception as e:
+            logger.exception(f"任务失败: {job.kind} {job.id}")
+            job.status = FAILED
+            job.error = str(e) or e.__class__.__name__
+        finally:
+            job.finished_at = datetime.now().isoformat()
+            try:
+                await job._persist()
+            except Exception as e:
+                # 写库失败也要让出名额和租约，否则同类型任务要到重启才能再提交
+                logger.error(f"保存任务结果失败: {job.kind} {job.id}: {e}")
+            finally:
+                # 结束的任务只留在 jobs 表里（get() 查库），内存中只保留运行中的任务
+                self._jobs.pop(job.id, None)
+                self._running.pop(job.lease, None)
+                lease = self._leases.pop(job.lease, None)
+                if lease is not None:
+                    await self._release(lease)
+                logger.info(f"任务结束: {job.kind} {job.id} -> {job.status}")
+
+    @staticmethod
+    async def _release(lease: Lease):
+        """释放任务租约（失败只记日志：租约到期后自动失效）"""
+        try:
+            await lease.release()
+        except Exception as e:
+            logger.warning(f"释放租约失败: {lease.name}: {e}")
+
+    def _abort(self, job: Job, reason: str):
+        """取消正在运行的任务（如租约丢失：其他 worker 可能已接手同类型任务）"""
+        task = self._tasks.get(job.id)
+        if task is not None and not task.done():
+            logger.error(f"{reason}: {job.kind} {job.id}")
+            job.error = reason
+            task.cancel()
+
+    async def wait(self, job: Job) -> Job:
+        """等待任务结束（调用方被取消不会取消任务本身）"""
+        task = self._tasks.get(job.id)
+        if task is not None:
+            await asyncio.shield(asyncio.wait([task]))
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """任务快照（运行中的读内存，已结束的和重启前的历史任务查库）"""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        return await get_storage().get_job(job_id)
+
+    def live(self, job_id: str) -> Optional[Job]:
+        """本进程内运行中的任务对象（用于订阅进度）"""
+        return self._jobs.get(job_id)
+
+    async def watch(self, snapshot: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        跟踪在其他 worker 上运行的任务：轮询 jobs 表，快照变化时产出，结束后停止
+        """
+        yield snapshot
+        while snapshot["status"] not in FINISHED_STATUSES:
+            await asyncio.sleep(self.WATCH_INTERVAL)
+            latest = await get_storage().get_job(snapshot["id"])
+            if latest is None:
+                return
+            if latest != snapshot:
+                snapshot = latest
+                yield snapshot
+
+    async def history(self, limit: int = 20, user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """最近的任务（指定 user_id 时不含其他用户的任务）"""
+        return await get_storage().list_jobs(limit, user_id)
+
+    async def status(self, user_id: str = DEFAULT_USER) -> Dict[str, Any]:
+        """汇总所有 worker 的状态（兼容 /api/status，不含其他用户的任务）"""
+        running = await get_storage().get_running_jobs(self._status_kinds)
+        running = [job for job in running if visible_to(job, user_id)]
+        last = await get_storage().get_last_finished_job(self._status_kinds, user_id=user_id)
+        last_count = 0
+        if last is not None and last.get("result"):
+            last_count = last["result"].get("count", 0)
+        return {
+            "is_running": bool(running),
+            "running_jobs": {job["kind"]: job["id"] for job in running},
+            "last_run": last["finished_at"] if last else None,
+            "last_count": last_count,
+        }
+
+    async def recover(self):
+        """把没有存活租约的未完成任务标记为中断（启动时和后台定期调用）"""
+        count = await get_storage().fail_interrupted_jobs("服务重启，任务中断", time.time())
+        if count:
+            logger.warning(f"{count} 个未完成任务已标记为中断")
+
+    async def start(self):
+        """清理中断任务，并在后台定期清理（其他 worker 崩溃留下的任务）"""
+        await self.recover()
+        if self._recoverer is None:
+            self._recoverer = asyncio.create_task(self._recover_loop(), name="job-recover")
+
+    async def _recover_loop(self):
+        while True:
+            await asyncio.sleep(self.RECOVER_INTERVAL)
+            try:
+                await self.recover()
+            except Exception as e:
+                logger.warning(f"清理中断任务失败: {e}")
+
+    async def shutdown(self):
+        """关闭时停止后台清理，取消仍在运行的任务"""
+        if self._recoverer is not None:
+            self._recoverer.cancel()
+            await asyncio.gather(self._recoverer, return_exceptions=True)
+            self._recoverer = None
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+_job_manager: Optional[JobManager] = None
+
+
+def get_job_manager() -> JobManager:
+    """获取任务管理器单例"""
+    global _job_manager
+    if _job_manager is None:
+        _job_manager = JobManager()
+    return _job_manager
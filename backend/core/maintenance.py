@@ -0,0 +1,107 @@
+"""
+数据库维护 - 保留策略、归档和空间整理
+
+每次发现都会写入一批新选题，热表只保留最近 RETENTION_RUNS 次发现，
+更早的按次压缩存入 discovery_archive（选题 ID 由内容生成，跨发现相同的选题
+写入时就合并为一行，不需要再去重）；删除腾出的空闲页通过增量 VACUUM 归还给文件系统，并截断 WAL（PostgreSQL 为 VACUUM ANALYZE）。
+
+维护作为 maintenance 后台任务运行（可手动 POST /api/jobs 提交），
+调度器每隔 MAINTENANCE_INTERVAL_HOURS 自动提交一次；多 worker 时
+由任务租约保证同时只有一个在运行，以 jobs 表里上次成功完成的时间判断是否到期
+（失败的维护在下一次检查时重试）。旧数据库第一次维护时转换为增量 auto_vacuum。
+"""
+from typing import Any, Dict, Optional
+from datetime import datetime
+import asyncio
+import logging
+
+from ..config import settings
+from ..models.storage import get_storage
+from .jobs import Job, JobConflictError, SUCCEEDED, get_job_manager
+
+logger = logging.getLogger(__name__)
+
+MAINTENANCE_KIND = "maintenance"
+
+
+async def run_maintenance(job: Job) -> Dict[str, Any]:
+    """维护任务：归档旧发现 → 整理空间"""
+    # 至少保留最新一次（可能正在写入）
+    keep = max(1, int(job.params.get("keep_runs", settings.RETENTION_RUNS)))
+
+    async with job.stage("归档") as stage:
+        run_ids = await get_storage().get_runs_to_archive(keep)
+        archived = 0
+        # 每次发现一个事务，避免长时间占住写连接
+        for done, run_id in enumerate(run_ids, 1):
+            archived += await get_storage().archive_run(run_id)
+            await job.progress(done=done, total=len(run_ids))
+        stage.update(runs=len(run_ids), topics=archived)
+
+    async with job.stage("整理空间") as stage:
+        stage.update(await get_storage().compact())
+
+    return {
+        "keep_runs": keep,
+        "archived_runs": len(run_ids),
+        "archived_topics": archived,
+        "size_bytes": job.stages[-1]["size_bytes"],
+    }
+
+
+class MaintenanceScheduler:
+    """定期提交维护任务"""
+
+    # 检查是否到期的间隔（秒）
+    CHECK_INTERVAL = 600.0
+
+    def __init__(self, interval_hours: Optional[float] = None):
+        hours = settings.MAINTENANCE_INTERVAL_HOURS if interval_hours is None else interval_hours
+        self.interval = hours * 3600
+        self._task: Optional[asyncio.Task] = None
+
+    async def is_due(self) -> bool:
+        last = await get_storage().get_last_finished_job([MAINTENANCE_KIND], status=SUCCEEDED)
+        if last is None or not last.get("finished_at"):
+            return True
+        elapsed = datetime.now() - datetime.fromisoformat(last["finished_at"])
+        return elapsed.total_seconds() >= self.interval
+
+    async def tick(self):
+        """到期则提交维护任务（其他 worker 正在运行时跳过）"""
+        if not await self.is_due():
+            return
+        try:
+            job = await get_job_manager().submit(MAINTENANCE_KIND, {})
+            logger.info(f"已提交定期维护任务: {job.id}")
+        except JobConflictError:
+            pass
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(min(self.CHECK_INTERVAL, self.interval))
+            try:
+                await self.tick()
+            except Exception as e:
+                logger.warning(f"提交维护任务失败: {e}")
+
+    def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._loop(), name="maintenance-scheduler")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+_scheduler: Optional[MaintenanceScheduler] = None
+
+
+def get_maintenance_scheduler() -> MaintenanceScheduler:
+    """获取维护调度器单例"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = MaintenanceScheduler()
+    return _scheduler
@@ -0,0 +1,148 @@
+"""
+海报服务 - 按选题缓存 TMDB 海报 URL
+
+只有影视美食类型需要海报；查不到（None）会缓存，避免反复请求；
+请求失败（TMDBError：超时、限流等）不缓存，FAILURE_TTL 秒后重试。
+缓存最多 MAX_ENTRIES 条，超出时淘汰最久未访问的。每次缓存新条目时递增版本号；
+digest 是缓存内容的摘要（与写入顺序无关），各 worker 缓存了同样的海报时相同。
+同一选题的并发查询合并为一次请求，对 TMDB 的并发数有上限。
+"""
+from typing import List, Dict, Any, Optional
+from collections import OrderedDict
+import asyncio
+import hashlib
+import logging
+import time
+
+from ..scrapers.tmdb import TMDBClient, TMDBError
+
+logger = logging.getLogger(__name__)
+
+
+class PosterService:
+    """海报查询 + 内存缓存"""
+
+    # 同时向 TMDB 发起的请求数上限
+    MAX_CONCURRENT = 8
+    # 缓存条目上限（LRU）
+    MAX_ENTRIES = 4096
+    # 请求失败后多久内不再重试（秒）
+    FAILURE_TTL = 60.0
+
+    def __init__(self, tmdb: Optional[TMDBClient]):
+        self.tmdb = tmdb
+        self.version = 0
+        self._digest = 0
+        self._cache: "OrderedDict[str, Optional[str]]" = OrderedDict()
+        # 请求失败的选题 → 失败时间（monotonic）
+        self._failures: Dict[str, float] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @staticmethod
+    def needs_poster(topic: Dict[str, Any]) -> bool:
+        return topic.get("topic_type", "movie_food") == "movie_food"
+
+    @property
+    def digest(self) -> str:
+        return f"{self._digest:016x}"
+
+    @staticmethod
+    def _entry_hash(topic_id: str, poster_url: Optional[str]) -> int:
+        raw = f"{topic_id}\x1f{poster_url or ''}".encode("utf-8")
+        return int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), "big")
+
+    def cached(self, topic_id: str) -> Optional[str]:
+        """只读缓存，不发起请求"""
+        return self._cache.get(topic_id)
+
+    def is_cached(self, topic_id: str) -> bool:
+        """是否已有缓存结果（包括查不到的 None）"""
+        return topic_id in self._cache
+
+    def _backing_off(self, topic_id: str) -> bool:
+        """最近请求失败、还不到重试时间"""
+        failed_at = self._failures.get(topic_id)
+        if failed_at is None:
+            return False
+        if time.monotonic() - failed_at < self.FAILURE_TTL:
+            return True
+        del self._failures[topic_id]
+        return False
+
+    async def get(self, topic: Dict[str, Any]) -> Optional[str]:
+        """获取单个选题的海报 URL"""
+        if self.tmdb is None or not self.needs_poster(topic):
+            return None
+
+        topic_id = topic["id"]
+        if topic_id in self._cache:
+            self._cache.move_to_end(topic_id)
+            return self._cache[topic_id]
+        if self._backing_off(topic_id):
+            return None
+
+        # 合并同一选题的并发查询
+        task = self._inflight.get(topic_id)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(topic))
+            self._inflight[topic_id] = task
+            task.add_done_callback(lambda _: self._inflight.pop(topic_id, None))
+
+        # shield：某个请求被取消时不影响其他等待同一结果的请求
+        return await asyncio.shield(task)
+
+    async def _fetch(self, topic: Dict[str, Any]) -> Optional[str]:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.MAX_CONCURRENT)
+
+        async with self._semaphore:
+            try:
+                poster_url = await self.tmdb.get_movie_poster(
+                    topic["work_name"],
+                    topic.get("release_year"),
+                    topic.get("english_name"),
+                    raise_errors=True
+                )
+            except TMDBError as e:
+                logger.debug(f"获取海报失败，{self.FAILURE_TTL:.0f} 秒后重试: {topic['work_name']} - {e}")
+                now = time.monotonic()
+                if len(self._failures) >= self.MAX_ENTRIES:
+                    self._failures = {k: t for k, t in self._failures.items() if now - t < self.FAILURE_TTL}
+                self._failures[topic["id"]] = now
+                return None
+
+        self._failures.pop(topic["id"], None)
+        # 摘要按条目异或：加入和淘汰都只需 O(1)
+        if topic["id"] in self._cache:
+            self._digest ^= self._entry_hash(topic["id"], self._cache[topic["id"]])
+        self._cache[topic["id"]] = poster_url
+        self._digest ^= self._entry_hash(topic["id"], poster_url)
+        while len(self._cache) > self.MAX_ENTRIES:
+            evicted, evicted_url = self._cache.popitem(last=False)
+            self._digest ^= self._entry_hash(evicted, evicted_url)
+        self.version += 1
+        return poster_url
+
+    def applies_to(self, topic: Dict[str, Any]) -> bool:
+        """该选题是否带 poster_url 字段（未配置 TMDB 时都不带）"""
+        return self.tmdb is not None and self.needs_poster(topic)
+
+    async def prefetch(self, topics: List[Dict[str, Any]]):
+        """并发把一批选题的海报加载进缓存（不修改选题）"""
+        pending = {
+            t["id"]: t for t in topics
+            if self.applies_to(t) and t["id"] not in self._cache and not self._backing_off(t["id"])
+        }
+        if pending:
+            await asyncio.gather(*[self.get(t) for t in pending.values()])
+
+    async def enrich(self, topics: List[Dict[str, Any]]):
+        """并发为一批选题填充 poster_url（原地修改）"""
+        pending = [t for t in topics if self.applies_to(t) and not t.get("poster_url")]
+        if not pending:
+            return
+
+        poster_urls = await asyncio.gather(*[self.get(t) for t in pending])
+        for topic, poster_url in zip(pending, poster_urls):
+            topic["poster_url"] = poster_url
@@ -0,0 +1,53 @@
+"""
+选题字段投影 - 列表接口按需返回字段
+
+summary 只包含选题卡片折叠状态需要的字段，完整数据通过 /api/topics/{id} 按需加载；
+full 返回全部字段（默认，兼容旧前端）。
+"""
+from typing import Dict, Any, Optional, Tuple
+
+SUMMARY_FIELDS: Tuple[str, ...] = (
+    "id",
+    "topic_type",
+    # 作品信息
+    "work_name",
+    "english_name",
+    "work_type",
+    "douban_score",
+    "douban_url",
+    "release_year",
+    "poster_url",
+    # 美食场景
+    "recommended_dish",
+    "cooking_difficulty",
+    "story_angles",
+    # 三有评分
+    "is_interesting",
+    "is_discussable",
+    "has_momentum",
+    "heat_reason",
+    # 名店配方 / 考古美食标题用
+    "restaurant_name",
+    "restaurant_location",
+    "michelin_stars",
+    "historical_period",
+    "year_origin",
+    # 状态
+    "is_done",
+    "is_favorited",
+    "total_score",
+    "collected_at",
+)
+
+PROJECTIONS: Dict[str, Optional[Tuple[str, ...]]] = {
+    "full": None,
+    "summary": SUMMARY_FIELDS,
+}
+
+
+def project(topic: Dict[str, Any], projection: str = "full") -> Dict[str, Any]:
+    """按投影裁剪字段（full 原样返回）"""
+    fields = PROJECTIONS[projection]
+    if fields is None:
+        return topic
+    return {k: topic[k] for k in fields if k in topic}
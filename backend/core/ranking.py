@@ -0,0 +1,289 @@
+"""
+排序视图缓存 - 精选目录是静态的
+
+校验、评分、食材清单只在目录版本或评分规则变化时计算一次，
+每次请求只需要用位图过滤预排序好的列表。每个用户的排除位图（已做/已跳过/
+已收藏）按用户状态版本缓存在视图上，最近访问的用户优先保留。
+"""
+from typing import List, Dict, Any, Optional, Tuple, Callable, Iterable, Iterator
+from collections import OrderedDict
+from datetime import datetime
+import base64
+import bisect
+import json
+import logging
+
+from ..data.ingredients import get_ingredients
+
+logger = logging.getLogger(__name__)
+
+TOPIC_TYPES = ("movie_food", "famous_recipe", "archaeological")
+
+
+def encode_cursor(sort_key: Tuple[float, str]) -> str:
+    """排序键 -> 不透明游标"""
+    raw = json.dumps([-sort_key[0], sort_key[1]], ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    """不透明游标 -> 排序键，格式不对时抛 ValueError"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        score, topic_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return (-float(score), str(topic_id))
+    except Exception as e:
+        raise ValueError(f"无效的游标: {cursor}") from e
+
+
+def bits_of(positions: Iterable[int]) -> int:
+    """位置集合 -> 整数位图"""
+    mask = 0
+    for pos in positions:
+        mask |= 1 << pos
+    return mask
+
+
+def iter_bits(mask: int, start: int = 0) -> Iterator[int]:
+    """按从低到高的顺序迭代位图中置位的位置（从 start 开始）"""
+    if start:
+        mask >>= start
+    # 反转后的二进制串里用 str.find 逐个找 '1'，避免逐位移位
+    bits = format(mask, "b")[::-1]
+    pos = bits.find("1")
+    while pos != -1:
+        yield pos + start
+        pos = bits.find("1", pos + 1)
+
+
+class RankedView:
+    """
+    某个目录版本下的预排序视图（只读，不要修改其中的 dict）
+
+    每个选题在视图中的下标就是它的排名序号（0 = 得分最高），
+    类型、难度、排除集合都以「排名序号 -> 位」的整数位图保存，
+    过滤就是位运算，按位从低到高迭代即为排序后的结果。
+    """
+
+    def __init__(self, key: Tuple, by_type: Dict[str, List[Dict[str, Any]]], cache_size: int = 64):
+        self.key = key
+        self.built_at = datetime.now().isoformat()
+
+        # 全部类型合并后按 (得分降序, ID) 排序，保证分页游标稳定
+        ranked: List[Dict[str, Any]] = []
+        for t_type in by_type:
+            ranked.extend(by_type[t_type])
+        ranked.sort(key=self.sort_key)
+        self.ranked = ranked
+
+        # 收集时间取视图构建时间，相同版本下响应内容完全一致（便于 ETag）
+        for topic in ranked:
+            topic["collected_at"] = self.built_at
+        self._sort_keys = [self.sort_key(t) for t in ranked]
+
+        self.rank_of: Dict[str, int] = {}
+        type_positions: Dict[str, List[int]] = {t: [] for t in by_type}
+        difficulty_positions: Dict[str, List[int]] = {}
+        self._work_positions: Dict[str, List[int]] = {}
+        self._done_key_positions: Dict[str, List[int]] = {}
+
+        for rank, topic in enumerate(ranked):
+            self.rank_of[topic["id"]] = rank
+            type_positions[topic.get("topic_type", "movie_food")].append(rank)
+            difficulty_positions.setdefault(topic.get("cooking_difficulty", ""), []).append(rank)
+            self._work_positions.setdefault(topic["work_name"], []).append(rank)
+            done_key = f"{topic['work_name']}·{topic['recommended_dish']}"
+            self._done_key_positions.setdefault(done_key, []).append(rank)
+
+        self.all_mask = (1 << len(ranked)) - 1
+        self.type_masks = {t: bits_of(p) for t, p in type_positions.items()}
+        self.difficulty_masks = {d: bits_of(p) for d, p in difficulty_positions.items()}
+
+        # 排除位图缓存：用户 ID -> (用户状态版本, 位图)，LRU
+        self._excluded: "OrderedDict[str, Tuple[int, int]]" = OrderedDict()
+        self._cache_size = max(1, cache_size)
+
+    def __len__(self) -> int:
+        return len(self.ranked)
+
+    @staticmethod
+    def sort_key(topic: Dict[str, Any]) -> Tuple[float, str]:
+        return (-topic["total_score"], topic["id"])
+
+    def excluded_mask(self, state) -> int:
+        """用户已做/已跳过/已收藏的位图（按用户状态版本缓存）"""
+        cached = self._excluded.get(state.user_id)
+        if cached is not None and cached[0] == state.version:
+            self._excluded.move_to_end(state.user_id)
+            return cached[1]
+
+        positions: List[int] = []
+        for topic_id in state.skipped:
+            if topic_id in self.rank_of:
+                positions.append(self.rank_of[topic_id])
+        for topic_id in state.favorite_set:
+            if topic_id in self.rank_of:
+                positions.append(self.rank_of[topic_id])
+        for done in state.done:
+            # 已做过的标识可能是 作品名 或 作品名·推荐菜品
+            positions.extend(self._work_positions.get(done, ()))
+            positions.extend(self._done_key_positions.get(done, ()))
+
+        mask = bits_of(positions)
+        self._excluded[state.user_id] = (state.version, mask)
+        self._excluded.move_to_end(state.user_id)
+        while len(self._excluded) > self._cache_size:
+            self._excluded.popitem(last=False)
+        return mask
+
+    def eligible_mask(
+        self,
+        state,
+        topic_type: Optional[str] = None,
+        difficulty: Optional[str] = None
+    ) -> int:
+        """可推荐选题的位图"""
+        mask = self.all_mask & ~self.excluded_mask(state)
+        if topic_type in self.type_masks:
+            mask &= self.type_masks[topic_type]
+        if difficulty is not None:
+            mask &= self.difficulty_masks.get(difficulty, 0)
+        return mask
+
+    def select_ranks(
+        self,
+        state,
+        topic_type: Optional[str] = None,
+        difficulty: Optional[str] = None,
+        max_count: Optional[int] = None
+    ) -> List[int]:
+        """
+        按用户状态过滤，返回排名序号列表
+
+        Args:
+            state: 用户状态快照（已做/已跳过/已收藏不在发现池显示）
+            topic_type: 指定类型筛选（未知类型视为全部）
+            difficulty: 指定烹饪难度筛选
+            max_count: 返回数量上限
+        """
+        mask = self.eligible_mask(state, topic_type, difficulty)
+        ranks = []
+        for rank in iter_bits(mask):
+            ranks.append(rank)
+            if max_count is not None and len(ranks) >= max_count:
+                break
+        return ranks
+
+    def page_ranks(
+        self,
+        state,
+        page_size: int,
+        cursor: Optional[str] = None,
+        topic_type: Optional[str] = None,
+        difficulty: Optional[str] = None
+    ) -> Tuple[List[int], Optional[str]]:
+        """
+        游标分页：返回 (本页排名序号, 下一页游标)
+
+        游标记录上一页最后一条的排序键，所以翻页期间用户跳过/收藏了
+        别的选题也不会导致重复或漏项。最后一页的下一页游标为 None。
+        """
+        start = 0
+        if cursor:
+            start = bisect.bisect_right(self._sort_keys, decode_cursor(cursor))
+
+        mask = self.eligible_mask(state, topic_type, difficulty)
+        ranks: List[int] = []
+        next_cursor = None
+        for rank in iter_bits(mask, start):
+            if len(ranks) >= page_size:
+                next_cursor = encode_cursor(self._sort_keys[ranks[-1]])
+                break
+            ranks.append(rank)
+        return ranks, next_cursor
+
+    def materialize(self, ranks: Iterable[int]) -> List[Dict[str, Any]]:
+        """排名序号 -> 可修改的浅拷贝"""
+        return [dict(self.ranked[rank]) for rank in ranks]
+
+    def select(self, state, **filters) -> List[Dict[str, Any]]:
+        """按用户状态过滤预排序列表，返回可修改的浅拷贝（参数同 select_ranks）"""
+        return self.materialize(self.select_ranks(state, **filters))
+
+    def page(self, state, page_size: int, **filters) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """游标分页，返回 (本页选题浅拷贝, 下一页游标)（参数同 page_ranks）"""
+        ranks, next_cursor = self.page_ranks(state, page_size, **filters)
+        return self.materialize(ranks), next_cursor
+
+    def count(self, state, topic_type: Optional[str] = None, difficulty: Optional[str] = None) -> int:
+        """符合条件的选题总数"""
+        return self.eligible_mask(state, topic_type, difficulty).bit_count()
+
+
+class RankedViewCache:
+    """
+    排序视图缓存
+
+    以 (目录版本, 评分版本) 为键，键变化时才重新计算。
+    """
+
+    def __init__(
+        self,
+        catalog: Callable[[], Iterable[Dict[str, Any]]],
+        catalog_version: Callable[[], Any],
+        validate: Callable[[Dict[str, Any]], bool],
+        score: Callable[[Dict[str, Any]], float],
+        scoring_version: Callable[[], Any],
+        cache_size: int = 64
+    ):
+        self._catalog = catalog
+        self._catalog_version = catalog_version
+        self._validate = validate
+        self._score = score
+        self._scoring_version = scoring_version
+        self._cache_size = cache_size
+        self._view: Optional[RankedView] = None
+
+    def _current_key(self) -> Tuple:
+        return (self._catalog_version(), self._scoring_version())
+
+    def get(self) -> RankedView:
+        """获取当前视图（必要时重建）"""
+        key = self._current_key()
+        if self._view is None or self._view.key != key:
+            self._view = self._build(key)
+        return self._view
+
+    def invalidate(self):
+        """强制下次访问时重建"""
+        self._view = None
+
+    def _build(self, key: Tuple) -> RankedView:
+        by_type: Dict[str, List[Dict[str, Any]]] = {t: [] for t in TOPIC_TYPES}
+
+        for topic in self._catalog():
+            # 验证选题质量
+            if not self._validate(topic):
+                logger.debug(f"质量不达标: {topic['work_name']}")
+                continue
+
+            t_type = topic.get("topic_type", "movie_food")
+            if t_type not in by_type:
+                continue
+
+            by_type[t_type].append({
+                **topic,
+                "total_score": self._score(topic),
+                "is_done": False,
+                "is_favorited": False,
+                # 添加食材清单
+                "ingredients": get_ingredients(topic.get("recommended_dish", ""))
+            })
+
+        # 对每种类型内部按得分排序
+        for t_type in by_type:
+            by_type[t_type].sort(key=lambda x: x["total_score"], reverse=True)
+
+        view = RankedView(key, by_type, self._cache_size)
+        logger.info(f"排序视图已重建: {len(view)} 个有效选题")
+        return view
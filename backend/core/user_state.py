@@ -0,0 +1,277 @@
+"""
+用户状态服务 - 每个用户已做/已跳过/收藏的内存快照
+
+按用户首次访问时从数据库加载（只读该用户的行），之后读接口不再查库；
+最近访问的 USER_CACHE_SIZE 个用户常驻内存，超出时淘汰最久未访问的，
+再次访问时重新加载。修改操作先写数据库，成功后再同步到内存（write-through），
+并分配新的版本号（所有用户共用一个递增序列，版本号能唯一确定一个快照），
+下游缓存可以用版本号判断是否需要失效。多 worker 部署时，修改后发出
+user_state:<用户> 失效信号，其他 worker 收到后丢弃该用户的快照。
+"""
+from typing import Dict, Optional, FrozenSet, List, Tuple
+from collections import OrderedDict
+from weakref import WeakValueDictionary
+import asyncio
+import hashlib
+import logging
+
+from ..config import settings
+from ..models.database import DEFAULT_USER
+from ..models.storage import get_storage
+
+from .coordination import get_coordinator
+
+logger = logging.getLogger(__name__)
+
+# 跨 worker 失效信号名前缀（后接用户 ID）
+STATE_SIGNAL = "user_state:"
+
+
+class UserStateSnapshot:
+    """某个用户某一版本的状态（不可变）"""
+
+    __slots__ = ("user_id", "version", "done", "skipped", "favorites", "favorite_set", "_digest")
+
+    def __init__(
+        self,
+        user_id: str,
+        version: int,
+        done: FrozenSet[str],
+        skipped: FrozenSet[str],
+        favorites: Tuple[str, ...]
+    ):
+        self.user_id = user_id
+        self.version = version
+        self.done = done                  # 作品名·推荐菜品
+        self.skipped = skipped            # 选题ID
+        self.favorites = favorites        # 选题ID（按收藏顺序）
+        self.favorite_set = frozenset(favorites)
+        self._digest: Optional[str] = None
+
+    @property
+    def digest(self) -> str:
+        """
+        状态内容摘要（首次使用时计算）
+
+        版本号是进程内计数，各 worker 不同；摘要只由内容决定，
+        各 worker 读到同一份数据库状态时相同（用于 ETag）。
+        """
+        if self._digest is None:
+            h = hashlib.sha1()
+            for part in (sorted(self.done), sorted(self.skipped), self.favorites):
+                h.update("\x1f".join(part).encode("utf-8"))
+                h.update(b"\x1e")
+            self._digest = h.hexdigest()
+        return self._digest
+
+    def is_done(self, work_name: str, dish_name: str = "") -> bool:
+        return work_name in self.done or f"{work_name}·{dish_name}" in self.done
+
+    def is_favorited(self, topic_id: str) -> bool:
+        return topic_id in self.favorite_set
+
+
+class UserStateService:
+    """用户状态服务（按用户 LRU 缓存快照，写穿透到数据库）"""
+
+    def __init__(self, capacity: Optional[int] = None):
+        self.capacity = max(1, settings.USER_CACHE_SIZE if capacity is None else capacity)
+        self._snapshots: "OrderedDict[str, UserStateSnapshot]" = OrderedDict()
+        # 每个用户一把锁；没有协程持有时自动回收，不随用户数增长
+        self._locks: "WeakValueDictionary[str, asyncio.Lock]" = WeakValueDictionary()
+        self._version = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def version(self, user_id: str = DEFAULT_USER) -> int:
+        """用户当前快照的版本号（未加载或已淘汰时为 0）"""
+        snapshot = self._snapshots.get(user_id)
+        return snapshot.version if snapshot is not None else 0
+
+    def _lock(self, user_id: str) -> asyncio.Lock:
+        lock = self._locks.get(user_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[user_id] = lock
+        return lock
+
+    async def _fetch(self, user_id: str) -> UserStateSnapshot:
+        """从数据库读取用户状态并发布（调用方持有该用户的锁）"""
+        storage = get_storage()
+        done = await storage.get_done_topics(user_id)
+        skipped = await storage.get_skipped_topics(user_id)
+        favorites = await storage.get_favorites(user_id)
+        logger.info(
+            f"用户状态已加载 [{user_id}]: 已完成 {len(done)}, 已跳过 {len(skipped)}, 已收藏 {len(favorites)}"
+        )
+        return self._publish(user_id, frozenset(done), frozenset(skipped), tuple(favorites))
+
+    async def load(self, user_id: str = DEFAULT_USER) -> UserStateSnapshot:
+        """从数据库（重新）加载用户状态"""
+        async with self._lock(user_id):
+            return await self._fetch(user_id)
+
+    async def snapshot(self, user_id: str = DEFAULT_USER) -> UserStateSnapshot:
+        """获取用户当前快照（未缓存时加载）"""
+        snapshot = self._snapshots.get(user_id)
+        if snapshot is not None:
+            self.hits += 1
+            self._snapshots.move_to_end(user_id)
+            return snapshot
+
+        self.misses += 1
+        async with self._lock(user_id):
+            # 等锁期间可能已被并发的请求加载
+            snapshot = self._snapshots.get(user_id)
+            if snapshot is None:
+                snapshot = await self._fetch(user_id)
+            return snapshot
+
+    async def invalidate(self, user_id: str):
+        """丢弃用户的快照（其他 worker 修改了该用户的状态），下次访问时重新加载"""
+        async with self._lock(user_id):
+            self._snapshots.pop(user_id, None)
+
+    def _publish(
+        self,
+        user_id: str,
+        done: FrozenSet[str],
+        skipped: FrozenSet[str],
+        favorites: Tuple[str, ...]
+    ) -> UserStateSnapshot:
+        self._version += 1
+        snapshot = UserStateSnapshot(user_id, self._version, done, skipped, favorites)
+        self._snapshots[user_id] = snapshot
+        self._snapshots.move_to_end(user_id)
+        while len(self._snapshots) > self.capacity:
+            evicted, _ = self._snapshots.popitem(last=False)
+            self.evictions += 1
+            logger.debug(f"用户状态已淘汰: {evicted}")
+        return snapshot
+
+    async def _current(self, user_id: str) -> UserStateSnapshot:
+        """锁内取用户当前快照（等锁或写库期间被淘汰时重新加载）"""
+        snapshot = self._snapshots.get(user_id)
+        if snapshot is None:
+            snapshot = await self._fetch(user_id)
+        return snapshot
+
+    async def _signal(self, user_id: str):
+        await get_coordinator().signal(f"{STATE_SIGNAL}{user_id}")
+
+    async def mark_done(self, work_name: str, dish_name: str, user_id: str = DEFAULT_USER):
+        """标记选题为已完成"""
+        await self.snapshot(user_id)
+        # 只增不减的集合：写库不必持锁，并发的写可以合并到同一批提交
+        await get_storage().mark_topic_done(work_name, dish_name, user_id)
+        key = f"{work_name}·{dish_name}"
+        async with self._lock(user_id):
+            current = self._snapshots.get(user_id)
+            if current is None:
+                # 写库期间被淘汰：重新加载（已包含本次修改）
+                await self._fetch(user_id)
+            elif key in current.done:
+                return
+            else:
+                self._publish(user_id, current.done | {key}, current.skipped, current.favorites)
+        await self._signal(user_id)
+
+    async def skip(
+        self,
+        topic_id: str,
+        work_name: str,
+        dish_name: str,
+        reason: str,
+        topic_type: Optional[str] = None,
+        dish_origin: Optional[str] = None,
+        user_id: str = DEFAULT_USER
+    ):
+        """跳过选题（每次跳过都会记录原因，ID 集合只加一次）"""
+        await self.snapshot(user_id)
+        await get_storage().skip_topic(topic_id, work_name, dish_name, reason, topic_type, dish_origin, user_id)
+        async with self._lock(user_id):
+            current = self._snapshots.get(user_id)
+            if current is None:
+                await self._fetch(user_id)
+            elif topic_id in current.skipped:
+                return
+            else:
+                self._publish(user_id, current.done, current.skipped | {topic_id}, current.favorites)
+        await self._signal(user_id)
+
+    async def toggle_favorite(self, topic_id: str, user_id: str = DEFAULT_USER) -> bool:
+        """切换收藏状态，返回新的收藏状态"""
+        async with self._lock(user_id):
+            current = await self._current(user_id)
+            is_now_favorited = await get_storage().toggle_favorite(topic_id, user_id)
+            if is_now_favorited:
+                favorites = current.favorites + (topic_id,)
+            else:
+                favorites = tuple(f for f in current.favorites if f != topic_id)
+            self._publish(user_id, current.done, current.skipped, favorites)
+            await self._signal(user_id)
+            return is_now_favorited
+
+    async def update_favorites(
+        self,
+        add: List[str],
+        remove: List[str],
+        user_id: str = DEFAULT_USER
+    ) -> Tuple[List[str], List[str]]:
+        """批量收藏/取消收藏，返回 (实际新增, 实际移除)"""
+        async with self._lock(user_id):
+            current = await self._current(user_id)
+            added, removed = await get_storage().update_favorites(add, remove, user_id)
+            if not added and not removed:
+                return added, removed
+            gone = set(removed)
+            favorites = tuple(f for f in current.favorites if f not in gone)
+            present = set(favorites)
+            favorites += tuple(t for t in added if t not in present and t not in gone)
+            self._publish(user_id, current.done, current.skipped, favorites)
+            await self._signal(user_id)
+            return added, removed
+
+    async def unfavorite_and_skip(
+        self,
+        topic_id: str,
+        work_name: str,
+        dish_name: str,
+        reason: str,
+        topic_type: Optional[str] = None,
+        dish_origin: Optional[str] = None,
+        user_id: str = DEFAULT_USER
+    ) -> bool:
+        """从收藏池移除并跳过（同一事务），返回原来是否已收藏"""
+        async with self._lock(user_id):
+            current = await self._current(user_id)
+            was_favorited = await get_storage().unfavorite_and_skip(
+                topic_id, work_name, dish_name, reason, topic_type, dish_origin, user_id
+            )
+            favorites = tuple(f for f in current.favorites if f != topic_id)
+            if favorites != current.favorites or topic_id not in current.skipped:
+                self._publish(user_id, current.done, current.skipped | {topic_id}, favorites)
+                await self._signal(user_id)
+            return was_favorited
+
+    def stats(self) -> Dict[str, int]:
+        """快照缓存统计（/api/health）"""
+        return {
+            "cached_users": len(self._snapshots),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+_user_state: Optional[UserStateService] = None
+
+
+def get_user_state() -> UserStateService:
+    """获取用户状态服务单例"""
+    global _user_state
+    if _user_state is None:
+        _user_state = UserStateService()
+    return _user_state
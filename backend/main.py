@@ -8,13 +8,53 @@ import os
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
-
-from .api.routes import router
-from .models.database import init_db, close_db
+from slowapi.middleware import SlowAPIMiddleware
+
+from .api.ratelimit import SQLiteRateLimitStorage  # noqa: F401  注册 sqlite:// 限流存储
+from .api.routes import router, get_job_status, stream_discovery_events, stream_job_events
+from .config import settings
+from .models.database import LOCAL_DATA_DIR
+from .models.storage import get_storage
+from .core.coordination import get_coordinator
+from .core.jobs import get_job_manager
+from .core.maintenance import get_maintenance_scheduler
+from .core.user_state import get_user_state, STATE_SIGNAL
 from .scrapers.tmdb import close_tmdb_client
 
+# 多个进程共享状态：多 worker，或多个节点共用 PostgreSQL
+SHARED_STATE = settings.WORKERS > 1 or settings.STORAGE_BACKEND != "sqlite"
+
+
+def get_ratelimit_storage_uri() -> str:
+    """限流计数的存储（多节点部署需要配置 RATELIMIT_STORAGE_URI，否则各节点分别计数）"""
+    if settings.RATELIMIT_STORAGE_URI:
+        return settings.RATELIMIT_STORAGE_URI
+    # 多 worker 时计数放在共享的 SQLite 文件里
+    return f"sqlite:///{LOCAL_DATA_DIR / 'ratelimit.db'}" if settings.WORKERS > 1 else "memory://"
+
+
+def client_address(request: Request) -> str:
+    """
+    限流计数的客户端地址
+
+    uvicorn 在 nginx 后面只看到 127.0.0.1：优先用 nginx 设置的 X-Real-IP，
+    其次是 X-Forwarded-For 的最后一跳（由最近的代理追加，客户端无法伪造）
+    """
+    real_ip = request.headers.get("x-real-ip")
+    if real_ip:
+        return real_ip.strip()
+    forwarded = request.headers.get("x-forwarded-for")
+    if forwarded:
+        return forwarded.split(",")[-1].strip()
+    return get_remote_address(request)
+
+
 # 速率限制器
-limiter = Limiter(key_func=get_remote_address, default_limits=["60/minute"])
+limiter = Limiter(
+    key_func=client_address,
+    default_limits=["60/minute"],
+    storage_uri=get_ratelimit_storage_uri()
+)
 
 # 配置日志
 logging.basicConfig(
@@ -40,12 +80,22 @@ def get_cors_origins():
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
     # 启动时初始化
-    await init_db()
-    logging.info("数据库初始化完成")
+    await get_storage().init()
+    logging.info(f"数据库初始化完成（{get_storage().name}）")
+    await get_user_state().load()
+    # 其他 worker 修改某个用户的状态后，丢弃该用户的快照
+    coordinator = get_coordinator()
+    coordinator.on_signal_prefix(STATE_SIGNAL, get_user_state().invalidate)
+    await coordinator.start()
+    await get_job_manager().start()
+    get_maintenance_scheduler().start()
     yield
     # 关闭时清理资源
+    await get_maintenance_scheduler().stop()
+    await get_job_manager().shutdown()
+    await coordinator.stop()
     await close_tmdb_client()
-    await close_db()
+    await get_storage().close()
     logging.info("应用关闭，资源已释放")
 
 
@@ -56,18 +106,32 @@ app = FastAPI(
     lifespan=lifespan
 )
 
-# 配置速率限制
+# 配置速率限制（RATELIMIT_ENABLED 时中间件对所有路由应用 default_limits）
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+if settings.RATELIMIT_ENABLED:
+    # 任务状态轮询（约每秒一次）和事件流是长时间、高频的正常访问，不计数
+    for endpoint in (get_job_status, stream_job_events, stream_discovery_events):
+        limiter.exempt(endpoint)
+    app.add_middleware(SlowAPIMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
     allow_origins=get_cors_origins(),
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-    allow_headers=["Content-Type", "Authorization", "Accept", "Origin", "X-Requested-With"],
+    allow_headers=["Content-Type", "Authorization", "Accept", "Origin", "X-Requested-With", "X-User-Id"],
 )
 
+if SHARED_STATE:
+    @app.middleware("http")
+    async def sync_shared_state(request: Request, call_next):
+        """多 worker / 多节点：处理 API 请求前先检查失效信号，保证读到其他 worker 的最新修改"""
+        if request.url.path.startswith("/api/"):
+            await get_coordinator().sync()
+        return await call_next(request)
+
+
 # 注册路由
 app.include_router(router)
 
@@ -81,6 +145,7 @@ async def root():
         "endpoints": {
             "status": "/api/status",
             "discover": "POST /api/collect",
+            "jobs": "GET /api/jobs/{id}",
             "topics": "GET /api/topics",
             "favorites": "GET /api/favorites/full",
             "mark_done": "POST /api/topics/{id}/done"
@@ -0,0 +1,300 @@
+"""
+在线备份 - 不停服导出数据库快照，以及从快照恢复
+
+用 SQLite 的在线备份 API 分步复制页面（每步 BACKUP_PAGES 页，步间让出），
+不占用应用的连接池，也不阻塞写入。复制过程中其他连接的写入会让备份从头
+开始，重来次数过多时改为一步复制完（WAL 模式下只持有读快照，写入照常）。
+
+快照文件是 gzip 压缩的数据库（<name>.db.gz），旁边的 <name>.json 记录
+校验和、页数和表结构版本；恢复时先校验再原子替换目标文件。
+"""
+from typing import Any, Dict, List, Optional
+from datetime import datetime
+from pathlib import Path
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+
+from ..config import settings
+from .database import DatabaseManager, LOCAL_DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_SUFFIX = ".db.gz"
+
+# 每步复制的页数（默认 4KiB 页，约 4MB）和步间间隔（秒）
+BACKUP_PAGES = 1024
+BACKUP_SLEEP = 0.005
+
+# 分步复制被写入打断、从头开始的最多次数
+MAX_RESTARTS = 5
+
+# 快照名：只允许字母数字和 -_.（下载接口按名字取文件）
+_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+_CHUNK = 1024 * 1024
+
+
+class SnapshotError(Exception):
+    """快照不存在、校验失败或无法恢复"""
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def backup_dir() -> Path:
+    """快照目录（settings.BACKUP_DIR，默认 ~/.xzstudio/backups）"""
+    return Path(settings.BACKUP_DIR) if settings.BACKUP_DIR else LOCAL_DATA_DIR / "backups"
+
+
+def snapshot_path(name: str, directory: Optional[Path] = None) -> Path:
+    """按名字找快照文件（名字不含后缀）"""
+    if not _NAME_PATTERN.match(name) or name.startswith("."):
+        raise SnapshotError(f"无效的快照名: {name}")
+    path = (directory or backup_dir()) / f"{name}{SNAPSHOT_SUFFIX}"
+    if not path.exists():
+        raise SnapshotError(f"快照不存在: {name}")
+    return path
+
+
+def _manifest_path(path: Path) -> Path:
+    return path.with_name(path.name[:-len(SNAPSHOT_SUFFIX)] + ".json")
+
+
+def _copy_pages(source: Path, target: Path, pages: int) -> Dict[str, Any]:
+    """在线备份 API 复制到 target，返回步数和重来次数（在线程里运行）"""
+    stats = {"steps": 0, "restarts": 0, "pages": 0}
+    last_copied = 0
+
+    def progress(status, remaining, total):
+        nonlocal last_copied
+        stats["steps"] += 1
+        stats["pages"] = total
+        copied = total - remaining
+        if copied < last_copied:
+            stats["restarts"] += 1
+            if stats["restarts"] > MAX_RESTARTS:
+                raise _TooManyRestarts()
+        last_copied = copied
+
+    src = sqlite3.connect(f"file:{source}?mode=ro", uri=True, timeout=30)
+    try:
+        try:
+            dst = sqlite3.connect(target)
+            try:
+                src.backup(dst, pages=pages, progress=progress, sleep=BACKUP_SLEEP)
+            finally:
+                dst.close()
+        except _TooManyRestarts:
+            logger.warning(f"分步备份被写入打断 {stats['restarts']} 次，改为一步复制")
+            target.unlink(missing_ok=True)
+            dst = sqlite3.connect(target)
+            try:
+                src.backup(dst, pages=-1)
+            finally:
+                dst.close()
+    finally:
+        src.close()
+    return stats
+
+
+def _inspect(path: Path) -> Dict[str, Any]:
+    """快照数据库的完整性检查和基本信息"""
+    conn = sqlite3.connect(path)
+    try:
+        # 快照单独使用，不需要 WAL
+        conn.execute("PRAGMA journal_mode = DELETE")
+        check = conn.execute("PRAGMA quick_check").fetchone()[0]
+        return {
+            "ok": check == "ok",
+            "check": check,
+            "schema_version": conn.execute("PRAGMA user_version").fetchone()[0],
+            "page_count": conn.execute("PRAGMA page_count").fetchone()[0],
+            "page_size": conn.execute("PRAGMA page_size").fetchone()[0],
+        }
+    finally:
+        conn.close()
+
+
+def _compress(source: Path, target: Path) -> Dict[str, Any]:
+    """gzip 压缩，同时计算原文件和压缩文件的 SHA-256"""
+    raw = hashlib.sha256()
+    with open(source, "rb") as src, gzip.open(target, "wb", compresslevel=6) as dst:
+        while chunk := src.read(_CHUNK):
+            raw.update(chunk)
+            dst.write(chunk)
+    return {
+        "sha256": raw.hexdigest(),
+        "archive_sha256": _file_sha256(target),
+        "size_bytes": source.stat().st_size,
+        "compressed_bytes": target.stat().st_size,
+    }
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(_CHUNK):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _create_snapshot(source: Path, directory: Path, pages: int, keep: int) -> Dict[str, Any]:
+    directory.mkdir(parents=True, exist_ok=True)
+    name = f"topics-{datetime.now():%Y%m%d-%H%M%S-%f}"
+    raw_path = directory / f".{name}.db"
+    final_path = directory / f"{name}{SNAPSHOT_SUFFIX}"
+    tmp_path = directory / f".{name}{SNAPSHOT_SUFFIX}"
+
+    start = time.perf_counter()
+    try:
+        copy = _copy_pages(source, raw_path, pages)
+        info = _inspect(raw_path)
+        if not info["ok"]:
+            raise SnapshotError(f"快照完整性检查失败: {info['check']}")
+        checksums = _compress(raw_path, tmp_path)
+    finally:
+        raw_path.unlink(missing_ok=True)
+
+    manifest = {
+        "name": name,
+        "created_at": datetime.now().isoformat(),
+        "source": str(source),
+        "schema_version": info["schema_version"],
+        "page_count": info["page_count"],
+        "page_size": info["page_size"],
+        **checksums,
+        "steps": copy["steps"],
+        "restarts": copy["restarts"],
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+    _manifest_path(final_path).write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp_path, final_path)
+    _prune(directory, keep)
+    logger.info(
+        f"快照已创建: {name}（{manifest['size_bytes'] / 1024:.0f} KB → "
+        f"{manifest['compressed_bytes'] / 1024:.0f} KB，{copy['steps']} 步）"
+    )
+    return manifest
+
+
+def _prune(directory: Path, keep: int):
+    """只保留最新 keep 个快照（0 表示不清理）"""
+    if keep <= 0:
+        return
+    for old in sorted(directory.glob(f"*{SNAPSHOT_SUFFIX}"))[:-keep]:
+        if old.name.startswith("."):
+            continue
+        old.unlink(missing_ok=True)
+        _manifest_path(old).unlink(missing_ok=True)
+
+
+async def create_snapshot(
+    directory: Optional[Path] = None,
+    source: Optional[Path] = None,
+    pages: int = BACKUP_PAGES,
+    keep: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    在线创建快照（复制和压缩在线程里进行，不占用事件循环和连接池）
+
+    Args:
+        directory: 快照目录，默认 backup_dir()
+        source: 数据库文件，默认当前数据库（存储后端不是 SQLite 时必须显式指定）
+        pages: 每步复制的页数（-1 表示一步复制完）
+        keep: 保留的快照数，默认 settings.BACKUP_KEEP
+
+    Returns:
+        快照清单（名字、校验和、大小、页数、表结构版本等）
+    """
+    if source is None and settings.STORAGE_BACKEND != "sqlite":
+        # 本地 SQLite 文件已不再写入，快照只会是旧数据
+        raise SnapshotError(f"{settings.STORAGE_BACKEND} 存储请用数据库自带的备份工具（如 pg_dump）")
+    return await asyncio.to_thread(
+        _create_snapshot,
+        source or DatabaseManager.get_instance().path,
+        directory or backup_dir(),
+        pages,
+        settings.BACKUP_KEEP if keep is None else keep
+    )
+
+
+def list_snapshots(directory: Optional[Path] = None) -> List[Dict[str, Any]]:
+    """已有快照的清单（新的在前）"""
+    directory = directory or backup_dir()
+    if not directory.exists():
+        return []
+    manifests = []
+    for path in sorted(directory.glob(f"*{SNAPSHOT_SUFFIX}"), reverse=True):
+        if path.name.startswith("."):
+            continue
+        manifest_file = _manifest_path(path)
+        if manifest_file.exists():
+            manifests.append(json.loads(manifest_file.read_text(encoding="utf-8")))
+        else:
+            manifests.append({"name": path.name[:-len(SNAPSHOT_SUFFIX)], "compressed_bytes": path.stat().st_size})
+    return manifests
+
+
+def read_manifest(path: Path) -> Optional[Dict[str, Any]]:
+    """快照旁边的清单（单独下载的快照没有）"""
+    manifest_file = _manifest_path(path)
+    if not manifest_file.exists():
+        return None
+    return json.loads(manifest_file.read_text(encoding="utf-8"))
+
+
+def restore_snapshot(path: Path, target: Path, sha256: Optional[str] = None, force: bool = False) -> Dict[str, Any]:
+    """
+    校验快照并恢复到 target（先解压到临时文件，校验通过后原子替换）
+
+    校验和取自快照清单，没有清单时用参数 sha256（下载接口的 X-Snapshot-SHA256 头）；
+    两者都没有时只依赖 gzip 自带的 CRC 和完整性检查。
+    恢复前需要停止使用 target 的应用进程；target 已存在时需要 force=True。
+
+    Raises:
+        SnapshotError: 文件损坏、校验和不符或完整性检查失败
+        FileExistsError: target 已存在且 force=False
+    """
+    manifest = read_manifest(path) or {"name": path.name[:-len(SNAPSHOT_SUFFIX)]}
+    expected = manifest.get("sha256") or sha256
+    if target.exists() and not force:
+        raise FileExistsError(f"目标数据库已存在: {target}")
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = target.with_name(f".{target.name}.restore")
+    try:
+        digest = hashlib.sha256()
+        with gzip.open(path, "rb") as src, open(tmp_path, "wb") as dst:
+            try:
+                while chunk := src.read(_CHUNK):
+                    digest.update(chunk)
+                    dst.write(chunk)
+            except (gzip.BadGzipFile, EOFError) as e:
+                raise SnapshotError(f"快照文件已损坏: {path.name}: {e}") from e
+        if expected and digest.hexdigest() != expected:
+            raise SnapshotError(f"校验和不符: {path.name}")
+        try:
+            info = _inspect(tmp_path)
+        except sqlite3.DatabaseError as e:
+            raise SnapshotError(f"快照不是有效的数据库: {path.name}: {e}") from e
+        if not info["ok"]:
+            raise SnapshotError(f"快照完整性检查失败: {info['check']}")
+
+        # 旧的 WAL/共享内存文件属于被替换的数据库，必须一起删掉
+        for suffix in ("-wal", "-shm"):
+            Path(f"{target}{suffix}").unlink(missing_ok=True)
+        os.replace(tmp_path, target)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+    logger.info(f"已从快照 {manifest['name']} 恢复到 {target}")
+    return {**manifest, **info, "verified": bool(expected)}
+
@@ -0,0 +1,189 @@
+"""
+写合并（group commit）- 把短时间内的多次写操作合并到一个事务里提交
+
+调用方提交写操作后等待确认；写操作先在队列里攒几毫秒（或攒满 N 个），
+然后在写连接上用一个事务全部执行：连续的同一条 SQL 合并为 executemany，
+整批只提交一次。确认在 COMMIT 之后返回，调用方拿到的就是已落库的结果。
+
+单个操作失败不影响同批其他操作：每组语句在自己的 SAVEPOINT 里执行，
+失败时回滚到保存点，再逐条重试找出出错的那一条。
+"""
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, TypeVar
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class _WriteOp:
+    __slots__ = ("sql", "params", "fn", "future")
+
+    def __init__(self, sql: Optional[str], params: Sequence[Any], fn: Optional[Callable], future: asyncio.Future):
+        self.sql = sql            # SQL 语句（fn 为 None 时）
+        self.params = params      # 参数列表（每项一行）
+        self.fn = fn              # 自定义操作：async fn(db) -> 结果
+        self.future = future
+
+
+class WriteBatcher:
+    """写操作攒批 + 单事务提交"""
+
+    def __init__(self, manager, max_delay_ms: float, max_batch: int):
+        self.manager = manager
+        self.max_delay = max_delay_ms / 1000
+        self.max_batch = max_batch
+        self._queue: List[_WriteOp] = []
+        self._pending: Optional[asyncio.Event] = None
+        self._full: Optional[asyncio.Event] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._committing = False
+        # 统计
+        self.batches = 0
+        self.ops = 0
+        self.largest = 0
+
+    async def execute(self, sql: str, params: Sequence[Any] = ()) -> None:
+        """执行一条写语句，提交后返回"""
+        await self._submit(_WriteOp(sql, [params], None, self._future()))
+
+    async def executemany(self, sql: str, rows: Iterable[Sequence[Any]]) -> None:
+        """批量执行同一条写语句，提交后返回"""
+        rows = list(rows)
+        if rows:
+            await self._submit(_WriteOp(sql, rows, None, self._future()))
+
+    async def run(self, fn: Callable[[Any], Awaitable[T]]) -> T:
+        """
+        在批事务里执行自定义写操作（需要读取结果时用，如 RETURNING / lastrowid）
+
+        fn 收到写连接，不能自己 commit。
+        """
+        return await self._submit(_WriteOp(None, (), fn, self._future()))
+
+    @staticmethod
+    def _future() -> asyncio.Future:
+        return asyncio.get_running_loop().create_future()
+
+    async def _submit(self, op: _WriteOp):
+        if self._flusher is None or self._flusher.done():
+            self._pending = asyncio.Event()
+            self._full = asyncio.Event()
+            self._flusher = asyncio.create_task(self._flush_loop(), name="db-write-batcher")
+
+        self._queue.append(op)
+        self._pending.set()
+        if len(self._queue) >= self.max_batch:
+            self._full.set()
+        # shield：调用方被取消时写操作照常提交
+        return await asyncio.shield(op.future)
+
+    async def _flush_loop(self):
+        while True:
+            await self._pending.wait()
+            if len(self._queue) < self.max_batch and self.max_delay > 0:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.max_delay)
+                except asyncio.TimeoutError:
+                    pass
+
+            batch, self._queue = self._queue[:self.max_batch], self._queue[self.max_batch:]
+            if len(self._queue) < self.max_batch:
+                self._full.clear()
+            if not self._queue:
+                self._pending.clear()
+
+            if batch:
+                self._committing = True
+                try:
+                    await self._commit(batch)
+                finally:
+                    self._committing = False
+
+    async def _commit(self, batch: List[_WriteOp]):
+        results: Dict[int, Any] = {}
+        errors: Dict[int, BaseException] = {}
+
+        async with self.manager.writer() as db:
+            try:
+                await db.execute("BEGIN IMMEDIATE")
+                for group in self._groups(batch):
+                    await self._apply(db, group, results, errors)
+                await db.execute("COMMIT")
+            except BaseException as e:
+                logger.error(f"批量写入失败（{len(batch)} 个操作）: {e}")
+                try:
+                    await db.execute("ROLLBACK")
+                except Exception:
+                    pass
+                for op in batch:
+                    if not op.future.done():
+                        op.future.set_exception(e)
+                if not isinstance(e, Exception):
+                    raise
+                return
+
+        self.batches += 1
+        self.ops += len(batch)
+        self.largest = max(self.largest, len(batch))
+        for op in batch:
+            if op.future.done():
+                continue
+            if id(op) in errors:
+                op.future.set_exception(errors[id(op)])
+            else:
+                op.future.set_result(results.get(id(op)))
+
+    @staticmethod
+    def _groups(batch: List[_WriteOp]) -> List[List[_WriteOp]]:
+        """按提交顺序分组：连续的同一条 SQL 合为一组，自定义操作单独一组"""
+        groups: List[List[_WriteOp]] = []
+        for op in batch:
+            if op.fn is None and groups and groups[-1][0].fn is None and groups[-1][0].sql == op.sql:
+                groups[-1].append(op)
+            else:
+                groups.append([op])
+        return groups
+
+    async def _apply(self, db, group: List[_WriteOp], results: Dict[int, Any], errors: Dict[int, BaseException]):
+        """在保存点里执行一组；失败时回滚这一组并逐个重试"""
+        await db.execute("SAVEPOINT batch_op")
+        try:
+            head = group[0]
+            if head.fn is not None:
+                results[id(head)] = await head.fn(db)
+            else:
+                await db.executemany(head.sql, [row for op in group for row in op.params])
+            await db.execute("RELEASE batch_op")
+            return
+        except Exception as e:
+            await db.execute("ROLLBACK TO batch_op")
+            await db.execute("RELEASE batch_op")
+            if len(group) == 1:
+                errors[id(group[0])] = e
+                return
+
+        for op in group:
+            await self._apply(db, [op], results, errors)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "ops": self.ops,
+            "avg_batch": round(self.ops / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest,
+            "queued": len(self._queue),
+        }
+
+    async def close(self):
+        """提交队列中剩余的写操作并停止"""
+        if self._flusher is None:
+            return
+        # 不再等待攒批，直接提交剩余操作
+        self.max_delay = 0
+        while (self._queue or self._committing) and not self._flusher.done():
+            await asyncio.sleep(0.001)
+        self._flusher.cancel()
+        await asyncio.gather(self._flusher, return_exceptions=True)
+        self._flusher = None
@@ -1,11 +1,17 @@
 import aiosqlite
+from pydantic import ValidationError
 from pathlib import Path
-from typing import List, Set, Optional
+from typing import Dict, List, Set, Optional, Tuple
 from contextlib import asynccontextmanager
-from .topic import TopicCandidate
+from .topic import TopicCandidate, make_topic_id
+from .batching import WriteBatcher
+from ..config import settings
+import asyncio
 import json
 import os
 import logging
+import time
+import zlib
 
 logger = logging.getLogger(__name__)
 
@@ -15,14 +21,101 @@ LOCAL_DATA_DIR = Path.home() / ".xzstudio"
 LOCAL_DATA_DIR.mkdir(exist_ok=True)
 DATABASE_PATH = LOCAL_DATA_DIR / "topics.db"
 
+# 未指定用户时的用户 ID（单人部署、脚本和 v4 之前的旧数据）
+DEFAULT_USER = "default"
+
+# SQLite 性能档位（settings.DB_PROFILE 选择）
+# - durable：每次提交都 fsync，断电也不丢已确认的写入
+# - balanced：WAL + NORMAL，进程崩溃不丢数据，断电可能丢最后几个事务（默认）
+# - fast：不 fsync，更大的缓存和检查点间隔，只适合可重建的数据/压测
+DB_PROFILES = {
+    "durable": {
+        "synchronous": "FULL",
+        "mmap_size": 0,
+        "cache_size": -8 * 1024,           # 负数表示 KiB
+        "temp_store": "DEFAULT",
+        "busy_timeout": 10000,             # 毫秒，等待其他进程释放写锁
+        "wal_autocheckpoint": 1000,        # 页
+        "cached_statements": 128,          # 每个连接缓存的预编译语句数
+    },
+    "balanced": {
+        "synchronous": "NORMAL",
+        "mmap_size": 64 * 1024 * 1024,
+        "cache_size": -32 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+        "wal_autocheckpoint": 1000,
+        "cached_statements": 256,
+    },
+    "fast": {
+        "synchronous": "OFF",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -128 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+        "wal_autocheckpoint": 10000,
+        "cached_statements": 512,
+    },
+}
+
+
+class PoolStats:
+    """某类连接的等待统计"""
+
+    __slots__ = ("acquired", "waited", "total_wait_ms", "max_wait_ms")
+
+    def __init__(self):
+        self.acquired = 0
+        self.waited = 0           # 需要排队的次数
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    def record(self, wait_ms: float):
+        self.acquired += 1
+        if wait_ms >= 0.1:
+            self.waited += 1
+        self.total_wait_ms += wait_ms
+        self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+
+    def to_dict(self) -> dict:
+        return {
+            "acquired": self.acquired,
+            "waited": self.waited,
+            "avg_wait_ms": round(self.total_wait_ms / self.acquired, 3) if self.acquired else 0.0,
+            "max_wait_ms": round(self.max_wait_ms, 3),
+        }
+
 
 class DatabaseManager:
-    """数据库连接管理器 - 复用连接，避免频繁创建"""
+    """
+    数据库连接池 - 一个写连接 + N 个只读连接
+
+    WAL 模式下读写互不阻塞：写操作排队使用唯一的写连接（asyncio.Lock，先到先得），
+    读操作从只读连接池里取一个（query_only，共享 mmap），各自在独立线程里执行，
+    读接口不再排在收藏/跳过等写操作后面。只读连接按需创建，最多 DB_READERS 个。
+    """
 
     _instance: Optional["DatabaseManager"] = None
 
-    def __init__(self):
-        self._connection: Optional[aiosqlite.Connection] = None
+    def __init__(self, readers: Optional[int] = None, profile: Optional[str] = None, path: Optional[Path] = None):
+        self.max_readers = readers if readers is not None else settings.DB_READERS
+        self.profile_name = profile or settings.DB_PROFILE
+        if self.profile_name not in DB_PROFILES:
+            raise ValueError(f"未知的数据库档位: {self.profile_name}（可选 {', '.join(DB_PROFILES)}）")
+        self.profile = DB_PROFILES[self.profile_name]
+        if profile is None and settings.DB_MMAP_SIZE is not None:
+            # 旧配置 DB_MMAP_SIZE 仍然有效：覆盖所选档位的 mmap_size
+            self.profile = {**self.profile, "mmap_size": settings.DB_MMAP_SIZE}
+        self.path = path or DATABASE_PATH
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._write_lock = asyncio.Lock()
+        self._readers: List[aiosqlite.Connection] = []
+        self._idle: Optional[asyncio.Queue] = None
+        self._opening = 0
+        self.write_stats = PoolStats()
+        self.read_stats = PoolStats()
+        # 用户操作等小写入攒批提交（见 batching.py）
+        self.batcher = WriteBatcher(self, settings.DB_BATCH_DELAY_MS, settings.DB_BATCH_SIZE)
 
     @classmethod
     def get_instance(cls) -> "DatabaseManager":
@@ -30,36 +123,133 @@ class DatabaseManager:
             cls._instance = cls()
         return cls._instance
 
+    async def _open(self, readonly: bool) -> aiosqlite.Connection:
+        profile = self.profile
+        conn = await aiosqlite.connect(
+            self.path,
+            isolation_level=None,  # 自动提交模式
+            cached_statements=profile["cached_statements"]
+        )
+        # 启用 WAL 模式提高并发性能（写连接设置一次即持久生效）
+        if not readonly:
+            # 增量回收空闲页（删除后由 compact_db 归还给文件系统）：必须在切换 WAL 之前设置，
+            # 否则新数据库的文件头已经写出，设置不再生效；已有数据库需要一次完整 VACUUM
+            # 才能转换，由维护任务（compact_db）完成，不阻塞启动
+            await conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            await conn.execute("PRAGMA journal_mode=WAL")
+            await conn.execute(f"PRAGMA wal_autocheckpoint={profile['wal_autocheckpoint']}")
+        await conn.execute(f"PRAGMA synchronous={profile['synchronous']}")
+        # 多 worker 同时写时等待锁，而不是立即报 database is locked
+        await conn.execute(f"PRAGMA busy_timeout={profile['busy_timeout']}")
+        # 内存映射读取，多个连接共享操作系统页缓存
+        await conn.execute(f"PRAGMA mmap_size={profile['mmap_size']}")
+        await conn.execute(f"PRAGMA cache_size={profile['cache_size']}")
+        await conn.execute(f"PRAGMA temp_store={profile['temp_store']}")
+        if readonly:
+            await conn.execute("PRAGMA query_only=ON")
+        return conn
+
     async def get_connection(self) -> aiosqlite.Connection:
-        """获取数据库连接（复用已有连接）"""
-        if self._connection is None:
-            self._connection = await aiosqlite.connect(
-                DATABASE_PATH,
-                isolation_level=None  # 自动提交模式
-            )
-            # 启用 WAL 模式提高并发性能
-            await self._connection.execute("PRAGMA journal_mode=WAL")
-            await self._connection.execute("PRAGMA synchronous=NORMAL")
-            logger.info("数据库连接已建立")
-        return self._connection
+        """获取写连接（复用已有连接）"""
+        if self._writer is None:
+            self._writer = await self._open(readonly=False)
+            logger.info(f"数据库连接已建立（{self.profile_name}）")
+        return self._writer
+
+    @asynccontextmanager
+    async def writer(self):
+        """独占写连接（同一时间只有一个协程在写）"""
+        start = time.perf_counter()
+        async with self._write_lock:
+            self.write_stats.record((time.perf_counter() - start) * 1000)
+            yield await self.get_connection()
+
+    @asynccontextmanager
+    async def reader(self):
+        """借用一个只读连接，用完归还"""
+        if self.max_readers <= 0:
+            # 未启用只读连接：读也走写连接
+            async with self.writer() as conn:
+                yield conn
+            return
+
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            # 写连接负责把库切换到 WAL，先于只读连接打开
+            await self.get_connection()
+
+        start = time.perf_counter()
+        if self._idle.empty() and len(self._readers) + self._opening < self.max_readers:
+            self._opening += 1
+            try:
+                conn = await self._open(readonly=True)
+            finally:
+                self._opening -= 1
+            self._readers.append(conn)
+        else:
+            conn = await self._idle.get()
+        self.read_stats.record((time.perf_counter() - start) * 1000)
+
+        try:
+            yield conn
+        finally:
+            self._idle.put_nowait(conn)
+
+    def stats(self) -> dict:
+        """连接池状态和等待时间"""
+        return {
+            "profile": self.profile_name,
+            "readers": {
+                "max": self.max_readers,
+                "open": len(self._readers),
+                "idle": self._idle.qsize() if self._idle is not None else 0,
+                **self.read_stats.to_dict(),
+            },
+            "writer": {
+                "busy": self._write_lock.locked(),
+                **self.write_stats.to_dict(),
+            },
+            "batches": self.batcher.stats(),
+        }
 
     async def close(self):
-        """关闭数据库连接"""
-        if self._connection is not None:
-            await self._connection.close()
-            self._connection = None
+        """关闭所有连接（先提交排队中的写操作）"""
+        await self.batcher.close()
+        for conn in self._readers:
+            await conn.close()
+        self._readers = []
+        self._idle = None
+        if self._writer is not None:
+            await self._writer.close()
+            self._writer = None
             logger.info("数据库连接已关闭")
 
 
 @asynccontextmanager
-async def get_db():
-    """获取数据库连接的上下文管理器"""
+async def get_db(readonly: bool = False):
+    """
+    获取数据库连接的上下文管理器
+
+    readonly=True 时借用只读连接（可与其他读并行，不等待写）；
+    否则独占写连接，块内的多条语句不会与其他写交错。
+    """
     manager = DatabaseManager.get_instance()
-    conn = await manager.get_connection()
-    try:
-        yield conn
-    finally:
-        pass  # 不关闭连接，保持复用
+    if readonly:
+        async with manager.reader() as conn:
+            yield conn
+    else:
+        async with manager.writer() as conn:
+            yield conn
+
+
+def get_write_batcher() -> WriteBatcher:
+    """写合并器：提交后等待确认，短时间内的写操作合并为一个事务"""
+    return DatabaseManager.get_instance().batcher
+
+
+def get_db_stats() -> dict:
+    """连接池统计（等待次数、平均/最大等待时间）"""
+    return DatabaseManager.get_instance().stats()
 
 
 async def close_db():
@@ -68,26 +258,371 @@ async def close_db():
     await manager.close()
 
 
+# ============ 表结构迁移 ============
+
+# 当前表结构版本（PRAGMA user_version）
+SCHEMA_VERSION = 4
+
+# 选题表：常用于筛选/排序的字段是独立列，其余字段放在 data JSON 里
+TOPICS_DDL = """
+    CREATE TABLE IF NOT EXISTS topics (
+        id TEXT PRIMARY KEY,
+        work_name TEXT NOT NULL,
+        dish TEXT NOT NULL DEFAULT '',
+        topic_type TEXT NOT NULL DEFAULT 'movie_food',
+        total_score INTEGER NOT NULL DEFAULT 0,
+        difficulty TEXT,
+        status TEXT NOT NULL DEFAULT 'pending',
+        discovered_at TIMESTAMP,
+        run_id INTEGER,
+        data JSON,
+        content_hash TEXT,
+        first_seen_run INTEGER,
+        last_seen_run INTEGER
+    )
+"""
+
+TOPICS_INDEXES = (
+    # 最新选题列表
+    "CREATE INDEX IF NOT EXISTS idx_topics_status_discovered ON topics (status, discovered_at DESC)",
+    # 按类型筛选的最新选题
+    "CREATE INDEX IF NOT EXISTS idx_topics_type_status_discovered ON topics (topic_type, status, discovered_at DESC)",
+    # 按得分排序
+    "CREATE INDEX IF NOT EXISTS idx_topics_status_score ON topics (status, total_score DESC, discovered_at DESC)",
+    # 最后一次出现在某次发现里的选题（归档用）
+    "CREATE INDEX IF NOT EXISTS idx_topics_last_seen ON topics (last_seen_run)",
+    # 按作品/菜品查重
+    "CREATE INDEX IF NOT EXISTS idx_topics_work_dish ON topics (work_name, dish)",
+)
+
+# 拆成独立列的 TopicCandidate 字段（不再重复存进 data）
+TOPIC_COLUMN_FIELDS = {"id", "work_name", "recommended_dish", "topic_type", "cooking_difficulty", "discovered_at"}
+
+
+# 用户状态表：按 user_id 分区，主键/索引都以 user_id 开头，读一个用户的状态只扫描该用户的行
+DONE_TOPICS_DDL = f"""
+    CREATE TABLE IF NOT EXISTS done_topics (
+        user_id TEXT NOT NULL DEFAULT '{DEFAULT_USER}',
+        work_name TEXT,
+        dish_name TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (user_id, work_name, dish_name)
+    )
+"""
+
+FAVORITES_DDL = f"""
+    CREATE TABLE IF NOT EXISTS favorites (
+        user_id TEXT NOT NULL DEFAULT '{DEFAULT_USER}',
+        topic_id TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (user_id, topic_id)
+    )
+"""
+
+# 跳过/不感兴趣表 - 用于学习用户偏好
+SKIPPED_TOPICS_DDL = f"""
+    CREATE TABLE IF NOT EXISTS skipped_topics (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        topic_id TEXT NOT NULL,
+        work_name TEXT NOT NULL,
+        dish_name TEXT,
+        skip_reason TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        topic_type TEXT,
+        dish_origin TEXT,
+        user_id TEXT NOT NULL DEFAULT '{DEFAULT_USER}'
+    )
+"""
+
+USER_STATE_INDEXES = (
+    # 某个用户跳过的选题 ID（覆盖索引）
+    "CREATE INDEX IF NOT EXISTS idx_skipped_user_topic ON skipped_topics (user_id, topic_id)",
+    # 归档时保留任何用户收藏的选题
+    "CREATE INDEX IF NOT EXISTS idx_favorites_topic ON favorites (topic_id)",
+)
+
+
+# 跳过统计：按用户、维度增量维护的计数（触发器和 skipped_topics 的插入/删除在同一事务里）
+# 维度：total（key 为空）、reason、work、topic_type、dish_origin、week（%Y-W%W）
+SKIP_STATS_DDL = """
+    CREATE TABLE IF NOT EXISTS skip_stats (
+        user_id TEXT NOT NULL,
+        dimension TEXT NOT NULL,
+        key TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, dimension, key)
+    ) WITHOUT ROWID
+"""
+
+SKIP_STATS_INDEXES = (
+    # 每个用户、每个维度的 Top N
+    "CREATE INDEX IF NOT EXISTS idx_skip_stats_top ON skip_stats (user_id, dimension, count DESC)",
+)
+
+# 一条跳过记录在各维度上的 (dimension, key)，{row} 为 NEW / OLD
+_SKIP_STATS_KEYS = """
+    VALUES
+        ('total', ''),
+        ('reason', {row}.skip_reason),
+        ('work', {row}.work_name),
+        ('topic_type', {row}.topic_type),
+        ('dish_origin', {row}.dish_origin),
+        ('week', strftime('%Y-W%W', {row}.created_at))
+"""
+
+SKIP_STATS_TRIGGERS = (
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_skip_stats_insert AFTER INSERT ON skipped_topics
+    BEGIN
+        INSERT INTO skip_stats (user_id, dimension, key, count)
+        SELECT NEW.user_id, column1, column2, 1 FROM ({_SKIP_STATS_KEYS.format(row="NEW")}) WHERE column2 IS NOT NULL
+        ON CONFLICT (user_id, dimension, key) DO UPDATE SET count = count + 1;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_skip_stats_delete AFTER DELETE ON skipped_topics
+    BEGIN
+        UPDATE skip_stats SET count = count - 1
+        WHERE user_id = OLD.user_id
+          AND (dimension, key) IN (SELECT column1, column2 FROM ({_SKIP_STATS_KEYS.format(row="OLD")}));
+        DELETE FROM skip_stats WHERE user_id = OLD.user_id AND count <= 0;
+    END
+    """,
+)
+
+
+# 归档的发现记录：每次发现一行，选题行（TOPIC_COLUMNS 顺序）编码为 JSON 后 zlib 压缩
+ARCHIVE_DDL = """
+    CREATE TABLE IF NOT EXISTS discovery_archive (
+        run_id INTEGER PRIMARY KEY,
+        run_at TIMESTAMP,
+        topics_found INTEGER,
+        topic_count INTEGER NOT NULL,
+        archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        data BLOB NOT NULL
+    )
+"""
+
+
+def _topic_row(topic: TopicCandidate, status: str = "pending", run_id: Optional[int] = None) -> tuple:
+    """TopicCandidate → topics 表的一行"""
+    return (
+        topic.id,
+        topic.work_name,
+        topic.recommended_dish,
+        topic.topic_type.value,
+        topic.total_score(),
+        topic.cooking_difficulty.value,
+        status,
+        topic.discovered_at.isoformat(),
+        run_id,
+        topic.model_dump_json(exclude=TOPIC_COLUMN_FIELDS),
+    )
+
+
+TOPIC_COLUMNS = "id, work_name, dish, topic_type, total_score, difficulty, status, discovered_at, run_id, data"
+
+
+# 写入时额外维护的列：内容哈希、首次/最近一次出现的发现 ID
+TOPIC_UPSERT_COLUMNS = TOPIC_COLUMNS + ", content_hash, first_seen_run, last_seen_run"
+
+
+def _topic_from_row(row) -> TopicCandidate:
+    """topics 表的一行（TOPIC_COLUMNS 顺序）→ TopicCandidate"""
+    data = json.loads(row[9]) if row[9] else {}
+    data.update(
+        id=row[0],
+        work_name=row[1],
+        recommended_dish=row[2],
+        topic_type=row[3],
+        cooking_difficulty=row[5],
+        discovered_at=row[7],
+    )
+    return TopicCandidate(**data)
+
+
+def _topics_from_rows(rows) -> List[TopicCandidate]:
+    """批量转换；校验不过的行（v1 迁移时原样保留的旧数据）跳过并记录，不影响其他行"""
+    topics = []
+    for row in rows:
+        try:
+            topics.append(_topic_from_row(row))
+        except ValidationError as e:
+            logger.warning(f"跳过校验失败的选题: {row[0]} - {e.error_count()} 个错误")
+    return topics
+
+
+async def _migrate_topics_v1(db):
+    """v0 → v1：topics 表从 (id, data, discovered_at, status) 拆出独立列"""
+    cursor = await db.execute("PRAGMA table_info(topics)")
+    columns = {r[1] for r in await cursor.fetchall()}
+    if not columns or "work_name" in columns:
+        return
+
+    await db.execute("ALTER TABLE topics RENAME TO topics_v0")
+    await db.execute(TOPICS_DDL)
+    cursor = await db.execute("SELECT id, data, discovered_at, status FROM topics_v0")
+    rows = []
+    for topic_id, raw, discovered_at, status in await cursor.fetchall():
+        data = json.loads(raw) if raw else {}
+        try:
+            topic = TopicCandidate(**data)
+            rows.append(_topic_row(topic, status or "pending"))
+        except Exception as e:
+            # 校验不过的旧数据原样保留 JSON，热字段尽量取出
+            logger.warning(f"迁移选题时校验失败，保留原始数据: {topic_id} - {type(e).__name__}")
+            rows.append((
+                topic_id,
+                data.get("work_name", ""),
+                data.get("recommended_dish", ""),
+                data.get("topic_type", "movie_food"),
+                0,
+                data.get("cooking_difficulty"),
+                status or "pending",
+                discovered_at,
+                None,
+                raw,
+            ))
+    await db.executemany(
+        f"INSERT OR REPLACE INTO topics ({TOPIC_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        rows
+    )
+    await db.execute("DROP TABLE topics_v0")
+    logger.info(f"topics 表已迁移到 v1（{len(rows)} 条）")
+
+
+async def _migrate_skip_stats_v2(db):
+    """v1 → v2：skipped_topics 增加 topic_type / dish_origin 列（跳过统计表在 v4 按用户建立并回填）"""
+    cursor = await db.execute("PRAGMA table_info(skipped_topics)")
+    columns = {r[1] for r in await cursor.fetchall()}
+    if not columns:
+        return
+
+    for column in ("topic_type", "dish_origin"):
+        if column not in columns:
+            await db.execute(f"ALTER TABLE skipped_topics ADD COLUMN {column} TEXT")
+    logger.info("skipped_topics 已迁移到 v2")
+
+
+async def _migrate_topic_ids_v3(db):
+    """
+    v2 → v3：选题 ID 改为由内容确定（make_topic_id），增加内容哈希和首次/最近出现的发现
+
+    同一作品·菜品的多行合并为最新的一行，收藏和跳过记录改用新 ID。
+    """
+    cursor = await db.execute("PRAGMA table_info(topics)")
+    columns = {r[1] for r in await cursor.fetchall()}
+    if not columns:
+        return
+
+    for column, kind in (("content_hash", "TEXT"), ("first_seen_run", "INTEGER"), ("last_seen_run", "INTEGER")):
+        if column not in columns:
+            await db.execute(f"ALTER TABLE topics ADD COLUMN {column} {kind}")
+    await db.execute("DROP INDEX IF EXISTS idx_topics_run")
+
+    cursor = await db.execute(f"SELECT {TOPIC_COLUMNS} FROM topics ORDER BY discovered_at, rowid")
+    merged: Dict[str, list] = {}
+    renamed: Dict[str, str] = {}
+    for row in await cursor.fetchall():
+        old_id = row[0]
+        try:
+            topic = _topic_from_row(row)
+            content_hash = topic.content_hash()
+        except Exception:
+            # 校验不过的旧数据保留原 ID
+            content_hash = None
+        new_id = make_topic_id(row[1], row[2], row[3]) if content_hash else old_id
+        runs = [r for r in (row[8],) if r is not None]
+        previous = merged.get(new_id)
+        if previous is not None:
+            runs += [r for r in (previous[11], previous[12]) if r is not None]
+        merged[new_id] = [new_id, *row[1:], content_hash, min(runs, default=None), max(runs, default=None)]
+        if old_id != new_id:
+            renamed[old_id] = new_id
+
+    await db.execute("DELETE FROM topics")
+    await db.executemany(
+        f"INSERT INTO topics ({TOPIC_UPSERT_COLUMNS}) VALUES ({', '.join('?' * 13)})",
+        list(merged.values())
+    )
+    for old_id, new_id in renamed.items():
+        await db.execute("UPDATE OR IGNORE favorites SET topic_id = ? WHERE topic_id = ?", (new_id, old_id))
+        await db.execute("DELETE FROM favorites WHERE topic_id = ?", (old_id,))
+        await db.execute("UPDATE skipped_topics SET topic_id = ? WHERE topic_id = ?", (new_id, old_id))
+    logger.info(f"选题 ID 已迁移到 v3（{len(merged)} 条，{len(renamed)} 个 ID 改变）")
+
+
+async def _migrate_user_state_v4(db):
+    """
+    v3 → v4：已做/收藏/跳过记录和跳过统计增加 user_id（旧数据归 DEFAULT_USER）
+
+    done_topics / favorites 的主键改为以 user_id 开头，需要重建表（保持原有行顺序）；
+    skipped_topics 直接加列；skip_stats 按用户重算。
+    """
+    for table, ddl, columns in (
+        ("done_topics", DONE_TOPICS_DDL, "work_name, dish_name, created_at"),
+        ("favorites", FAVORITES_DDL, "topic_id, created_at"),
+    ):
+        cursor = await db.execute(f"PRAGMA table_info({table})")
+        existing = {r[1] for r in await cursor.fetchall()}
+        if not existing or "user_id" in existing:
+            continue
+        await db.execute(f"ALTER TABLE {table} RENAME TO {table}_v3")
+        await db.execute(ddl)
+        await db.execute(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {table}_v3 ORDER BY rowid")
+        await db.execute(f"DROP TABLE {table}_v3")
+
+    cursor = await db.execute("PRAGMA table_info(skipped_topics)")
+    existing = {r[1] for r in await cursor.fetchall()}
+    if not existing:
+        return
+    if "user_id" not in existing:
+        await db.execute(f"ALTER TABLE skipped_topics ADD COLUMN user_id TEXT NOT NULL DEFAULT '{DEFAULT_USER}'")
+
+    # 旧触发器写的是不带 user_id 的统计表，init_db 会按新表结构重建
+    for trigger in ("trg_skip_stats_insert", "trg_skip_stats_delete"):
+        await db.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    await db.execute("DROP TABLE IF EXISTS skip_stats")
+    await db.execute(SKIP_STATS_DDL)
+    count = await _rebuild_skip_stats(db)
+    logger.info(f"用户状态已迁移到 v4（{count} 条跳过记录归入用户 {DEFAULT_USER}）")
+
+
+MIGRATIONS = {
+    1: _migrate_topics_v1,
+    2: _migrate_skip_stats_v2,
+    3: _migrate_topic_ids_v3,
+    4: _migrate_user_state_v4,
+}
+
+
+async def _migrate(db):
+    """按 user_version 依次执行未完成的迁移（在写事务里，多 worker 只会执行一次）"""
+    cursor = await db.execute("PRAGMA user_version")
+    version = (await cursor.fetchone())[0]
+    for target in sorted(MIGRATIONS):
+        if version < target:
+            await MIGRATIONS[target](db)
+    if version < SCHEMA_VERSION:
+        await db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
 async def init_db():
-    """初始化数据库"""
-    DATABASE_PATH.parent.mkdir(exist_ok=True)
+    """初始化数据库（建表 + 迁移）"""
+    DatabaseManager.get_instance().path.parent.mkdir(exist_ok=True)
     async with get_db() as db:
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS topics (
-                id TEXT PRIMARY KEY,
-                data JSON,
-                discovered_at TIMESTAMP,
-                status TEXT DEFAULT 'pending'
-            )
-        """)
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS done_topics (
-                work_name TEXT,
-                dish_name TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                PRIMARY KEY (work_name, dish_name)
-            )
-        """)
+        await db.execute("BEGIN IMMEDIATE")
+        try:
+            await _migrate(db)
+        except BaseException:
+            await db.execute("ROLLBACK")
+            raise
+        await db.execute("COMMIT")
+
+        await db.execute(TOPICS_DDL)
+        for ddl in TOPICS_INDEXES:
+            await db.execute(ddl)
+        await db.execute(DONE_TOPICS_DDL)
         await db.execute("""
             CREATE TABLE IF NOT EXISTS discovery_runs (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -95,132 +630,356 @@ async def init_db():
                 topics_found INTEGER
             )
         """)
+        await db.execute(ARCHIVE_DDL)
         # 收藏表
+        await db.execute(FAVORITES_DDL)
+        await db.execute(SKIPPED_TOPICS_DDL)
+        await db.execute(SKIP_STATS_DDL)
+        for ddl in USER_STATE_INDEXES + SKIP_STATS_INDEXES + SKIP_STATS_TRIGGERS:
+            await db.execute(ddl)
+        # 后台任务表 - 阶段进度和结果都在 data 里
         await db.execute("""
-            CREATE TABLE IF NOT EXISTS favorites (
-                topic_id TEXT PRIMARY KEY,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                data JSON,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
-        # 跳过/不感兴趣表 - 用于学习用户偏好
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs (created_at)"
+        )
+        # 跨 worker 协调：租约（互斥锁，过期自动释放）和失效信号（版本号）
         await db.execute("""
-            CREATE TABLE IF NOT EXISTS skipped_topics (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                topic_id TEXT NOT NULL,
-                work_name TEXT NOT NULL,
-                dish_name TEXT,
-                skip_reason TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            CREATE TABLE IF NOT EXISTS leases (
+                name TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                data JSON
+            )
+        """)
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS signals (
+                name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
         await db.commit()
 
 
-async def save_topics(topics: List[TopicCandidate], run_id: int = None):
-    """保存选题到数据库"""
-    async with get_db() as db:
-        for topic in topics:
-            await db.execute(
-                "INSERT OR REPLACE INTO topics (id, data, discovered_at, status) VALUES (?, ?, ?, ?)",
-                (topic.id, topic.model_dump_json(), topic.discovered_at.isoformat(), "pending")
+async def save_topics(topics: List[TopicCandidate], run_id: int = None) -> Dict[str, int]:
+    """
+    保存一次发现的选题（按内容哈希比对，只写有变化的行）
+
+    - 新选题：插入，首次/最近出现都记为本次发现
+    - 内容变化：更新内容列（保留状态和首次发现时间）
+    - 内容相同：只更新最近出现的发现
+
+    返回 {"inserted", "updated", "unchanged"} 行数。
+    """
+    # 同一次发现里重复的选题只保留最后一个
+    latest = {topic.id: topic for topic in topics}
+    hashes = {topic_id: topic.content_hash() for topic_id, topic in latest.items()}
+
+    async def upsert(db) -> Dict[str, int]:
+        known: Dict[str, Optional[str]] = {}
+        ids = list(latest)
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            cursor = await db.execute(
+                f"SELECT id, content_hash FROM topics WHERE id IN ({', '.join('?' * len(chunk))})",
+                chunk
             )
-        await db.commit()
+            known.update(await cursor.fetchall())
 
+        new = [t for t in latest.values() if t.id not in known]
+        changed = [t for t in latest.values() if t.id in known and known[t.id] != hashes[t.id]]
+        unchanged = [t.id for t in latest.values() if t.id in known and known[t.id] == hashes[t.id]]
 
-async def get_done_topics() -> Set[str]:
-    """获取已做过的选题，避免重复"""
-    async with get_db() as db:
-        cursor = await db.execute("SELECT work_name, dish_name FROM done_topics")
+        if new:
+            await db.executemany(
+                f"INSERT INTO topics ({TOPIC_UPSERT_COLUMNS}) VALUES ({', '.join('?' * 13)})",
+                [(*_topic_row(t, run_id=run_id), hashes[t.id], run_id, run_id) for t in new]
+            )
+        if changed:
+            rows = []
+            for t in changed:
+                row = _topic_row(t, run_id=run_id)
+                rows.append((*row[1:6], row[8], row[9], hashes[t.id], run_id, t.id))
+            await db.executemany(
+                """UPDATE topics
+                   SET work_name = ?, dish = ?, topic_type = ?, total_score = ?, difficulty = ?,
+                       run_id = ?, data = ?, content_hash = ?, last_seen_run = COALESCE(?, last_seen_run)
+                   WHERE id = ?""",
+                rows
+            )
+        if unchanged and run_id is not None:
+            await db.executemany(
+                "UPDATE topics SET last_seen_run = ? WHERE id = ? AND (last_seen_run IS NULL OR last_seen_run < ?)",
+                [(run_id, topic_id, run_id) for topic_id in unchanged]
+            )
+        return {"inserted": len(new), "updated": len(changed), "unchanged": len(unchanged)}
+
+    return await get_write_batcher().run(upsert)
+
+
+async def get_done_topics(user_id: str = DEFAULT_USER) -> Set[str]:
+    """获取用户已做过的选题，避免重复"""
+    async with get_db(readonly=True) as db:
+        cursor = await db.execute("SELECT work_name, dish_name FROM done_topics WHERE user_id = ?", (user_id,))
         rows = await cursor.fetchall()
         return {f"{r[0]}·{r[1]}" for r in rows}
 
 
-async def mark_topic_done(work_name: str, dish_name: str):
+async def mark_topic_done(work_name: str, dish_name: str, user_id: str = DEFAULT_USER):
     """标记选题为已完成"""
-    async with get_db() as db:
-        await db.execute(
-            "INSERT OR IGNORE INTO done_topics (work_name, dish_name) VALUES (?, ?)",
-            (work_name, dish_name)
-        )
-        await db.commit()
+    await get_write_batcher().execute(
+        "INSERT OR IGNORE INTO done_topics (user_id, work_name, dish_name) VALUES (?, ?, ?)",
+        (user_id, work_name, dish_name)
+    )
 
 
-async def get_latest_topics(limit: int = 20) -> List[TopicCandidate]:
-    """获取最新的选题"""
-    async with get_db() as db:
+async def get_latest_topics(
+    limit: int = 20,
+    topic_type: Optional[str] = None,
+    difficulty: Optional[str] = None,
+    order_by: str = "recent",
+    status: str = "pending"
+) -> List[TopicCandidate]:
+    """
+    获取最新的选题（走索引，只为返回的行解析 data）
+
+    Args:
+        topic_type: 按类型筛选
+        difficulty: 按烹饪难度筛选
+        order_by: recent（发现时间）/ score（综合分）
+    """
+    where = ["status = ?"]
+    params: list = [status]
+    if topic_type:
+        where.append("topic_type = ?")
+        params.append(topic_type)
+    if difficulty:
+        where.append("difficulty = ?")
+        params.append(difficulty)
+    order = "total_score DESC, discovered_at DESC" if order_by == "score" else "discovered_at DESC"
+    params.append(limit)
+
+    async with get_db(readonly=True) as db:
         cursor = await db.execute(
-            "SELECT data FROM topics WHERE status = 'pending' ORDER BY discovered_at DESC LIMIT ?",
-            (limit,)
+            f"SELECT {TOPIC_COLUMNS} FROM topics WHERE {' AND '.join(where)} ORDER BY {order} LIMIT ?",
+            params
         )
-        rows = await cursor.fetchall()
-        topics = []
-        for row in rows:
-            data = json.loads(row[0])
-            topics.append(TopicCandidate(**data))
-        return topics
+        return _topics_from_rows(await cursor.fetchall())
+
+
+async def get_topic(topic_id: str) -> Optional[TopicCandidate]:
+    """按 ID 获取发现的选题（不存在或校验不过时返回 None）"""
+    async with get_db(readonly=True) as db:
+        cursor = await db.execute(f"SELECT {TOPIC_COLUMNS} FROM topics WHERE id = ?", (topic_id,))
+        row = await cursor.fetchone()
+    topics = _topics_from_rows([row] if row else [])
+    return topics[0] if topics else None
 
 
 async def create_discovery_run() -> int:
     """创建一次发现记录"""
-    async with get_db() as db:
+    async def insert(db) -> int:
         cursor = await db.execute(
             "INSERT INTO discovery_runs (topics_found) VALUES (0)"
         )
-        await db.commit()
         return cursor.lastrowid
 
+    return await get_write_batcher().run(insert)
+
 
 async def update_discovery_run(run_id: int, topics_found: int):
     """更新发现记录"""
-    async with get_db() as db:
-        await db.execute(
-            "UPDATE discovery_runs SET topics_found = ? WHERE id = ?",
-            (topics_found, run_id)
+    await get_write_batcher().execute(
+        "UPDATE discovery_runs SET topics_found = ? WHERE id = ?",
+        (topics_found, run_id)
+    )
+
+
+# ============ 保留策略 / 归档 / 整理 ============
+
+async def get_runs_to_archive(keep: int) -> List[int]:
+    """最新 keep 次以外的发现记录 ID（从旧到新）"""
+    async with get_db(readonly=True) as db:
+        cursor = await db.execute(
+            "SELECT id FROM discovery_runs ORDER BY id DESC LIMIT -1 OFFSET ?",
+            (keep,)
         )
-        await db.commit()
+        return sorted(r[0] for r in await cursor.fetchall())
 
 
-# ============ 收藏功能 ============
+async def archive_run(run_id: int) -> int:
+    """
+    把最后一次出现在这次发现里的选题压缩存入 discovery_archive，并从热表删除（一个事务）
 
-async def toggle_favorite(topic_id: str) -> bool:
-    """切换收藏状态，返回新的收藏状态"""
-    async with get_db() as db:
-        # 检查是否已收藏
+    之后的发现再次找到的选题不受影响；收藏中的选题留在热表。返回归档的选题数。
+    """
+    async def archive(db) -> int:
+        cursor = await db.execute(
+            "SELECT run_at, topics_found FROM discovery_runs WHERE id = ?", (run_id,)
+        )
+        run = await cursor.fetchone()
+        if run is None:
+            return 0
         cursor = await db.execute(
-            "SELECT topic_id FROM favorites WHERE topic_id = ?",
-            (topic_id,)
+            f"""SELECT {TOPIC_COLUMNS} FROM topics
+                WHERE last_seen_run = ? AND id NOT IN (SELECT topic_id FROM favorites)""",
+            (run_id,)
+        )
+        rows = [list(r) for r in await cursor.fetchall()]
+        payload = zlib.compress(json.dumps(rows, ensure_ascii=False).encode("utf-8"), 9)
+        await db.execute(
+            """INSERT OR REPLACE INTO discovery_archive (run_id, run_at, topics_found, topic_count, data)
+               VALUES (?, ?, ?, ?, ?)""",
+            (run_id, run[0], run[1], len(rows), payload)
+        )
+        await db.execute(
+            "DELETE FROM topics WHERE last_seen_run = ? AND id NOT IN (SELECT topic_id FROM favorites)",
+            (run_id,)
         )
+        await db.execute("DELETE FROM discovery_runs WHERE id = ?", (run_id,))
+        return len(rows)
+
+    return await get_write_batcher().run(archive)
+
+
+async def get_archived_topics(run_id: int) -> List[TopicCandidate]:
+    """读取归档的一次发现的选题"""
+    async with get_db(readonly=True) as db:
+        cursor = await db.execute("SELECT data FROM discovery_archive WHERE run_id = ?", (run_id,))
         row = await cursor.fetchone()
+    if row is None:
+        return []
+    return _topics_from_rows(json.loads(zlib.decompress(row[0])))
 
-        if row:
-            # 已收藏，取消收藏
-            await db.execute("DELETE FROM favorites WHERE topic_id = ?", (topic_id,))
-            await db.commit()
-            return False
-        else:
-            # 未收藏，添加收藏
-            await db.execute(
-                "INSERT INTO favorites (topic_id) VALUES (?)",
-                (topic_id,)
-            )
-            await db.commit()
-            return True
 
+async def compact_db() -> dict:
+    """
+    归还空闲页给文件系统（增量 VACUUM）并截断 WAL
 
-async def get_favorites() -> List[str]:
-    """获取所有收藏的选题ID"""
+    旧数据库还不是增量模式时，先做一次完整 VACUUM 转换（重写整个文件，期间写入排队等待）。
+    返回整理前后的页数和 checkpoint 结果；有读连接正在读时 WAL 可能截断不完全。
+    """
     async with get_db() as db:
-        cursor = await db.execute("SELECT topic_id FROM favorites")
+        async def pages() -> Tuple[int, int]:
+            page_count = (await (await db.execute("PRAGMA page_count")).fetchone())[0]
+            freelist = (await (await db.execute("PRAGMA freelist_count")).fetchone())[0]
+            return page_count, freelist
+
+        before, freed = await pages()
+        converted = (await (await db.execute("PRAGMA auto_vacuum")).fetchone())[0] != 2
+        if converted:
+            logger.info("数据库转换为增量 auto_vacuum（完整 VACUUM）")
+            await db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            await db.execute("VACUUM")
+        else:
+            # incremental_vacuum 每 step 一次只回收一页，executescript 会一直执行到结束
+            await db.executescript("PRAGMA incremental_vacuum")
+        after, _ = await pages()
+        busy, wal_pages, checkpointed = await (await db.execute("PRAGMA wal_checkpoint(TRUNCATE)")).fetchone()
+        page_size = (await (await db.execute("PRAGMA page_size")).fetchone())[0]
+
+    return {
+        "pages_before": before,
+        "pages_after": after,
+        "freed_pages": freed,
+        "converted": converted,
+        "size_bytes": after * page_size,
+        "checkpoint": {"busy": bool(busy), "wal_pages": wal_pages, "checkpointed": checkpointed},
+    }
+
+
+# ============ 收藏功能 ============
+
+async def toggle_favorite(topic_id: str, user_id: str = DEFAULT_USER) -> bool:
+    """切换收藏状态，返回新的收藏状态（在同一个写事务里判断并修改，无竞态）"""
+    async def toggle(db) -> bool:
+        # 已收藏则删除；删掉了说明原来是收藏状态
+        if await _delete_favorite(db, user_id, topic_id):
+            return False
+        await _insert_favorite(db, user_id, topic_id)
+        return True
+
+    return await get_write_batcher().run(toggle)
+
+
+async def _delete_favorite(db, user_id: str, topic_id: str) -> bool:
+    """删除收藏，返回是否真的删除了"""
+    cursor = await db.execute(
+        "DELETE FROM favorites WHERE user_id = ? AND topic_id = ? RETURNING topic_id",
+        (user_id, topic_id)
+    )
+    return await cursor.fetchone() is not None
+
+
+async def _insert_favorite(db, user_id: str, topic_id: str) -> bool:
+    """添加收藏，返回是否新增（已收藏时不变）"""
+    cursor = await db.execute(
+        """INSERT INTO favorites (user_id, topic_id) VALUES (?, ?)
+           ON CONFLICT(user_id, topic_id) DO NOTHING RETURNING topic_id""",
+        (user_id, topic_id)
+    )
+    return await cursor.fetchone() is not None
+
+
+async def update_favorites(
+    add: List[str],
+    remove: List[str],
+    user_id: str = DEFAULT_USER
+) -> Tuple[List[str], List[str]]:
+    """
+    批量修改收藏（一个事务），返回 (实际新增, 实际移除)
+
+    已收藏的 add、未收藏的 remove 会被忽略。
+    """
+    async def update(db) -> Tuple[List[str], List[str]]:
+        added = [t for t in add if await _insert_favorite(db, user_id, t)]
+        removed = [t for t in remove if await _delete_favorite(db, user_id, t)]
+        return added, removed
+
+    return await get_write_batcher().run(update)
+
+
+async def unfavorite_and_skip(
+    topic_id: str,
+    work_name: str,
+    dish_name: str,
+    reason: str,
+    topic_type: Optional[str] = None,
+    dish_origin: Optional[str] = None,
+    user_id: str = DEFAULT_USER
+) -> bool:
+    """取消收藏并记录跳过（一个事务），返回原来是否已收藏"""
+    async def apply(db) -> bool:
+        was_favorited = await _delete_favorite(db, user_id, topic_id)
+        await db.execute(SKIP_INSERT, (topic_id, work_name, dish_name, reason, topic_type, dish_origin, user_id))
+        return was_favorited
+
+    return await get_write_batcher().run(apply)
+
+
+async def get_favorites(user_id: str = DEFAULT_USER) -> List[str]:
+    """获取用户收藏的选题ID（按收藏顺序）"""
+    async with get_db(readonly=True) as db:
+        cursor = await db.execute("SELECT topic_id FROM favorites WHERE user_id = ? ORDER BY rowid", (user_id,))
         rows = await cursor.fetchall()
         return [r[0] for r in rows]
 
 
-async def is_favorited(topic_id: str) -> bool:
+async def is_favorited(topic_id: str, user_id: str = DEFAULT_USER) -> bool:
     """检查选题是否已收藏"""
-    async with get_db() as db:
+    async with get_db(readonly=True) as db:
         cursor = await db.execute(
-            "SELECT topic_id FROM favorites WHERE topic_id = ?",
-            (topic_id,)
+            "SELECT topic_id FROM favorites WHERE user_id = ? AND topic_id = ?",
+            (user_id, topic_id)
         )
         row = await cursor.fetchone()
         return row is not None
@@ -228,46 +987,305 @@ async def is_favorited(topic_id: str) -> bool:
 
 # ============ 跳过/偏好学习功能 ============
 
-async def skip_topic(topic_id: str, work_name: str, dish_name: str, reason: str) -> bool:
+SKIP_INSERT = """
+    INSERT INTO skipped_topics (topic_id, work_name, dish_name, skip_reason, topic_type, dish_origin, user_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+async def skip_topic(
+    topic_id: str,
+    work_name: str,
+    dish_name: str,
+    reason: str,
+    topic_type: Optional[str] = None,
+    dish_origin: Optional[str] = None,
+    user_id: str = DEFAULT_USER
+) -> bool:
     """
-    跳过一个选题并记录原因
+    跳过一个选题并记录原因（跳过统计由触发器在同一事务里更新）
     reason: 'not_interested' | 'not_suitable' | 'too_simple' | 'done'
     """
+    await get_write_batcher().execute(
+        SKIP_INSERT,
+        (topic_id, work_name, dish_name, reason, topic_type, dish_origin, user_id)
+    )
+    return True
+
+
+async def get_skipped_topics(user_id: str = DEFAULT_USER) -> Set[str]:
+    """获取用户跳过的选题ID"""
+    async with get_db(readonly=True) as db:
+        cursor = await db.execute("SELECT DISTINCT topic_id FROM skipped_topics WHERE user_id = ?", (user_id,))
+        rows = await cursor.fetchall()
+        return {r[0] for r in rows}
+
+
+async def get_skip_stats(top: int = 10, weeks: int = 12, user_id: str = DEFAULT_USER) -> dict:
+    """获取用户的跳过统计，用于偏好分析（读 skip_stats 聚合表，不扫描跳过记录）"""
+    async with get_db(readonly=True) as db:
+        async def top_of(dimension: str) -> Dict[str, int]:
+            cursor = await db.execute(
+                "SELECT key, count FROM skip_stats WHERE user_id = ? AND dimension = ? ORDER BY count DESC LIMIT ?",
+                (user_id, dimension, top)
+            )
+            return {r[0]: r[1] for r in await cursor.fetchall()}
+
+        # 原因和类型只有几种，全部返回
+        cursor = await db.execute(
+            """SELECT dimension, key, count FROM skip_stats
+               WHERE user_id = ? AND dimension IN ('total', 'reason', 'topic_type')""",
+            (user_id,)
+        )
+        groups: Dict[str, Dict[str, int]] = {"total": {}, "reason": {}, "topic_type": {}}
+        for dimension, key, count in await cursor.fetchall():
+            groups[dimension][key] = count
+
+        # 最近几周（key 按时间排序）
+        cursor = await db.execute(
+            "SELECT key, count FROM skip_stats WHERE user_id = ? AND dimension = 'week' ORDER BY key DESC LIMIT ?",
+            (user_id, weeks)
+        )
+        by_week = {r[0]: r[1] for r in reversed(await cursor.fetchall())}
+
+        return {
+            "by_reason": groups["reason"],
+            # 按作品统计（可能揭示不喜欢的类型）
+            "by_work": await top_of("work"),
+            "by_topic_type": groups["topic_type"],
+            "by_dish_origin": await top_of("dish_origin"),
+            "by_week": by_week,
+            "total": groups["total"].get("", 0)
+        }
+
+
+async def _rebuild_skip_stats(db) -> int:
+    """从 skipped_topics 全量重算 skip_stats（所有用户），返回跳过记录数"""
+    await db.execute("DELETE FROM skip_stats")
+    await db.execute("""
+        INSERT INTO skip_stats (user_id, dimension, key, count)
+        SELECT user_id, dimension, key, COUNT(*) FROM (
+            SELECT user_id, 'total' AS dimension, '' AS key FROM skipped_topics
+            UNION ALL SELECT user_id, 'reason', skip_reason FROM skipped_topics
+            UNION ALL SELECT user_id, 'work', work_name FROM skipped_topics
+            UNION ALL SELECT user_id, 'topic_type', topic_type FROM skipped_topics
+            UNION ALL SELECT user_id, 'dish_origin', dish_origin FROM skipped_topics
+            UNION ALL SELECT user_id, 'week', strftime('%Y-W%W', created_at) FROM skipped_topics
+        )
+        WHERE key IS NOT NULL
+        GROUP BY user_id, dimension, key
+    """)
+    cursor = await db.execute("SELECT COALESCE(SUM(count), 0) FROM skip_stats WHERE dimension = 'total'")
+    return (await cursor.fetchone())[0]
+
+
+async def backfill_skipped_topics(info: Dict[str, Tuple[Optional[str], Optional[str]]]) -> int:
+    """
+    为缺少类型/菜品起源的旧跳过记录补全字段（不更新统计，补完后需要重建）
+
+    Args:
+        info: 选题ID → (topic_type, dish_origin)，查不到的选题再从 topics 表补
+    """
+    async def backfill(db) -> int:
+        cursor = await db.executemany(
+            """UPDATE skipped_topics
+               SET topic_type = COALESCE(topic_type, ?), dish_origin = COALESCE(dish_origin, ?)
+               WHERE topic_id = ? AND (topic_type IS NULL OR dish_origin IS NULL)""",
+            [(topic_type, dish_origin, topic_id) for topic_id, (topic_type, dish_origin) in info.items()]
+        )
+        updated = cursor.rowcount
+        cursor = await db.execute("""
+            UPDATE skipped_topics
+            SET topic_type = COALESCE(skipped_topics.topic_type, t.topic_type),
+                dish_origin = COALESCE(skipped_topics.dish_origin, json_extract(t.data, '$.dish_origin'))
+            FROM topics AS t
+            WHERE t.id = skipped_topics.topic_id
+              AND (skipped_topics.topic_type IS NULL OR skipped_topics.dish_origin IS NULL)
+        """)
+        return updated + cursor.rowcount
+
+    return await get_write_batcher().run(backfill)
+
+
+async def rebuild_skip_stats() -> int:
+    """全量重建跳过统计（回填或修复用），返回跳过记录数"""
+    return await get_write_batcher().run(_rebuild_skip_stats)
+
+
+# ============ 后台任务 ============
+
+async def save_job(job_id: str, kind: str, status: str, data: dict):
+    """保存任务快照（新建或覆盖）"""
+    await get_write_batcher().execute(
+        """INSERT INTO jobs (id, kind, status, data) VALUES (?, ?, ?, ?)
+           ON CONFLICT(id) DO UPDATE SET
+               status = excluded.status,
+               data = excluded.data,
+               updated_at = CURRENT_TIMESTAMP""",
+        (job_id, kind, status, json.dumps(data, ensure_ascii=False))
+    )
+
+
+async def get_job(job_id: str) -> Optional[dict]:
+    """获取任务快照"""
+    async with get_db(readonly=True) as db:
+        cursor = await db.execute("SELECT data FROM jobs WHERE id = ?", (job_id,))
+        row = await cursor.fetchone()
+        return json.loads(row[0]) if row else None
+
+
+def _job_user_filter(user_id: Optional[str]) -> Tuple[str, list]:
+    """任务可见性筛选条件：不含其他用户的任务（params.user_id 不同；None 表示不筛选）"""
+    if user_id is None:
+        return "", []
+    return " AND COALESCE(json_extract(data, '$.params.user_id'), ?) = ?", [user_id, user_id]
+
+
+async def list_jobs(limit: int = 20, user_id: Optional[str] = None) -> List[dict]:
+    """最近的任务（新的在前）；指定 user_id 时不含其他用户的任务"""
+    where, params = _job_user_filter(user_id)
+    async with get_db(readonly=True) as db:
+        cursor = await db.execute(
+            f"SELECT data FROM jobs WHERE 1 = 1{where} ORDER BY created_at DESC, rowid DESC LIMIT ?",
+            (*params, limit)
+        )
+        return [json.loads(r[0]) for r in await cursor.fetchall()]
+
+
+def _kind_filter(kinds: Optional[List[str]]) -> Tuple[str, list]:
+    """任务类型筛选条件（None 表示不筛选）"""
+    if kinds is None:
+        return "", []
+    return f" AND kind IN ({', '.join('?' * len(kinds))})", list(kinds)
+
+
+async def get_running_jobs(kinds: Optional[List[str]] = None) -> List[dict]:
+    """所有 worker 上未完成的任务"""
+    where, params = _kind_filter(kinds)
+    async with get_db(readonly=True) as db:
+        cursor = await db.execute(
+            f"SELECT data FROM jobs WHERE status IN ('pending', 'running'){where} ORDER BY created_at",
+            params
+        )
+        return [json.loads(r[0]) for r in await cursor.fetchall()]
+
+
+async def get_last_finished_job(
+    kinds: Optional[List[str]] = None,
+    status: Optional[str] = None,
+    user_id: Optional[str] = None
+) -> Optional[dict]:
+    """最近结束的任务（可限定结束状态，如 succeeded；指定 user_id 时不含其他用户的任务）"""
+    where, params = _kind_filter(kinds)
+    if status:
+        where += " AND status = ?"
+        params = [*params, status]
+    user_where, user_params = _job_user_filter(user_id)
+    where += user_where
+    params = [*params, *user_params]
+    # updated_at 只精确到秒，同一秒结束的任务按快照里的结束时间排序
+    async with get_db(readonly=True) as db:
+        cursor = await db.execute(
+            f"""SELECT data FROM jobs WHERE status NOT IN ('pending', 'running'){where}
+                ORDER BY updated_at DESC, json_extract(data, '$.finished_at') DESC, rowid DESC LIMIT 1""",
+            params
+        )
+        row = await cursor.fetchone()
+        return json.loads(row[0]) if row else None
+
+
+async def fail_interrupted_jobs(reason: str, now: float) -> int:
+    """
+    把未完成、且没有存活租约的任务标记为失败（worker 启动时调用），返回数量
+
+    其他 worker 正在运行的任务持有未过期的租约（任务快照里的 lease，
+    旧任务没有记录时为 job:<kind>），不受影响。
+    """
     async with get_db() as db:
-        await db.execute(
-            """INSERT INTO skipped_topics (topic_id, work_name, dish_name, skip_reason)
-               VALUES (?, ?, ?, ?)""",
-            (topic_id, work_name, dish_name, reason)
+        cursor = await db.execute(
+            """SELECT id, data FROM jobs
+               WHERE status IN ('pending', 'running')
+                 AND NOT EXISTS (
+                     SELECT 1 FROM leases
+                     WHERE leases.name = COALESCE(json_extract(jobs.data, '$.lease'), 'job:' || jobs.kind)
+                       AND leases.expires_at > ?
+                 )""",
+            (now,)
         )
+        rows = await cursor.fetchall()
+        for job_id, raw in rows:
+            data = json.loads(raw)
+            data["status"] = "failed"
+            data["error"] = reason
+            await db.execute(
+                "UPDATE jobs SET status = 'failed', data = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                (json.dumps(data, ensure_ascii=False), job_id)
+            )
         await db.commit()
-        return True
+        return len(rows)
+
+
+# ============ 跨 worker 协调 ============
 
+async def acquire_lease(name: str, owner: str, ttl: float, now: float, data: dict = None) -> bool:
+    """
+    获取或续期租约（原子操作），成功返回 True
 
-async def get_skipped_topics() -> Set[str]:
-    """获取所有被跳过的选题ID"""
+    租约不存在、已过期或本来就属于 owner 时成功；否则被其他 worker 持有。
+    """
     async with get_db() as db:
-        cursor = await db.execute("SELECT DISTINCT topic_id FROM skipped_topics")
-        rows = await cursor.fetchall()
-        return {r[0] for r in rows}
+        cursor = await db.execute(
+            """INSERT INTO leases (name, owner, expires_at, data) VALUES (?, ?, ?, ?)
+               ON CONFLICT(name) DO UPDATE SET
+                   owner = excluded.owner,
+                   expires_at = excluded.expires_at,
+                   data = COALESCE(excluded.data, leases.data)
+               WHERE leases.owner = excluded.owner OR leases.expires_at <= ?""",
+            (name, owner, now + ttl, json.dumps(data, ensure_ascii=False) if data is not None else None, now)
+        )
+        await db.commit()
+        return cursor.rowcount > 0
 
 
-async def get_skip_stats() -> dict:
-    """获取跳过统计，用于偏好分析"""
+async def release_lease(name: str, owner: str):
+    """释放租约（只释放自己持有的）"""
     async with get_db() as db:
-        # 按原因统计
+        await db.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+        await db.commit()
+
+
+async def get_lease(name: str, now: float) -> Optional[dict]:
+    """未过期的租约信息"""
+    async with get_db(readonly=True) as db:
         cursor = await db.execute(
-            "SELECT skip_reason, COUNT(*) FROM skipped_topics GROUP BY skip_reason"
+            "SELECT owner, expires_at, data FROM leases WHERE name = ? AND expires_at > ?",
+            (name, now)
         )
-        by_reason = {r[0]: r[1] for r in await cursor.fetchall()}
+        row = await cursor.fetchone()
+        if row is None:
+            return None
+        return {"owner": row[0], "expires_at": row[1], "data": json.loads(row[2]) if row[2] else None}
 
-        # 按作品统计（可能揭示不喜欢的类型）
+
+async def bump_signal(name: str) -> int:
+    """递增失效信号版本号，返回新版本（和触发它的写操作一起攒批提交）"""
+    async def bump(db) -> int:
         cursor = await db.execute(
-            "SELECT work_name, COUNT(*) FROM skipped_topics GROUP BY work_name ORDER BY COUNT(*) DESC LIMIT 10"
+            """INSERT INTO signals (name, version) VALUES (?, 1)
+               ON CONFLICT(name) DO UPDATE SET
+                   version = signals.version + 1,
+                   updated_at = CURRENT_TIMESTAMP
+               RETURNING version""",
+            (name,)
         )
-        by_work = {r[0]: r[1] for r in await cursor.fetchall()}
+        row = await cursor.fetchone()
+        return row[0]
 
-        return {
-            "by_reason": by_reason,
-            "by_work": by_work,
-            "total": sum(by_reason.values()) if by_reason else 0
-        }
+    return await get_write_batcher().run(bump)
+
+
+async def get_signals() -> dict:
+    """全部失效信号的当前版本"""
+    async with get_db(readonly=True) as db:
+        cursor = await db.execute("SELECT name, version FROM signals")
+        return {r[0]: r[1] for r in await cursor.fetchall()}
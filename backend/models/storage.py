@@ -0,0 +1,265 @@
+"""
+存储接口 - 选题、已做/跳过/收藏、发现记录、任务、跨节点协调
+
+业务代码通过 get_storage() 访问持久化状态，不直接依赖具体数据库：
+- sqlite（默认）：本地文件，database.py 的实现（读写分离连接池 + 写合并）
+- postgres：asyncpg 连接池，多个 API 节点共享同一份状态（见 postgres.py）
+
+已做/收藏/跳过记录和跳过统计按 user_id 分区（默认 DEFAULT_USER）。
+由 settings.STORAGE_BACKEND 选择。只适用于 SQLite 的运维工具（在线备份、
+scripts/ 下的基准和重建脚本）仍然直接使用 database.py。
+"""
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from ..config import settings
+from .topic import TopicCandidate
+from . import database
+from .database import DEFAULT_USER
+
+
+class Storage(ABC):
+    """持久化状态的存储接口"""
+
+    # 后端名（sqlite / postgres）
+    name: str = ""
+
+    # ---- 生命周期 ----
+
+    @abstractmethod
+    async def init(self):
+        """建表 + 迁移（多个进程同时调用时只执行一次）"""
+
+    @abstractmethod
+    async def close(self):
+        """关闭连接（会先提交还在排队的写操作）"""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        """连接池统计（/api/health）"""
+
+    # ---- 选题 / 发现记录 ----
+
+    @abstractmethod
+    async def save_topics(self, topics: List[TopicCandidate], run_id: Optional[int] = None) -> Dict[str, int]:
+        """按内容哈希写入有变化的选题，返回 {"inserted", "updated", "unchanged"}"""
+
+    @abstractmethod
+    async def get_latest_topics(
+        self,
+        limit: int = 20,
+        topic_type: Optional[str] = None,
+        difficulty: Optional[str] = None,
+        order_by: str = "recent",
+        status: str = "pending"
+    ) -> List[TopicCandidate]:
+        """最新（或得分最高）的选题"""
+
+    @abstractmethod
+    async def get_topic(self, topic_id: str) -> Optional[TopicCandidate]:
+        """按 ID 获取发现的选题（不存在时返回 None）"""
+
+    @abstractmethod
+    async def create_discovery_run(self) -> int:
+        """创建一次发现记录，返回 ID"""
+
+    @abstractmethod
+    async def update_discovery_run(self, run_id: int, topics_found: int):
+        """更新发现记录的选题数"""
+
+    # ---- 已做 / 收藏 / 跳过 ----
+
+    @abstractmethod
+    async def get_done_topics(self, user_id: str = DEFAULT_USER) -> Set[str]:
+        """已做过的选题（作品·菜品）"""
+
+    @abstractmethod
+    async def mark_topic_done(self, work_name: str, dish_name: str, user_id: str = DEFAULT_USER):
+        """标记已做"""
+
+    @abstractmethod
+    async def toggle_favorite(self, topic_id: str, user_id: str = DEFAULT_USER) -> bool:
+        """切换收藏（原子），返回新状态"""
+
+    @abstractmethod
+    async def update_favorites(
+        self,
+        add: List[str],
+        remove: List[str],
+        user_id: str = DEFAULT_USER
+    ) -> Tuple[List[str], List[str]]:
+        """批量收藏/取消收藏（一个事务），返回 (实际新增, 实际移除)"""
+
+    @abstractmethod
+    async def get_favorites(self, user_id: str = DEFAULT_USER) -> List[str]:
+        """收藏的选题 ID（按收藏顺序）"""
+
+    @abstractmethod
+    async def skip_topic(
+        self,
+        topic_id: str,
+        work_name: str,
+        dish_name: str,
+        reason: str,
+        topic_type: Optional[str] = None,
+        dish_origin: Optional[str] = None,
+        user_id: str = DEFAULT_USER
+    ) -> bool:
+        """记录跳过（跳过统计在同一事务里更新）"""
+
+    @abstractmethod
+    async def unfavorite_and_skip(
+        self,
+        topic_id: str,
+        work_name: str,
+        dish_name: str,
+        reason: str,
+        topic_type: Optional[str] = None,
+        dish_origin: Optional[str] = None,
+        user_id: str = DEFAULT_USER
+    ) -> bool:
+        """取消收藏并记录跳过（一个事务），返回原来是否已收藏"""
+
+    @abstractmethod
+    async def get_skipped_topics(self, user_id: str = DEFAULT_USER) -> Set[str]:
+        """被跳过的选题 ID"""
+
+    @abstractmethod
+    async def get_skip_stats(self, top: int = 10, weeks: int = 12, user_id: str = DEFAULT_USER) -> Dict[str, Any]:
+        """跳过统计（读聚合表）"""
+
+    # ---- 后台任务 ----
+
+    @abstractmethod
+    async def save_job(self, job_id: str, kind: str, status: str, data: dict):
+        """保存任务快照（新建或覆盖）"""
+
+    @abstractmethod
+    async def get_job(self, job_id: str) -> Optional[dict]:
+        """任务快照"""
+
+    @abstractmethod
+    async def list_jobs(self, limit: int = 20, user_id: Optional[str] = None) -> List[dict]:
+        """最近的任务（新的在前），指定 user_id 时不含其他用户的任务"""
+
+    @abstractmethod
+    async def get_running_jobs(self, kinds: Optional[List[str]] = None) -> List[dict]:
+        """所有节点上未完成的任务"""
+
+    @abstractmethod
+    async def get_last_finished_job(
+        self,
+        kinds: Optional[List[str]] = None,
+        status: Optional[str] = None,
+        user_id: Optional[str] = None
+    ) -> Optional[dict]:
+        """最近结束的任务（可限定结束状态，如 succeeded；指定 user_id 时不含其他用户的任务）"""
+
+    @abstractmethod
+    async def fail_interrupted_jobs(self, reason: str, now: float) -> int:
+        """把没有存活租约的未完成任务标记为失败，返回数量"""
+
+    # ---- 跨节点协调（租约 / 失效信号） ----
+
+    @abstractmethod
+    async def acquire_lease(self, name: str, owner: str, ttl: float, now: float, data: dict = None) -> bool:
+        """获取或续期租约（原子）"""
+
+    @abstractmethod
+    async def release_lease(self, name: str, owner: str):
+        """释放自己持有的租约"""
+
+    @abstractmethod
+    async def get_lease(self, name: str, now: float) -> Optional[dict]:
+        """未过期的租约信息"""
+
+    @abstractmethod
+    async def bump_signal(self, name: str) -> int:
+        """递增失效信号版本号，返回新版本"""
+
+    @abstractmethod
+    async def get_signals(self) -> Dict[str, int]:
+        """全部失效信号的当前版本"""
+
+    # ---- 保留策略 / 归档 / 整理 ----
+
+    @abstractmethod
+    async def get_runs_to_archive(self, keep: int) -> List[int]:
+        """最新 keep 次以外的发现记录 ID"""
+
+    @abstractmethod
+    async def archive_run(self, run_id: int) -> int:
+        """归档一次发现的选题，返回归档数"""
+
+    @abstractmethod
+    async def get_archived_topics(self, run_id: int) -> List[TopicCandidate]:
+        """读取归档的选题"""
+
+    @abstractmethod
+    async def compact(self) -> Dict[str, Any]:
+        """回收空间，返回整理结果"""
+
+
+class SQLiteStorage(Storage):
+    """本地 SQLite 文件（database.py）"""
+
+    name = "sqlite"
+
+    init = staticmethod(database.init_db)
+    close = staticmethod(database.close_db)
+    stats = staticmethod(database.get_db_stats)
+
+    save_topics = staticmethod(database.save_topics)
+    get_latest_topics = staticmethod(database.get_latest_topics)
+    get_topic = staticmethod(database.get_topic)
+    create_discovery_run = staticmethod(database.create_discovery_run)
+    update_discovery_run = staticmethod(database.update_discovery_run)
+
+    get_done_topics = staticmethod(database.get_done_topics)
+    mark_topic_done = staticmethod(database.mark_topic_done)
+    toggle_favorite = staticmethod(database.toggle_favorite)
+    update_favorites = staticmethod(database.update_favorites)
+    get_favorites = staticmethod(database.get_favorites)
+    skip_topic = staticmethod(database.skip_topic)
+    unfavorite_and_skip = staticmethod(database.unfavorite_and_skip)
+    get_skipped_topics = staticmethod(database.get_skipped_topics)
+    get_skip_stats = staticmethod(database.get_skip_stats)
+
+    save_job = staticmethod(database.save_job)
+    get_job = staticmethod(database.get_job)
+    list_jobs = staticmethod(database.list_jobs)
+    get_running_jobs = staticmethod(database.get_running_jobs)
+    get_last_finished_job = staticmethod(database.get_last_finished_job)
+    fail_interrupted_jobs = staticmethod(database.fail_interrupted_jobs)
+
+    acquire_lease = staticmethod(database.acquire_lease)
+    release_lease = staticmethod(database.release_lease)
+    get_lease = staticmethod(database.get_lease)
+    bump_signal = staticmethod(database.bump_signal)
+    get_signals = staticmethod(database.get_signals)
+
+    get_runs_to_archive = staticmethod(database.get_runs_to_archive)
+    archive_run = staticmethod(database.archive_run)
+    get_archived_topics = staticmethod(database.get_archived_topics)
+    compact = staticmethod(database.compact_db)
+
+
+STORAGE_BACKENDS = ("sqlite", "postgres")
+
+_storage: Optional[Storage] = None
+
+
+def get_storage() -> Storage:
+    """获取存储单例（settings.STORAGE_BACKEND）"""
+    global _storage
+    if _storage is None:
+        backend = settings.STORAGE_BACKEND
+        if backend == "sqlite":
+            _storage = SQLiteStorage()
+        elif backend == "postgres":
+            # asyncpg 是可选依赖，按需导入
+            from .postgres import PostgresStorage
+            _storage = PostgresStorage(settings.DATABASE_URL)
+        else:
+            raise ValueError(f"未知存储后端: {backend}（可选: {', '.join(STORAGE_BACKENDS)}）")
+    return _storage
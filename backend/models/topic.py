@@ -2,6 +2,8 @@ from pydantic import BaseModel
 from typing import Optional, List
 from datetime import datetime
 from enum import Enum
+import hashlib
+import unicodedata
 
 
 class TopicType(str, Enum):
@@ -18,6 +20,26 @@ class CookingDifficulty(str, Enum):
     BEYOND = "超出能力"
 
 
+def normalize_key(text: str) -> str:
+    """归一化作品名/菜名：全半角统一、忽略大小写、去掉空白和标点（《》·、空格等）"""
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    return "".join(ch for ch in text if ch.isalnum())
+
+
+# 不计入内容哈希的字段（每次发现都会变）
+VOLATILE_FIELDS = {"id", "discovered_at"}
+
+
+def make_topic_id(work_name: str, dish: str, topic_type: str = "movie_food") -> str:
+    """
+    由内容确定的选题 ID（归一化的作品名 + 菜品 + 类型）
+
+    同一部作品的同一道菜在不同次发现中得到相同 ID，收藏/跳过记录可以继续匹配。
+    """
+    key = "|".join((str(topic_type), normalize_key(work_name), normalize_key(dish)))
+    return f"{topic_type}-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}"
+
+
 class StoryAngle(BaseModel):
     """故事切入点"""
     angle_type: str  # 菜品历史、演员幕后、剧情解读、其他
@@ -90,6 +112,11 @@ class TopicCandidate(BaseModel):
     discovered_at: datetime = datetime.now()
     source: str  # 发现来源
 
+    def content_hash(self) -> str:
+        """内容哈希：除 ID 和发现时间外的字段都相同时不变"""
+        data = self.model_dump_json(exclude=VOLATILE_FIELDS)
+        return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
     def total_score(self) -> int:
         """综合评分"""
         score = 0
@@ -8,6 +8,10 @@ from typing import Optional, Dict, Any
 logger = logging.getLogger(__name__)
 
 
+class TMDBError(Exception):
+    """TMDB 请求失败（网络异常、限流、非 200），区别于查不到（返回 None）"""
+
+
 class TMDBClient:
     """TMDB API 客户端"""
 
@@ -35,13 +39,22 @@ class TMDBClient:
         if self._session and not self._session.closed:
             await self._session.close()
 
-    async def search_movie(self, title: str, year: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    async def search_movie(
+        self,
+        title: str,
+        year: Optional[int] = None,
+        raise_errors: bool = False
+    ) -> Optional[Dict[str, Any]]:
         """
         搜索电影，返回最匹配的结果
 
         Args:
             title: 电影标题（中文或英文）
             year: 上映年份（可选，提高匹配准确度）
+            raise_errors: 请求失败时抛出 TMDBError（默认返回 None，与查不到相同）
+
+        Raises:
+            TMDBError: raise_errors=True 且请求失败
         """
         session = await self._get_session()
 
@@ -58,8 +71,7 @@ class TMDBClient:
         try:
             async with session.get(f"{self.BASE_URL}/search/movie", params=params) as resp:
                 if resp.status != 200:
-                    logger.warning(f"TMDB 搜索失败: {title}, 状态码: {resp.status}")
-                    return None
+                    raise TMDBError(f"状态码: {resp.status}")
 
                 data = await resp.json()
                 results = data.get("results", [])
@@ -69,9 +81,10 @@ class TMDBClient:
                     if year:
                         params.pop("year")
                         async with session.get(f"{self.BASE_URL}/search/movie", params=params) as retry_resp:
-                            if retry_resp.status == 200:
-                                retry_data = await retry_resp.json()
-                                results = retry_data.get("results", [])
+                            if retry_resp.status != 200:
+                                raise TMDBError(f"状态码: {retry_resp.status}")
+                            retry_data = await retry_resp.json()
+                            results = retry_data.get("results", [])
 
                 if results:
                     # 返回第一个结果
@@ -80,8 +93,15 @@ class TMDBClient:
                 logger.info(f"TMDB 未找到电影: {title}")
                 return None
 
+        except TMDBError as e:
+            logger.warning(f"TMDB 搜索失败: {title}, {e}")
+            if raise_errors:
+                raise
+            return None
         except Exception as e:
             logger.error(f"TMDB 搜索异常: {title}, 错误: {e}")
+            if raise_errors:
+                raise TMDBError(str(e) or e.__class__.__name__) from e
             return None
 
     def get_poster_url(self, poster_path: Optional[str], size: str = "large") -> Optional[str]:
@@ -116,7 +136,8 @@ class TMDBClient:
         self,
         title: str,
         year: Optional[int] = None,
-        english_name: Optional[str] = None
+        english_name: Optional[str] = None,
+        raise_errors: bool = False
     ) -> Optional[str]:
         """
         便捷方法：直接获取电影海报 URL
@@ -125,18 +146,19 @@ class TMDBClient:
             title: 电影标题（中文）
             year: 上映年份
             english_name: 英文名（优先使用）
+            raise_errors: 请求失败时抛出 TMDBError，None 只表示查不到
 
         Returns:
             海报 URL 或 None
         """
         # 优先用英文名搜索（TMDB 对英文名匹配更准确）
         if english_name:
-            movie = await self.search_movie(english_name, year)
+            movie = await self.search_movie(english_name, year, raise_errors)
             if movie and movie.get("poster_path"):
                 return self.get_poster_url(movie["poster_path"])
 
         # 回退到中文名搜索
-        movie = await self.search_movie(title, year)
+        movie = await self.search_movie(title, year, raise_errors)
         if movie and movie.get("poster_path"):
             return self.get_poster_url(movie["poster_path"])
         return None
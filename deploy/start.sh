@@ -4,6 +4,9 @@ set -e
 # 设置默认端口
 export PORT=${PORT:-8080}
 
+# uvicorn worker 数（默认 CPU 核数；跨 worker 的锁/状态/限流都走共享 SQLite）
+export WORKERS=${WORKERS:-$(nproc)}
+
 # 用环境变量替换 nginx 配置中的端口（直接覆盖主配置）
 envsubst '${PORT}' < /etc/nginx/nginx.conf.template > /etc/nginx/nginx.conf
 
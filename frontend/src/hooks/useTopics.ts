@@ -174,13 +174,9 @@ export function useTopics() {
     }
   }, [fetchDiscoveryTopics])
 
-  // 从收藏池移除并跳过
+  // 从收藏池移除并跳过（取消收藏和跳过在后端同一事务里完成）
   const skipFavoriteTopic = useCallback(async (topic: TopicCandidate, reason: SkipReason) => {
     try {
-      // 先取消收藏
-      await fetch(`/api/topics/${topic.id}/favorite`, { method: 'POST' })
-
-      // 再标记跳过
       const res = await fetch('/api/topics/skip', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
@@ -188,7 +184,8 @@ export function useTopics() {
           topic_id: topic.id,
           work_name: topic.work_name,
           dish_name: topic.recommended_dish,
-          reason
+          reason,
+          unfavorite: true
         })
       })
       if (!res.ok) throw new Error('操作失败')
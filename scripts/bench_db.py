@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+数据库基准 - 用同一组操作序列对比各个 SQLite 性能档位
+
+操作序列模拟真实使用：读选题/收藏/跳过列表、跳过、收藏切换、发现结果保存。
+每个档位使用一个全新的临时数据库，C 个并发客户端按顺序消费同一份序列，
+报告吞吐量和 p50/p99 延迟（总体、读、写）。
+
+用法：
+    python scripts/bench_db.py                         # 生成默认序列，测全部档位
+    python scripts/bench_db.py --ops 5000 --clients 16
+    python scripts/bench_db.py --record mix.jsonl      # 保存生成的序列
+    python scripts/bench_db.py --workload mix.jsonl    # 回放保存的序列
+    python scripts/bench_db.py --profiles balanced fast
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.models import database as db
+from backend.models.topic import TopicCandidate
+
+# 默认操作比例（读多写少）
+DEFAULT_MIX = {
+    "read_latest": 30,
+    "read_favorites": 15,
+    "read_skipped": 15,
+    "read_skip_stats": 10,
+    "skip": 15,
+    "favorite": 10,
+    "save_topics": 5,
+}
+
+READ_OPS = {op for op in DEFAULT_MIX if op.startswith("read_")}
+
+# 每次发现保存的选题数
+SAVE_BATCH = 10
+
+
+def make_topic(n: int) -> TopicCandidate:
+    return TopicCandidate(
+        id=f"bench-{n}",
+        work_name=f"作品{n % 500}",
+        work_type="电影",
+        douban_score=7.5 + (n % 20) / 10,
+        food_scene_description="场景描述" * 10,
+        recommended_dish=f"菜品{n % 37}",
+        story_angles=[],
+        footage_sources=["原片截图"],
+        footage_available=True,
+        cooking_difficulty="中等",
+        is_interesting=n % 2 == 0,
+        is_discussable=n % 3 == 0,
+        has_momentum=False,
+        source="基准测试"
+    )
+
+
+def generate_workload(count: int, seed: int) -> List[Dict]:
+    rng = random.Random(seed)
+    ops, weights = zip(*DEFAULT_MIX.items())
+    workload = []
+    for i in range(count):
+        op = rng.choices(ops, weights)[0]
+        workload.append({"op": op, "id": f"bench-{rng.randrange(200)}", "seq": i})
+    return workload
+
+
+async def run_op(item: Dict):
+    op = item["op"]
+    if op == "read_latest":
+        await db.get_latest_topics(20)
+    elif op == "read_favorites":
+        await db.get_favorites()
+    elif op == "read_skipped":
+        await db.get_skipped_topics()
+    elif op == "read_skip_stats":
+        await db.get_skip_stats()
+    elif op == "skip":
+        await db.skip_topic(item["id"], "作品", "菜品", "not_interested")
+    elif op == "favorite":
+        await db.toggle_favorite(item["id"])
+    elif op == "save_topics":
+        base = item["seq"] * SAVE_BATCH
+        await db.save_topics([make_topic(base + i) for i in range(SAVE_BATCH)])
+    else:
+        raise ValueError(f"未知操作: {op}")
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+async def bench_profile(profile: str, workload: List[Dict], clients: int) -> Dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DatabaseManager._instance = db.DatabaseManager(profile=profile, path=Path(tmp) / "bench.db")
+        try:
+            await db.init_db()
+            await db.save_topics([make_topic(n) for n in range(200)])
+
+            latencies: Dict[str, List[float]] = {"read": [], "write": []}
+            queue = iter(workload)
+
+            async def client():
+                for item in queue:
+                    start = time.perf_counter()
+                    await run_op(item)
+                    kind = "read" if item["op"] in READ_OPS else "write"
+                    latencies[kind].append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            await asyncio.gather(*[client() for _ in range(clients)])
+            elapsed = time.perf_counter() - start
+            batches = db.get_db_stats()["batches"]
+        finally:
+            await db.close_db()
+            db.DatabaseManager._instance = None
+
+    everything = latencies["read"] + latencies["write"]
+    return {
+        "profile": profile,
+        "ops_per_sec": len(everything) / elapsed,
+        "p50": percentile(everything, 0.50),
+        "p99": percentile(everything, 0.99),
+        "read_p99": percentile(latencies["read"], 0.99),
+        "write_p99": percentile(latencies["write"], 0.99),
+        "avg_batch": batches["avg_batch"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite 档位基准")
+    parser.add_argument("--ops", type=int, default=3000, help="生成的操作数")
+    parser.add_argument("--clients", type=int, default=8, help="并发客户端数")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--profiles", nargs="+", default=list(db.DB_PROFILES), choices=list(db.DB_PROFILES))
+    parser.add_argument("--workload", type=Path, help="回放保存的操作序列（JSONL）")
+    parser.add_argument("--record", type=Path, help="把生成的操作序列保存为 JSONL")
+    args = parser.parse_args()
+
+    if args.workload:
+        workload = [json.loads(line) for line in args.workload.read_text(encoding="utf-8").splitlines() if line.strip()]
+    else:
+        workload = generate_workload(args.ops, args.seed)
+    if args.record:
+        args.record.write_text("".join(json.dumps(w, ensure_ascii=False) + "\n" for w in workload), encoding="utf-8")
+        print(f"操作序列已保存: {args.record}")
+
+    counts: Dict[str, int] = {}
+    for item in workload:
+        counts[item["op"]] = counts.get(item["op"], 0) + 1
+    print(f"操作数: {len(workload)}，并发: {args.clients}，构成: {counts}")
+    print(f"{'档位':<10}{'吞吐(ops/s)':>14}{'p50(ms)':>10}{'p99(ms)':>10}{'读p99':>10}{'写p99':>10}{'平均批大小':>12}")
+    for profile in args.profiles:
+        r = asyncio.run(bench_profile(profile, workload, args.clients))
+        print(
+            f"{r['profile']:<10}{r['ops_per_sec']:>14.0f}{r['p50']:>10.2f}{r['p99']:>10.2f}"
+            f"{r['read_p99']:>10.2f}{r['write_p99']:>10.2f}{r['avg_batch']:>12.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
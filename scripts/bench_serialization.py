@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+序列化基准 - 对比 /api/topics 的两种响应编码方式
+
+1. 默认路径：复制选题 dict + 叠加字段 + FastAPI jsonable_encoder + json.dumps
+2. 预编码路径：缓存的 JSON 片段 + 叠加字段拼接（orjson）
+
+用法：python scripts/bench_serialization.py [--rounds 200]
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from fastapi.encoders import jsonable_encoder
+
+from backend.api.encoding import HAS_ORJSON, encode_ranked_topics
+from backend.core.collector import TopicCollector
+from backend.core.posters import PosterService
+from backend.core.user_state import UserStateSnapshot
+from backend.models.database import DEFAULT_USER
+
+
+class _FakeTMDB:
+    """只用于让 PosterService 认为配置了 TMDB"""
+
+
+def default_path(view, ranks, state, posters) -> bytes:
+    topics = view.materialize(ranks)
+    for topic in topics:
+        topic["is_favorited"] = state.is_favorited(topic["id"])
+        if posters.applies_to(topic):
+            topic["poster_url"] = posters.cached(topic["id"])
+    # 与 fastapi.responses.JSONResponse.render 一致
+    return json.dumps(
+        jsonable_encoder(topics),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def fragment_path(view, ranks, state, posters) -> bytes:
+    return bytes(encode_ranked_topics(view, ranks, state, posters))
+
+
+def bench(fn, rounds: int, *args) -> float:
+    fn(*args)  # 预热（片段缓存在这里填充）
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn(*args)
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="序列化基准")
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    collector = TopicCollector()
+    view = collector.ranked_view()
+    state = UserStateSnapshot(DEFAULT_USER, 1, frozenset(), frozenset(), ())
+    ranks = view.select_ranks(state)
+
+    posters = PosterService(_FakeTMDB())
+    for rank in ranks:
+        topic = view.ranked[rank]
+        if posters.applies_to(topic):
+            posters._cache[topic["id"]] = f"https://image.tmdb.org/t/p/w500/{topic['id']}.jpg"
+
+    old = default_path(view, ranks, state, posters)
+    new = fragment_path(view, ranks, state, posters)
+    assert json.loads(old) == json.loads(new), "两种编码结果不一致"
+
+    old_ms = bench(default_path, args.rounds, view, ranks, state, posters)
+    new_ms = bench(fragment_path, args.rounds, view, ranks, state, posters)
+
+    print(f"选题数: {len(ranks)}，响应体: {len(new) / 1024:.1f} KB，orjson: {'是' if HAS_ORJSON else '否'}")
+    print(f"默认路径:   {old_ms:8.3f} ms/次")
+    print(f"预编码路径: {new_ms:8.3f} ms/次")
+    print(f"加速比:     {old_ms / new_ms:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+重建跳过统计 - 回填旧跳过记录的类型/菜品起源，并全量重算 skip_stats
+
+平时统计由触发器随每次跳过增量更新；导入历史数据或怀疑统计不一致时运行。
+
+用法：python scripts/rebuild_skip_stats.py [--no-backfill]
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.core.catalog import get_catalog
+from backend.models.database import (
+    init_db,
+    close_db,
+    backfill_skipped_topics,
+    rebuild_skip_stats,
+    get_skip_stats
+)
+
+
+async def main(backfill: bool):
+    await init_db()
+    try:
+        if backfill:
+            info = {
+                topic["id"]: (topic.get("topic_type", "movie_food"), topic.get("dish_origin"))
+                for topic in get_catalog()
+            }
+            updated = await backfill_skipped_topics(info)
+            print(f"已回填 {updated} 条跳过记录")
+
+        total = await rebuild_skip_stats()
+        stats = await get_skip_stats()
+        print(f"跳过统计已重建：{total} 条跳过记录")
+        print(f"按原因: {stats['by_reason']}")
+        print(f"按类型: {stats['by_topic_type']}")
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="重建跳过统计")
+    parser.add_argument("--no-backfill", action="store_true", help="只重算统计，不回填类型/菜品起源")
+    args = parser.parse_args()
+    asyncio.run(main(not args.no_backfill))
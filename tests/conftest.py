@@ -0,0 +1,42 @@
+"""
+测试公共夹具 - 每个测试使用临时目录里的独立数据库
+
+没有依赖 pytest 异步插件：测试用 run() 在新的事件循环里执行协程，
+执行完关闭数据库连接（下一次 run() 会重新打开）。
+"""
+from typing import Any, Awaitable
+from pathlib import Path
+import asyncio
+
+import pytest
+
+from backend.models import database
+from backend.models.database import DatabaseManager, close_db
+
+
+@pytest.fixture
+def db_path(tmp_path: Path, monkeypatch) -> Path:
+    """临时数据库文件（替换 DatabaseManager 单例）"""
+    path = tmp_path / "topics.db"
+    monkeypatch.setattr(DatabaseManager, "_instance", DatabaseManager(path=path))
+    return path
+
+
+@pytest.fixture
+def run(db_path):
+    """在新的事件循环里执行协程，结束后关闭数据库连接"""
+    def _run(coro: Awaitable[Any]) -> Any:
+        async def main():
+            try:
+                return await coro
+            finally:
+                await close_db()
+        return asyncio.run(main())
+    return _run
+
+
+@pytest.fixture
+def db(run):
+    """已建表的临时数据库"""
+    run(database.init_db())
+    return run
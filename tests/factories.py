@@ -0,0 +1,25 @@
+"""测试数据"""
+from typing import Any, Dict
+
+from backend.models.topic import TopicCandidate, make_topic_id
+
+
+def make_topic(work_name: str, dish: str, **fields: Any) -> TopicCandidate:
+    """最小的合法选题（ID 默认按内容生成）"""
+    data: Dict[str, Any] = {
+        "id": make_topic_id(work_name, dish),
+        "work_name": work_name,
+        "work_type": "电影",
+        "food_scene_description": f"{work_name}里的{dish}",
+        "recommended_dish": dish,
+        "story_angles": [],
+        "footage_sources": [],
+        "footage_available": True,
+        "cooking_difficulty": "中等",
+        "is_interesting": True,
+        "is_discussable": True,
+        "has_momentum": False,
+        "source": "test",
+    }
+    data.update(fields)
+    return TopicCandidate(**data)
@@ -0,0 +1,110 @@
+"""在线备份：创建快照 -> 恢复 -> 完整性检查"""
+import gzip
+import sqlite3
+
+import pytest
+
+from backend.config import settings
+from backend.models import backup, database
+from backend.models.backup import SnapshotError, create_snapshot, restore_snapshot
+from backend.models.database import DatabaseManager
+
+from .factories import make_topic
+
+
+async def _seed():
+    await database.init_db()
+    topics = [make_topic("千与千寻", "饭团"), make_topic("小森林", "米酒")]
+    await database.save_topics(topics)
+    await database.toggle_favorite(topics[0].id, "alice")
+    await database.mark_topic_done("小森林", "米酒", "alice")
+    return topics
+
+
+async def _seed_and_snapshot(directory):
+    await _seed()
+    return await create_snapshot(directory=directory, keep=0)
+
+
+def test_snapshot_restores_to_checked_database(run, tmp_path, monkeypatch):
+    # 小步复制，覆盖分步备份的路径
+    monkeypatch.setattr(backup, "BACKUP_SLEEP", 0)
+
+    async def main():
+        topics = await _seed()
+        manifest = await create_snapshot(directory=tmp_path / "backups", pages=1, keep=0)
+        return topics, manifest
+
+    topics, manifest = run(main())
+    assert manifest["schema_version"] == database.SCHEMA_VERSION
+    assert manifest["steps"] >= 2
+    assert [s["name"] for s in backup.list_snapshots(tmp_path / "backups")] == [manifest["name"]]
+
+    path = backup.snapshot_path(manifest["name"], tmp_path / "backups")
+    target = tmp_path / "restored" / "topics.db"
+    info = restore_snapshot(path, target)
+    assert info["ok"] and info["verified"]
+    assert info["sha256"] == manifest["sha256"]
+
+    conn = sqlite3.connect(target)
+    try:
+        assert conn.execute("PRAGMA quick_check").fetchone()[0] == "ok"
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == database.SCHEMA_VERSION
+    finally:
+        conn.close()
+
+    # 恢复出的数据库可以直接作为应用数据库使用
+    monkeypatch.setattr(DatabaseManager, "_instance", DatabaseManager(path=target))
+
+    async def read_back():
+        return (
+            await database.get_topic(topics[0].id),
+            await database.get_favorites("alice"),
+            await database.get_done_topics("alice"),
+        )
+
+    topic, favorites, done = run(read_back())
+    assert topic.recommended_dish == "饭团"
+    assert favorites == [topics[0].id]
+    assert "小森林·米酒" in done
+
+
+def test_restore_rejects_bad_snapshots(run, tmp_path):
+    manifest = run(_seed_and_snapshot(tmp_path / "backups"))
+    path = backup.snapshot_path(manifest["name"], tmp_path / "backups")
+    target = tmp_path / "restored.db"
+
+    # 已存在的目标需要 force
+    target.write_bytes(b"")
+    with pytest.raises(FileExistsError):
+        restore_snapshot(path, target)
+
+    # 单独下载的快照没有清单：按参数里的校验和验证
+    loose = tmp_path / "loose" / path.name
+    loose.parent.mkdir()
+    loose.write_bytes(path.read_bytes())
+    with pytest.raises(SnapshotError):
+        restore_snapshot(loose, target, sha256="0" * 64, force=True)
+    assert target.read_bytes() == b""
+
+    # 压缩文件被截断、内容不是数据库：都不替换目标
+    data = path.read_bytes()
+    loose.write_bytes(data[:len(data) // 2])
+    with pytest.raises(SnapshotError):
+        restore_snapshot(loose, target, force=True)
+    with gzip.open(loose, "wb") as f:
+        f.write(b"not a database" * 100)
+    with pytest.raises(SnapshotError):
+        restore_snapshot(loose, target, force=True)
+    assert target.read_bytes() == b""
+    assert not list(target.parent.glob(".*.restore"))
+
+    with pytest.raises(SnapshotError):
+        backup.snapshot_path("../topics", tmp_path / "backups")
+
+
+
+def test_snapshot_refused_for_other_backends(run, monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "STORAGE_BACKEND", "postgres")
+    with pytest.raises(SnapshotError):
+        run(create_snapshot(directory=tmp_path))
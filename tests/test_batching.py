@@ -0,0 +1,86 @@
+"""写合并：同一批里一个操作失败不影响其他操作"""
+import asyncio
+import sqlite3
+
+import pytest
+
+from backend.models.batching import WriteBatcher
+from backend.models.database import DatabaseManager, get_db
+
+
+async def _setup(delay_ms=50.0):
+    manager = DatabaseManager.get_instance()
+    # 攒批时间放长，保证并发提交的操作进入同一批
+    manager.batcher = WriteBatcher(manager, delay_ms, 100)
+    async with get_db() as db:
+        await db.execute("CREATE TABLE items (name TEXT PRIMARY KEY, n INTEGER)")
+        await db.execute("INSERT INTO items VALUES ('taken', 0)")
+    return manager.batcher
+
+
+async def _names():
+    async with get_db(readonly=True) as db:
+        cursor = await db.execute("SELECT name FROM items ORDER BY name")
+        return [r[0] for r in await cursor.fetchall()]
+
+
+def test_failed_statement_is_isolated(run):
+    async def main():
+        batcher = await _setup()
+        sql = "INSERT INTO items (name, n) VALUES (?, ?)"
+        results = await asyncio.gather(
+            batcher.execute(sql, ("a", 1)),
+            batcher.execute(sql, ("taken", 2)),   # 主键冲突
+            batcher.execute(sql, ("b", 3)),
+            return_exceptions=True
+        )
+        return results, batcher.stats(), await _names()
+
+    results, stats, names = run(main())
+    assert results[0] is None and results[2] is None
+    assert isinstance(results[1], sqlite3.IntegrityError)
+    assert stats["batches"] == 1 and stats["ops"] == 3
+    assert names == ["a", "b", "taken"]
+
+
+def test_failed_custom_op_is_isolated(run):
+    async def main():
+        batcher = await _setup()
+
+        async def insert_and_fail(db):
+            await db.execute("INSERT INTO items VALUES ('partial', 0)")
+            raise RuntimeError("boom")
+
+        async def insert_returning(db):
+            cursor = await db.execute("INSERT INTO items VALUES ('c', 5) RETURNING n")
+            return (await cursor.fetchone())[0]
+
+        results = await asyncio.gather(
+            batcher.run(insert_and_fail),
+            batcher.run(insert_returning),
+            batcher.execute("UPDATE items SET n = n + 1 WHERE name = 'taken'"),
+            return_exceptions=True
+        )
+        return results, await _names()
+
+    results, names = run(main())
+    assert isinstance(results[0], RuntimeError)
+    assert results[1] == 5
+    # 失败操作写入的行随保存点回滚
+    assert names == ["c", "taken"]
+
+
+def test_close_flushes_queued_writes(run, db_path):
+    async def main():
+        batcher = await _setup(delay_ms=10_000)
+        pending = asyncio.ensure_future(batcher.execute("INSERT INTO items VALUES ('late', 1)"))
+        await asyncio.sleep(0)
+        await batcher.close()
+        await pending
+
+    run(main())
+    conn = sqlite3.connect(db_path)
+    try:
+        assert conn.execute("SELECT n FROM items WHERE name = 'late'").fetchone() == (1,)
+    finally:
+        conn.close()
@@ -0,0 +1,149 @@
+"""后台任务：失败后释放名额和租约，按用户隔离可见性"""
+import pytest
+
+from backend.core import jobs
+from backend.core.coordination import get_coordinator
+from backend.core.jobs import FAILED, FINISHED_STATUSES, SUCCEEDED, Job, JobConflictError, JobManager, visible_to
+from backend.models.storage import get_storage
+
+
+async def _ok(job):
+    return {"count": 1}
+
+
+async def _boom(job):
+    async with job.stage("失败阶段"):
+        raise RuntimeError("boom")
+
+
+async def _lease_free(manager, kind, user_id="default"):
+    name = manager._lease_name(kind, {"user_id": user_id})
+    return name not in manager._running and await get_coordinator().lease_holder(name) is None
+
+
+def test_lease_released_after_handler_failure(db):
+    async def main():
+        manager = JobManager()
+        manager.register("fail", _boom)
+        job = await manager.wait(await manager.submit("fail"))
+        free = await _lease_free(manager, "fail")
+        stored = await manager.get(job.id)
+        # 名额已让出：可以立即再次提交
+        again = await manager.wait(await manager.submit("fail"))
+        return job, free, stored, again
+
+    job, free, stored, again = db(main())
+    assert job.status == FAILED and job.error == "boom"
+    assert free
+    assert stored["status"] == FAILED and stored["stages"][0]["status"] == FAILED
+    assert again.status == FAILED
+
+
+def test_lease_released_when_final_persist_fails(db, monkeypatch):
+    persist = Job._persist
+
+    async def flaky_persist(self):
+        if self.status in FINISHED_STATUSES:
+            raise OSError("disk full")
+        await persist(self)
+
+    monkeypatch.setattr(Job, "_persist", flaky_persist)
+
+    async def main():
+        manager = JobManager()
+        manager.register("ok", _ok)
+        job = await manager.wait(await manager.submit("ok"))
+        return job, await _lease_free(manager, "ok"), manager.live(job.id)
+
+    job, free, live = db(main())
+    assert job.status == SUCCEEDED
+    assert free
+    assert live is None
+
+
+def test_lease_released_when_submit_persist_fails(db, monkeypatch):
+    async def broken_persist(self):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(Job, "_persist", broken_persist)
+
+    async def main():
+        manager = JobManager()
+        manager.register("ok", _ok)
+        with pytest.raises(OSError):
+            await manager.submit("ok")
+        return await _lease_free(manager, "ok"), manager._leases
+
+    free, leases = db(main())
+    assert free
+    assert leases == {}
+
+
+def test_conflicting_submit_is_rejected(db):
+    async def main():
+        manager = JobManager()
+        gate = jobs.asyncio.Event()
+
+        async def blocked(job):
+            await gate.wait()
+
+        manager.register("slow", blocked)
+        first = await manager.submit("slow")
+        with pytest.raises(JobConflictError) as info:
+            await manager.submit("slow")
+        gate.set()
+        await manager.wait(first)
+        return first, info.value
+
+    first, error = db(main())
+    assert error.job_id == first.id
+    assert first.status == SUCCEEDED
+
+
+def test_jobs_visible_only_to_owner(db):
+    async def main():
+        manager = JobManager()
+        gate = jobs.asyncio.Event()
+
+        async def collect(job):
+            await gate.wait()
+            return {"count": len(job.params["user_id"])}
+
+        manager.register("collect", collect, per_user=True)
+        manager.register("discover", _ok)
+
+        # 按用户互斥：不同用户的 collect 可以同时运行
+        alice = await manager.submit("collect", {"user_id": "alice"})
+        bob = await manager.submit("collect", {"user_id": "bob"})
+        assert manager.running("collect", "alice") is alice
+        assert manager.running("collect", "bob") is bob
+        with pytest.raises(JobConflictError):
+            await manager.submit("collect", {"user_id": "alice"})
+        shared = await manager.wait(await manager.submit("discover"))
+        gate.set()
+        await manager.wait(alice)
+        await manager.wait(bob)
+
+        storage = get_storage()
+        return {
+            "alice": alice,
+            "bob": bob,
+            "shared": shared,
+            "alice_history": [j["id"] for j in await manager.history(10, "alice")],
+            "all_history": [j["id"] for j in await manager.history(10)],
+            "alice_last": await storage.get_last_finished_job(["collect"], user_id="alice"),
+            "carol_last": await storage.get_last_finished_job(["collect"], user_id="carol"),
+            "alice_status": await manager.status("alice"),
+            "snapshot": await manager.get(bob.id),
+        }
+
+    r = db(main())
+    alice, bob, shared = r["alice"], r["bob"], r["shared"]
+    assert set(r["alice_history"]) == {alice.id, shared.id}
+    assert set(r["all_history"]) == {alice.id, bob.id, shared.id}
+    assert r["alice_last"]["id"] == alice.id
+    assert r["carol_last"] is None
+    assert r["alice_status"]["last_count"] == len("alice")
+    assert visible_to(r["snapshot"], "bob")
+    assert not visible_to(r["snapshot"], "alice")
+    assert visible_to(shared.to_dict(), "alice")
@@ -0,0 +1,124 @@
+"""表结构迁移：最早的（v0）数据库升级到当前版本"""
+import json
+import sqlite3
+
+from backend.models import database
+from backend.models.database import DEFAULT_USER, SCHEMA_VERSION
+from backend.models.topic import make_topic_id
+
+from .factories import make_topic
+
+# 多用户、拆列之前的表结构（user_version = 0）
+V0_SCHEMA = """
+    CREATE TABLE topics (
+        id TEXT PRIMARY KEY,
+        data JSON,
+        discovered_at TIMESTAMP,
+        status TEXT DEFAULT 'pending'
+    );
+    CREATE TABLE done_topics (
+        work_name TEXT,
+        dish_name TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (work_name, dish_name)
+    );
+    CREATE TABLE discovery_runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        run_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        topics_found INTEGER
+    );
+    CREATE TABLE favorites (
+        topic_id TEXT PRIMARY KEY,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE skipped_topics (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        topic_id TEXT NOT NULL,
+        work_name TEXT NOT NULL,
+        dish_name TEXT,
+        skip_reason TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+"""
+
+
+def _create_v0(path):
+    conn = sqlite3.connect(path)
+    conn.executescript(V0_SCHEMA)
+    # 旧 ID 是随机的；同一作品·菜品出现过两次
+    rows = [
+        ("old-1", make_topic("千与千寻", "饭团", id="old-1"), "2024-01-01T00:00:00"),
+        ("old-2", make_topic("千与千寻", "饭团", id="old-2"), "2024-02-01T00:00:00"),
+        ("old-3", make_topic("小森林", "米酒", id="old-3"), "2024-01-15T00:00:00"),
+    ]
+    for topic_id, topic, discovered_at in rows:
+        conn.execute(
+            "INSERT INTO topics (id, data, discovered_at, status) VALUES (?, ?, ?, 'pending')",
+            (topic_id, topic.model_dump_json(), discovered_at)
+        )
+    # 校验不过的旧数据原样保留
+    conn.execute(
+        "INSERT INTO topics (id, data, discovered_at, status) VALUES (?, ?, ?, 'pending')",
+        ("broken", json.dumps({"work_name": "残缺", "recommended_dish": "汤"}), "2024-03-01T00:00:00")
+    )
+    conn.execute("INSERT INTO done_topics (work_name, dish_name) VALUES ('小森林', '米酒')")
+    conn.execute("INSERT INTO favorites (topic_id) VALUES ('old-3')")
+    conn.execute("INSERT INTO favorites (topic_id) VALUES ('old-1')")
+    conn.execute(
+        "INSERT INTO skipped_topics (topic_id, work_name, dish_name, skip_reason) VALUES ('old-2', '千与千寻', '饭团', 'too_simple')"
+    )
+    conn.commit()
+    conn.close()
+
+
+def _columns(conn, table):
+    return {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def test_v0_database_migrates_to_current_schema(run, db_path):
+    _create_v0(db_path)
+    run(database.init_db())
+
+    conn = sqlite3.connect(db_path)
+    try:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+        assert {"work_name", "dish", "topic_type", "content_hash", "first_seen_run"} <= _columns(conn, "topics")
+        assert "user_id" in _columns(conn, "done_topics")
+        assert "user_id" in _columns(conn, "favorites")
+        assert {"user_id", "topic_type", "dish_origin"} <= _columns(conn, "skipped_topics")
+    finally:
+        conn.close()
+
+    spirited = make_topic_id("千与千寻", "饭团")
+    forest = make_topic_id("小森林", "米酒")
+    # v3：ID 改为内容生成，重复的作品·菜品合并为一行，校验不过的行保留原 ID
+    topic_ids = {t.id for t in run(database.get_latest_topics(limit=10))}
+    assert topic_ids == {spirited, forest}
+    assert run(database.get_topic("broken")) is None
+
+    # v4：旧的已做/收藏/跳过记录归默认用户，收藏顺序不变，跳过记录改用新 ID
+    assert run(database.get_done_topics(DEFAULT_USER)) == {"小森林·米酒"}
+    assert run(database.get_favorites(DEFAULT_USER)) == [forest, spirited]
+    assert run(database.get_skipped_topics(DEFAULT_USER)) == {spirited}
+    assert run(database.get_favorites("someone-else")) == []
+    stats = run(database.get_skip_stats(user_id=DEFAULT_USER))
+    assert stats["total"] == 1
+    assert stats["by_reason"] == {"too_simple": 1}
+
+
+def test_migration_is_idempotent(run, db_path):
+    _create_v0(db_path)
+    run(database.init_db())
+    favorites = run(database.get_favorites(DEFAULT_USER))
+    run(database.init_db())
+    assert run(database.get_favorites(DEFAULT_USER)) == favorites
+    assert run(database.get_skip_stats(user_id=DEFAULT_USER))["total"] == 1
+
+
+def test_new_database_starts_at_current_version(db, db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+        assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2  # INCREMENTAL
+    finally:
+        conn.close()
@@ -0,0 +1,93 @@
+"""排序视图：位图过滤和游标分页"""
+import pytest
+
+from backend.core.ranking import RankedView, decode_cursor, encode_cursor
+from backend.core.user_state import UserStateSnapshot
+
+
+def _topic(topic_id, score, topic_type="movie_food", difficulty="中等", work=None):
+    return {
+        "id": topic_id,
+        "total_score": score,
+        "topic_type": topic_type,
+        "cooking_difficulty": difficulty,
+        "work_name": work or f"作品{topic_id}",
+        "recommended_dish": f"菜{topic_id}",
+    }
+
+
+def _view():
+    # 同分的选题按 ID 排序；分页边界正好落在同分的一组中间
+    topics = [
+        _topic("a", 9), _topic("b", 8), _topic("c", 8), _topic("d", 8),
+        _topic("e", 7, "famous_recipe"), _topic("f", 7), _topic("g", 5, difficulty="困难"),
+    ]
+    by_type = {}
+    for t in topics:
+        by_type.setdefault(t["topic_type"], []).append(t)
+    return RankedView(("test", 1), by_type)
+
+
+def _state(version=1, skipped=(), favorites=(), done=()):
+    return UserStateSnapshot("u", version, frozenset(done), frozenset(skipped), tuple(favorites))
+
+
+def _ids(view, ranks):
+    return [view.ranked[r]["id"] for r in ranks]
+
+
+def _all_pages(view, state, page_size, **filters):
+    pages, cursor = [], None
+    while True:
+        ranks, cursor = view.page_ranks(state, page_size, cursor=cursor, **filters)
+        pages.append(_ids(view, ranks))
+        if cursor is None:
+            return pages
+
+
+def test_ranked_by_score_then_id():
+    view = _view()
+    assert _ids(view, view.select_ranks(_state())) == ["a", "b", "c", "d", "e", "f", "g"]
+
+
+def test_cursor_round_trip():
+    for key in [(-8, "c"), (-7.5, "中文-id"), (0, "")]:
+        assert decode_cursor(encode_cursor(key)) == (float(key[0]), key[1])
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+@pytest.mark.parametrize("page_size", [1, 2, 3, 7, 10])
+def test_pages_cover_everything_once(page_size):
+    view = _view()
+    state = _state()
+    pages = _all_pages(view, state, page_size)
+    flat = [i for page in pages for i in page]
+    assert flat == _ids(view, view.select_ranks(state))
+    assert all(len(page) <= page_size for page in pages)
+
+
+def test_pages_with_filters():
+    view = _view()
+    state = _state(skipped={"b"}, done={"作品f"})
+    assert _all_pages(view, state, 2, topic_type="movie_food") == [["a", "c"], ["d", "g"]]
+    assert _all_pages(view, state, 2, difficulty="困难") == [["g"]]
+
+
+def test_cursor_stable_when_state_changes_between_pages():
+    view = _view()
+    ranks, cursor = view.page_ranks(_state(version=1), 2)
+    assert _ids(view, ranks) == ["a", "b"]
+    # 翻页期间用户收藏了已看过的 a、跳过了下一页的 c：不重复、不漏掉其他选题
+    later = _state(version=2, favorites=("a",), skipped={"c"})
+    ranks, cursor = view.page_ranks(later, 2, cursor=cursor)
+    assert _ids(view, ranks) == ["d", "e"]
+    ranks, cursor = view.page_ranks(later, 2, cursor=cursor)
+    assert _ids(view, ranks) == ["f", "g"]
+    assert cursor is None
+
+
+def test_excluded_mask_follows_state_version():
+    view = _view()
+    assert view.count(_state(version=1)) == 7
+    assert view.count(_state(version=2, skipped={"a", "b"})) == 5